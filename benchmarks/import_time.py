@@ -0,0 +1,68 @@
+"""
+Benchmark the time taken by `import radvis` in a fresh interpreter.
+
+Each run starts a new Python process, so the measurement includes everything a
+short-lived worker pays before doing any work. The heavy modules left in
+sys.modules after the import are reported as well.
+
+Usage:
+    python benchmarks/import_time.py [--runs 10] [--statement "import radvis"] [--max-ms 150]
+
+With --max-ms the script exits with status 1 when the median import time exceeds
+the threshold, so it can guard against regressions in CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pydicom", "nibabel", "scipy", "skimage", "matplotlib", "IPython", "ipywidgets")
+
+_TIMER = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{"ms": elapsed * 1000, "modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement: str) -> dict:
+    """
+    Time a statement in a fresh interpreter.
+
+    :param statement: The statement to time, e.g. "import radvis"
+    :return: A dict with the elapsed milliseconds and the heavy modules imported
+    """
+    script = _TIMER.format(statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters to time")
+    parser.add_argument("--statement", default="import radvis", help="The import statement to time")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median time exceeds this")
+    args = parser.parse_args(argv)
+
+    # The first run warms the filesystem cache and is not counted
+    time_import(args.statement)
+    runs = [time_import(args.statement) for _ in range(args.runs)]
+    times = [run["ms"] for run in runs]
+    median = statistics.median(times)
+
+    print(f"{args.statement!r}: median {median:.1f} ms, min {min(times):.1f} ms, max {max(times):.1f} ms "
+          f"over {args.runs} runs")
+    print(f"heavy modules imported: {', '.join(runs[-1]['modules']) or 'none'}")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median import time {median:.1f} ms exceeds {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Benchmark loading, processing, meshing and rendering on synthetic volumes.
+
+Synthetic CT-like volumes (an ellipsoid of soft tissue with a dense core in air, plus noise)
+are written as NIfTI, DICOM series and NPY files of several sizes into a data directory. Each
+benchmark is run a number of times for its timings, then once more under tracemalloc for its
+peak memory, so the memory measurement does not slow down the timed runs.
+
+Results are written as JSON and can be compared with a baseline from an earlier run: benchmarks
+whose median time or peak memory grew by more than the tolerance are reported as regressions,
+and the script exits with status 1.
+
+Usage:
+    python benchmarks/suite.py [--sizes small medium] [--repeat 5] [--filter processing]
+                               [--output results.json] [--baseline baseline.json] [--tolerance 0.2]
+                               [--data-dir DIR]
+
+Sizes:
+    small:  64 x 128 x 128
+    medium: 128 x 256 x 256
+    large:  256 x 512 x 512
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Optional
+import numpy as np
+
+# Render without a display, before radvis.visualize imports pyplot
+import matplotlib
+matplotlib.use("Agg")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = {
+    "small": (64, 128, 128),
+    "medium": (128, 256, 256),
+    "large": (256, 512, 512),
+}
+
+
+def synthetic_volume(shape: tuple, seed: int = 0) -> np.ndarray:
+    """
+    Return a CT-like int16 volume: air around an ellipsoid of soft tissue holding a dense core.
+
+    :param shape: The shape of the volume
+    :param seed: The seed of the noise
+    """
+    grid = np.ogrid[tuple(slice(0, size) for size in shape)]
+    radius = sum(((axis - size / 2) / (size * 0.4)) ** 2 for axis, size in zip(grid, shape))
+    volume = np.full(shape, -1000, dtype=np.int16)
+    volume[radius < 1] = 40
+    volume[radius < 0.2] = 700
+    noise = np.random.default_rng(seed).normal(0, 20, size=shape)
+    return np.clip(volume + noise, -1024, 3071).astype(np.int16)
+
+
+def write_volumes(data_dir: str, size: str) -> dict:
+    """
+    Write the synthetic volume of a size as compressed NIfTI, DICOM series and NPY, unless already
+    written. NIfTI is compressed, as scans usually are, so that loading it reads and inflates the voxels.
+
+    :param data_dir: The directory to write into
+    :param size: The name of the size
+    :return: The path of each format
+    """
+    import nibabel as nib
+
+    volume = synthetic_volume(SIZES[size])
+    paths = {
+        "nifti": os.path.join(data_dir, f"{size}.nii.gz"),
+        "dicom": os.path.join(data_dir, f"{size}_dicom"),
+        "npy": os.path.join(data_dir, f"{size}.npy"),
+    }
+    if not os.path.exists(paths["nifti"]):
+        nib.save(nib.Nifti1Image(volume, affine=np.eye(4)), paths["nifti"])
+    if not os.path.exists(paths["npy"]):
+        np.save(paths["npy"], volume)
+    if not os.path.isdir(paths["dicom"]):
+        os.makedirs(paths["dicom"])
+        for index, pixels in enumerate(volume):
+            _write_dicom_slice(os.path.join(paths["dicom"], f"slice_{index:04d}.dcm"), pixels, index)
+    return paths
+
+
+def _write_dicom_slice(file_path: str, pixels: np.ndarray, index: int) -> None:
+    """
+    Write one slice of a DICOM series.
+
+    :param file_path: The path of the file
+    :param pixels: The pixels of the slice
+    :param index: The position of the slice in the series
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = Dataset()
+    dataset.file_meta = file_meta
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+    dataset.SOPClassUID = CTImageStorage
+    dataset.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    dataset.Rows, dataset.Columns = pixels.shape
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 1
+    dataset.PixelSpacing = [1.0, 1.0]
+    dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    dataset.ImagePositionPatient = [0, 0, float(index)]
+    dataset.InstanceNumber = index + 1
+    dataset.PixelData = pixels.astype(np.int16).tobytes()
+    dataset.save_as(file_path, write_like_original=False)
+
+
+def benchmarks(paths: dict, work_dir: str) -> dict[str, Callable[[], Callable[[], object]]]:
+    """
+    Return the benchmarks for the volumes of one size. Each is a setup function, run before
+    every measurement and not timed, returning the function to time.
+
+    :param paths: The path of each format of the volume
+    :param work_dir: A directory for the files written by the benchmarks
+    """
+    import radvis.processing as processing
+    from radvis.image import load_image
+    from radvis.mesh import compute_marching_cubes, RadMesh
+    from radvis.visualize import RadSlicer
+
+    image = load_image(paths["npy"])
+    mask = image.image_data > -500
+    mesh = compute_marching_cubes(image, 300.0)
+    mesh_path = os.path.join(work_dir, "mesh.vtk")
+    mesh.save(mesh_path, "vtk")
+    rvm_path = os.path.join(work_dir, "mesh.rvm")
+    mesh.save(rvm_path, "rvm")
+
+    def fresh():
+        # A copy without cached statistics, so that every run computes them
+        copy = image.copy()
+        copy.invalidate_statistics()
+        return copy
+
+    def slicer():
+        # Small frames, as the drawing cost of matplotlib does not depend on radvis
+        return RadSlicer(fresh(), width=2, height=2, show_slider=False)
+
+    cases = {
+        "load_image/nifti": lambda: lambda: load_image(paths["nifti"]),
+        "load_image/dicom": lambda: lambda: load_image(paths["dicom"]),
+        "load_image/npy": lambda: lambda: load_image(paths["npy"]),
+        "processing/normalization": lambda: (lambda source=fresh(): processing.normalization(source, -1000, 3000)),
+        "processing/noise_reduction": lambda: (lambda source=fresh(): processing.noise_reduction(source, 1.0)),
+        "processing/percentile_clipping": lambda: (lambda source=fresh():
+                                                   processing.percentile_clipping(source, 0.5, 99.5)),
+        "processing/add_padding": lambda: (lambda source=fresh():
+                                           processing.add_padding(source, tuple(s + 16 for s in image.shape))),
+        "processing/apply_mask": lambda: (lambda source=fresh(): processing.apply_mask(source, mask, invert=True)),
+        "processing/resample": lambda: (lambda source=fresh(): processing.resample(source, spacing=1.5)),
+        "processing/crop_to_foreground": lambda: (lambda source=fresh():
+                                                  processing.crop_to_foreground(source, threshold=-500)),
+        "mesh/compute_marching_cubes": lambda: (lambda source=fresh(): compute_marching_cubes(source, 300.0)),
+        "mesh/save": lambda: lambda: mesh.save(os.path.join(work_dir, "saved.vtk"), "vtk"),
+        "mesh/load": lambda: lambda: RadMesh.load(mesh_path),
+        "mesh/save_rvm": lambda: lambda: mesh.save(rvm_path, "rvm"),
+        "mesh/load_rvm": lambda: lambda: RadMesh.load(rvm_path),
+        "visualize/save_frame": lambda: (lambda view=slicer():
+                                         view.save_frame(os.path.join(work_dir, "frame.png"), image.shape[0] // 2)),
+        "visualize/save_animation": lambda: (lambda view=slicer():
+                                             view.save_animation(os.path.join(work_dir, "animation.gif"), fps=10)),
+    }
+    return cases
+
+
+def measure(setup: Callable[[], Callable[[], object]], repeat: int) -> dict:
+    """
+    Time a benchmark, then measure its peak memory in one more run.
+
+    :param setup: Returns the function to measure
+    :param repeat: The number of timed runs
+    :return: The median, minimum and maximum time in seconds and the peak traced memory in bytes
+    """
+    import matplotlib.pyplot as plt
+
+    times = []
+    for _ in range(repeat):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        plt.close("all")
+
+    run = setup()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        plt.close("all")
+    return {"median_s": statistics.median(times), "min_s": min(times), "max_s": max(times),
+            "runs": repeat, "peak_bytes": peak}
+
+
+def environment() -> dict:
+    """
+    Return the versions and machine the benchmarks ran on, to tell apart results that are not comparable.
+    """
+    import scipy
+    import skimage
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+                "scikit-image": skimage.__version__, "matplotlib": matplotlib.__version__}
+    return {"versions": versions, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """
+    Return the regressions of results compared with a baseline.
+
+    :param results: The results of this run
+    :param baseline: The results of the baseline run
+    :param tolerance: The relative growth of time or memory allowed, e.g. 0.2 for 20%
+    :return: A description of each regression
+    """
+    previous = {(result["name"], result["size"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        for key, unit in (("median_s", "s"), ("peak_bytes", "bytes")):
+            if before[key] > 0 and result[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{result['name']} [{result['size']}]: {key} {before[key]:.4g} -> "
+                                   f"{result[key]:.4g} {unit} (+{result[key] / before[key] - 1:.0%})")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"], help="Volume sizes to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs of each benchmark")
+    parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", default=None, help="Results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    parser.add_argument("--data-dir", default=None, help="Where to keep the synthetic volumes between runs")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data_dir or work_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for size in args.sizes:
+            paths = write_volumes(data_dir, size)
+            for name, setup in benchmarks(paths, work_dir).items():
+                if args.filter and args.filter not in name:
+                    continue
+                result = {"name": name, "size": size, **measure(setup, args.repeat)}
+                results.append(result)
+                print(f"{name:32} {size:7} median {result['median_s'] * 1000:9.1f} ms   "
+                      f"peak {result['peak_bytes'] / 2 ** 20:8.1f} MiB")
+
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%} compared with {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,24 @@
-#from .mesh import compute_mesh
-from .image import load_image, RadImage, from_numpy
-from .visualize import RadSlicer, RadSlicerGroup
-from .processing import normalization, noise_reduction, percentile_clipping, add_padding, apply_mask
+from typing import TYPE_CHECKING
+from ._lazy import attach
 
-__all__ = ["load_image", "RadSlicer", "RadSlicerGroup", "normalization", "noise_reduction", "percentile_clipping", "RadImage", "add_padding", "from_numpy"]
\ No newline at end of file
+__all__ = ["load_image", "load_images", "RadSlicer", "RadSlicerGroup", "normalization", "noise_reduction", "percentile_clipping", "RadImage", "add_padding", "from_numpy"]
+
+# Submodules and their dependencies are imported on first attribute access
+__getattr__, __dir__ = attach(__name__, {
+    "load_image": ".image",
+    "load_images": ".image",
+    "RadImage": ".image",
+    "from_numpy": ".image",
+    "RadSlicer": ".visualize",
+    "RadSlicerGroup": ".visualize",
+    "normalization": ".processing",
+    "noise_reduction": ".processing",
+    "percentile_clipping": ".processing",
+    "add_padding": ".processing",
+    "apply_mask": ".processing",
+}, submodules=["image", "instrumentation", "mesh", "processing", "visualize"])
+
+if TYPE_CHECKING:
+    from .image import load_image, load_images, RadImage, from_numpy
+    from .visualize import RadSlicer, RadSlicerGroup
+    from .processing import normalization, noise_reduction, percentile_clipping, add_padding, apply_mask
@@ -0,0 +1,42 @@
+"""
+PEP 562 lazy attribute loading for the radvis packages.
+
+Heavy dependencies (pydicom, nibabel, scipy, scikit-image, matplotlib) are only imported
+when the attribute that needs them is first accessed, keeping `import radvis` cheap for
+short-lived workers.
+
+Usage (in a package __init__.py):
+    __getattr__, __dir__ = attach(__name__, {"load_image": ".instantiate"}, submodules=["image"])
+"""
+import importlib
+from typing import Callable, Iterable
+
+
+def attach(package_name: str, attributes: dict[str, str],
+           submodules: Iterable[str] = ()) -> tuple[Callable[[str], object], Callable[[], list[str]]]:
+    """
+    Return module level __getattr__ and __dir__ functions that import attributes on first access.
+
+    :param package_name: The __name__ of the package
+    :param attributes: Maps each attribute name to the (relative) module it is imported from
+    :param submodules: Names of submodules that can be accessed as attributes of the package
+    :return: The __getattr__ and __dir__ functions for the package
+    """
+    submodules = set(submodules)
+    package = importlib.import_module(package_name)
+
+    def __getattr__(name: str) -> object:
+        if name in attributes:
+            value = getattr(importlib.import_module(attributes[name], package_name), name)
+        elif name in submodules:
+            value = importlib.import_module(f"{package_name}.{name}")
+        else:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        # Cache the attribute on the package so later lookups skip __getattr__
+        setattr(package, name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(vars(package)) | set(attributes) | submodules)
+
+    return __getattr__, __dir__
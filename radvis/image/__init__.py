@@ -1,4 +1,19 @@
-from .instantiate import load_image, from_numpy
-from .rad_image import RadImage
+from typing import TYPE_CHECKING
+from .._lazy import attach
 
-__all__ = ["load_image", "RadImage", "from_numpy"]
\ No newline at end of file
+__all__ = ["load_image", "load_images", "RadImage", "from_numpy", "enable_cache", "disable_cache", "clear_cache", "cache_info"]
+
+__getattr__, __dir__ = attach(__name__, {
+    "load_image": ".instantiate",
+    "load_images": ".instantiate",
+    "from_numpy": ".instantiate",
+    "enable_cache": ".instantiate",
+    "disable_cache": ".instantiate",
+    "clear_cache": ".instantiate",
+    "cache_info": ".instantiate",
+    "RadImage": ".rad_image",
+})
+
+if TYPE_CHECKING:
+    from .instantiate import load_image, load_images, from_numpy, enable_cache, disable_cache, clear_cache, cache_info
+    from .rad_image import RadImage
@@ -0,0 +1,358 @@
+"""
+A minimal chunked, compressed on-disk volume format (similar in spirit to zarr/N5),
+stored in a single file so it can be used as a cache between processing and visualization.
+
+File layout:
+    MAGIC | compressed chunk 0 | compressed chunk 1 | ... | JSON index | index offset (uint64) | MAGIC
+
+The JSON index holds the shape, dtype, chunk shape and compression of the volume, the byte
+offset and length of every chunk keyed by its position in the chunk grid ("i.j.k"), and the
+minimum and maximum of the volume, found as the chunks are written.
+Chunks missing from the index read as zeros. Reading a region only decompresses the
+chunks it crosses.
+
+Usage:
+    write_chunked("volume.rvc", image_data, chunks=(64, 64, 64))
+    volume = ChunkedVolumeReader("volume.rvc")
+    axial_slice = volume[:, :, 100]
+"""
+from collections import OrderedDict
+import itertools
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Optional
+import numpy as np
+
+MAGIC = b"RVCHUNK1"
+DEFAULT_CHUNK_SIZE = 64
+_TRAILER = struct.Struct("<Q8s")
+
+
+class ChunkedVolumeWriter:
+    """ Writes a volume chunk by chunk, receiving it as consecutive slabs along axis 0 """
+
+    def __init__(self, file_path: str, shape: tuple, dtype: np.dtype, chunks: Optional[tuple] = None,
+                 compression_level: int = 1, metadata: Optional[dict] = None):
+        """
+        Initialize the ChunkedVolumeWriter class and create the output file.
+
+        :param file_path: The path of the file to write
+        :param shape: The shape of the volume
+        :param dtype: The dtype of the volume
+        :param chunks: The shape of a chunk, defaults to 64 voxels along every axis
+        :param compression_level: The zlib compression level, 0 stores chunks uncompressed, defaults to 1
+        :param metadata: JSON serializable metadata stored in the index, defaults to None
+        """
+        self.file_path = file_path
+        self.shape = tuple(int(size) for size in shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = _default_chunks(self.shape) if chunks is None else tuple(int(size) for size in chunks)
+        if len(self.chunks) != len(self.shape) or any(size < 1 for size in self.chunks):
+            raise ValueError(f"Invalid chunk shape {self.chunks} for volume of shape {self.shape}")
+        self.compression_level = compression_level
+        self.metadata = metadata or {}
+        self._offsets: dict[str, list[int]] = {}
+        self._pending: list[np.ndarray] = []
+        self._pending_rows = 0
+        self._rows_written = 0
+        self._range: Optional[tuple] = None
+        self._file = open(file_path, "wb")
+        self._file.write(MAGIC)
+
+    def __enter__(self) -> "ChunkedVolumeWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # A volume left incomplete by an error is not written, so it cannot be read as valid
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write_slab(self, data: np.ndarray) -> None:
+        """
+        Append the next slab of the volume along axis 0. Chunks are compressed and written
+        as soon as all rows they cover have been received.
+
+        :param data: The slab, with the shape of the volume on every axis but the first
+        """
+        data = np.asarray(data, dtype=self.dtype)
+        if data.shape[1:] != self.shape[1:]:
+            raise ValueError(f"Slab of shape {data.shape} does not match volume shape {self.shape}")
+        if self._rows_written + self._pending_rows + data.shape[0] > self.shape[0]:
+            raise ValueError("More rows written than the volume holds")
+
+        self._pending.append(data)
+        self._pending_rows += data.shape[0]
+        while self._pending_rows >= self.chunks[0]:
+            self._flush_rows(self.chunks[0])
+
+    def close(self) -> None:
+        """
+        Write the remaining chunks and the index, and close the file.
+
+        :raises ValueError: If fewer rows were written than the volume holds. The file is removed.
+        """
+        if self._file.closed:
+            return
+        rows = self._rows_written + self._pending_rows
+        if rows < self.shape[0]:
+            self.discard()
+            raise ValueError(f"Only {rows} of {self.shape[0]} rows of the volume were written to {self.file_path}")
+        if self._pending_rows > 0:
+            self._flush_rows(self._pending_rows)
+
+        index = {
+            "shape": list(self.shape),
+            "dtype": self.dtype.str,
+            "chunks": list(self.chunks),
+            "compression": "zlib" if self.compression_level > 0 else "none",
+            "offsets": self._offsets,
+            "metadata": self.metadata,
+            "statistics": self._statistics(),
+        }
+        index_offset = self._file.tell()
+        self._file.write(json.dumps(index).encode("utf-8"))
+        self._file.write(_TRAILER.pack(index_offset, MAGIC))
+        self._file.close()
+
+    def discard(self) -> None:
+        """
+        Close and remove the file without writing the index, e.g. after an error.
+        """
+        if self._file.closed:
+            return
+        self._file.close()
+        self._pending = []
+        self._pending_rows = 0
+        os.remove(self.file_path)
+
+    def _statistics(self) -> dict:
+        """
+        Return the range of the volume for the index.
+        """
+        if self._range is None or self.dtype.kind not in "biuf":
+            return {}
+        low, high = self._range
+        return {"min": low.item(), "max": high.item()}
+
+    def _flush_rows(self, rows: int) -> None:
+        """
+        Compress and write the chunks covering the next rows of pending slabs.
+
+        :param rows: The number of pending rows to write
+        """
+        pending = np.concatenate(self._pending, axis=0) if len(self._pending) > 1 else self._pending[0]
+        slab, rest = pending[:rows], pending[rows:]
+        self._pending = [rest] if rest.shape[0] > 0 else []
+        self._pending_rows = rest.shape[0]
+
+        if slab.size:
+            low, high = slab.min(), slab.max()
+            self._range = (low, high) if self._range is None else \
+                (np.minimum(self._range[0], low), np.maximum(self._range[1], high))
+
+        chunk_row = self._rows_written // self.chunks[0]
+        grid = [range(0, size, chunk) for size, chunk in zip(self.shape[1:], self.chunks[1:])]
+        for starts in itertools.product(*grid):
+            region = (slice(None),) + tuple(slice(start, start + chunk) for start, chunk in zip(starts, self.chunks[1:]))
+            payload = np.ascontiguousarray(slab[region]).tobytes()
+            if self.compression_level > 0:
+                payload = zlib.compress(payload, self.compression_level)
+            key = ".".join(str(i) for i in (chunk_row,) + tuple(start // chunk for start, chunk in zip(starts, self.chunks[1:])))
+            self._offsets[key] = [self._file.tell(), len(payload)]
+            self._file.write(payload)
+        self._rows_written += rows
+
+
+class ChunkedVolumeReader:
+    """ Array-like read access to a chunked volume that only decompresses the chunks a region crosses """
+
+    def __init__(self, file_path: str, cache_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the ChunkedVolumeReader class and read the chunk index.
+
+        :param file_path: The path of the chunked volume file
+        :param cache_bytes: The maximum size of recently decompressed chunks kept in memory, defaults to 64 MiB
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        self.file_path = file_path
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+        with open(file_path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a chunked volume file: {file_path}")
+            file.seek(-_TRAILER.size, os.SEEK_END)
+            index_offset, magic = _TRAILER.unpack(file.read(_TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Chunked volume file is incomplete: {file_path}")
+            index_end = file.seek(0, os.SEEK_END) - _TRAILER.size
+            file.seek(index_offset)
+            index = json.loads(file.read(index_end - index_offset).decode("utf-8"))
+
+        self.shape = tuple(index["shape"])
+        self.dtype = np.dtype(index["dtype"])
+        self.chunks = tuple(index["chunks"])
+        self.compression = index["compression"]
+        self.metadata = index["metadata"]
+        # The minimum and maximum of the volume, in files that record them
+        self.statistics = index.get("statistics", {})
+        self._offsets = {tuple(int(i) for i in key.split(".")): value for key, value in index["offsets"].items()}
+
+    @property
+    def ndim(self) -> int:
+        """Get the number of dimensions of the volume."""
+        return len(self.shape)
+
+    def __getstate__(self) -> dict:
+        # The lock and chunk cache are not sent along when pickling, e.g. to worker processes
+        state = self.__dict__.copy()
+        state.update(_lock=None, _cache=OrderedDict(), _cached_bytes=0)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self[...]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Read a region of the volume. Integers, slices and Ellipsis are read chunk by chunk,
+        other indices (e.g. index arrays) are applied to the full volume.
+        """
+        ranges = _key_to_ranges(key, self.shape)
+        if ranges is None:
+            return self[...][key]
+
+        starts = [start for start, _, _, _ in ranges]
+        stops = [stop for _, stop, _, _ in ranges]
+        out = np.zeros([stop - start for start, stop in zip(starts, stops)], dtype=self.dtype)
+
+        if out.size > 0:
+            chunk_ranges = [range(start // chunk, (stop - 1) // chunk + 1)
+                            for start, stop, chunk in zip(starts, stops, self.chunks)]
+            for chunk_index in itertools.product(*chunk_ranges):
+                chunk = self._read_chunk(chunk_index)
+                if chunk is None:
+                    continue
+                source, target = [], []
+                for axis, i in enumerate(chunk_index):
+                    chunk_start = i * self.chunks[axis]
+                    low = max(starts[axis], chunk_start)
+                    high = min(stops[axis], chunk_start + chunk.shape[axis])
+                    source.append(slice(low - chunk_start, high - chunk_start))
+                    target.append(slice(low - starts[axis], high - starts[axis]))
+                out[tuple(target)] = chunk[tuple(source)]
+
+        # Apply slice steps and drop the axes indexed by integers
+        return out[tuple(0 if is_int else slice(None, None, step) for _, _, step, is_int in ranges)]
+
+    def _read_chunk(self, chunk_index: tuple) -> Optional[np.ndarray]:
+        """
+        Return the decompressed chunk at the given grid position, or None if it was never written.
+
+        :param chunk_index: The position of the chunk in the chunk grid
+        """
+        with self._lock:
+            if chunk_index in self._cache:
+                self._cache.move_to_end(chunk_index)
+                return self._cache[chunk_index]
+
+        if chunk_index not in self._offsets:
+            return None
+
+        offset, length = self._offsets[chunk_index]
+        with open(self.file_path, "rb") as file:
+            file.seek(offset)
+            payload = file.read(length)
+        if self.compression == "zlib":
+            payload = zlib.decompress(payload)
+
+        chunk_shape = tuple(min(chunk, size - i * chunk) for i, chunk, size in zip(chunk_index, self.chunks, self.shape))
+        chunk = np.frombuffer(payload, dtype=self.dtype).reshape(chunk_shape)
+
+        with self._lock:
+            self._cache[chunk_index] = chunk
+            self._cached_bytes += chunk.nbytes
+            while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+        return chunk
+
+
+def write_chunked(file_path: str, data, chunks: Optional[tuple] = None, compression_level: int = 1,
+                  metadata: Optional[dict] = None) -> None:
+    """
+    Write a volume to a chunked volume file. The data is read one chunk row along axis 0 at
+    a time, so lazily loaded RadImages and memory-mapped arrays are streamed to disk.
+
+    :param file_path: The path of the file to write
+    :param data: An array-like object with shape, dtype and slicing (e.g. a NumPy array or a RadImage)
+    :param chunks: The shape of a chunk, defaults to 64 voxels along every axis
+    :param compression_level: The zlib compression level, 0 stores chunks uncompressed, defaults to 1
+    :param metadata: JSON serializable metadata stored in the index, defaults to None
+    """
+    with ChunkedVolumeWriter(file_path, data.shape, data.dtype, chunks, compression_level, metadata) as writer:
+        for start in range(0, data.shape[0], writer.chunks[0]):
+            writer.write_slab(data[start:start + writer.chunks[0]])
+
+
+def _default_chunks(shape: tuple) -> tuple:
+    """
+    Return the default chunk shape for a volume: 64 voxels along every axis, capped by its size.
+
+    :param shape: The shape of the volume
+    """
+    return tuple(max(1, min(size, DEFAULT_CHUNK_SIZE)) for size in shape)
+
+
+def _key_to_ranges(key, shape: tuple) -> Optional[list[tuple]]:
+    """
+    Convert an index of integers, slices and Ellipsis into a (start, stop, step, is_int)
+    range for every axis, where start and stop cover the voxels to read with step 1.
+    Returns None for any other kind of index.
+
+    :param key: The index
+    :param shape: The shape of the volume being indexed
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    ellipses = [position for position, k in enumerate(key) if k is Ellipsis]
+    if len(ellipses) > 1:
+        raise IndexError("An index can only have a single ellipsis ('...')")
+    if ellipses:
+        position = ellipses[0]
+        key = key[:position] + (slice(None),) * (len(shape) - len(key) + 1) + key[position + 1:]
+    if len(key) > len(shape):
+        raise IndexError(f"Too many indices for volume of shape {shape}")
+    key = key + (slice(None),) * (len(shape) - len(key))
+
+    ranges = []
+    for k, size in zip(key, shape):
+        if isinstance(k, (int, np.integer)) and not isinstance(k, bool):
+            index = int(k) + size if k < 0 else int(k)
+            if index < 0 or index >= size:
+                raise IndexError(f"Index {k} is out of bounds for axis with size {size}")
+            ranges.append((index, index + 1, 1, True))
+        elif isinstance(k, slice):
+            start, stop, step = k.indices(size)
+            if step < 0:
+                return None
+            stop = max(start, stop)
+            # Only read up to the last voxel selected by the step
+            stop = start + ((stop - start - 1) // step) * step + 1 if stop > start else start
+            ranges.append((start, stop, step, False))
+        else:
+            return None
+    return ranges
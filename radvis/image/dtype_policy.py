@@ -0,0 +1,97 @@
+"""
+Dtype policies control the dtype that image data is stored with after loading.
+
+Policies:
+    "native":   Keep the dtype stored in the file. Data is only promoted to floating point
+                when the file's scaling (e.g. NIFTI scl_slope/scl_inter) requires it.
+    "downcast": Like "native", then shrink integer data to the narrowest integer dtype that
+                holds its value range and float64 data to float32.
+    A NumPy dtype (e.g. np.float32): Cast the data to that dtype.
+"""
+from typing import Optional
+import numpy as np
+
+DTYPE_POLICIES = ("native", "downcast")
+
+
+def check_dtype_policy(policy: str | np.dtype | type) -> None:
+    """
+    Raise an error if the policy is not a known policy name or a valid NumPy dtype.
+
+    :param policy: The dtype policy to check
+    """
+    if isinstance(policy, str) and policy in DTYPE_POLICIES:
+        return
+    try:
+        np.dtype(policy)
+    except TypeError:
+        raise ValueError(f"Unsupported dtype policy '{policy}'. Use one of {DTYPE_POLICIES} or a NumPy dtype.")
+
+
+def resolve_dtype(policy: str | np.dtype | type, native_dtype: np.dtype) -> Optional[np.dtype]:
+    """
+    Return the dtype to store data of the given native dtype with, without looking at the data.
+    Integer downcasting depends on the value range, so for integer data under the "downcast"
+    policy the native dtype is returned and the data has to be passed to apply_dtype_policy.
+
+    :param policy: The dtype policy
+    :param native_dtype: The dtype of the data as read from the file
+    :return: The dtype to store the data with
+    """
+    check_dtype_policy(policy)
+    native_dtype = np.dtype(native_dtype)
+    if isinstance(policy, str) and policy == "native":
+        return native_dtype
+    if isinstance(policy, str) and policy == "downcast":
+        if native_dtype == np.float64:
+            return np.dtype(np.float32)
+        return native_dtype
+    return np.dtype(policy)
+
+
+def apply_dtype_policy(image_data: np.ndarray, policy: str | np.dtype | type) -> np.ndarray:
+    """
+    Convert image data according to the dtype policy. The data is returned without copying
+    when it already has the right dtype.
+
+    :param image_data: The image data to convert
+    :param policy: The dtype policy
+    :return: The converted image data
+    """
+    dtype = resolve_dtype(policy, image_data.dtype)
+    if isinstance(policy, str) and policy == "downcast" and np.issubdtype(dtype, np.integer) and image_data.size > 0:
+        dtype = narrowest_integer_dtype(image_data.min(), image_data.max())
+    return image_data.astype(dtype, copy=False)
+
+
+def narrowest_integer_dtype(min_val: int, max_val: int) -> np.dtype:
+    """
+    Return the narrowest integer dtype that can hold every value in [min_val, max_val].
+    Unsigned dtypes are preferred when min_val is not negative.
+
+    :param min_val: The smallest value to hold
+    :param max_val: The largest value to hold
+    :return: The narrowest integer dtype
+    """
+    candidates = (np.uint8, np.uint16, np.uint32, np.uint64) if min_val >= 0 else (np.int8, np.int16, np.int32, np.int64)
+    for candidate in candidates:
+        info = np.iinfo(candidate)
+        if info.min <= min_val and max_val <= info.max:
+            return np.dtype(candidate)
+    return np.dtype(np.int64)
+
+
+def narrowest_float_dtype(dtype: np.dtype) -> np.dtype:
+    """
+    Return the narrowest floating point dtype that represents every value of the given dtype
+    exactly. Floating point dtypes are returned unchanged.
+
+    :param dtype: The dtype of the input data
+    :return: The floating point dtype to compute results in
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.floating) or np.issubdtype(dtype, np.complexfloating):
+        return dtype
+    if dtype == np.bool_ or dtype.itemsize <= 2:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
@@ -0,0 +1,84 @@
+"""
+Voxel to world geometry of images.
+
+A RadImage's affine is a 4x4 matrix mapping voxel indices (i, j, k, 1), in the order of the axes
+of the image data, to world coordinates in millimetres. NIfTI images use the affine of the file
+(RAS+ coordinates). DICOM images get one built from PixelSpacing, ImageOrientationPatient and
+ImagePositionPatient (LPS+ coordinates, as in the DICOM standard). Images without geometry have
+no affine, and a spacing of 1 along every axis.
+"""
+from typing import Optional, Sequence
+import numpy as np
+
+
+def spacing_from_affine(affine: Optional[np.ndarray], ndim: int) -> tuple:
+    """
+    Return the voxel spacing along each axis of an image.
+
+    :param affine: The 4x4 voxel to world affine, or None
+    :param ndim: The number of dimensions of the image
+    :return: The length of a voxel step along each axis, 1.0 for axes the affine does not cover
+    """
+    if affine is None:
+        return (1.0,) * ndim
+    spacing = np.linalg.norm(np.asarray(affine, dtype=np.float64)[:3, :min(ndim, 3)], axis=0)
+    return tuple(float(s) for s in spacing) + (1.0,) * max(0, ndim - 3)
+
+
+def dicom_affine(headers: Sequence, stacked: bool) -> Optional[np.ndarray]:
+    """
+    Build the affine of DICOM image data from the headers of its slices, in slice order.
+    Pixel data has rows along one axis and columns along the next.
+
+    :param headers: The DICOM headers, one per slice, or the header of a single file
+    :param stacked: Whether slices (of a series, or the frames of a multi-frame file) are stacked
+        along axis 0, before the rows and columns
+    :return: The 4x4 affine, or None if the headers have no PixelSpacing
+    """
+    first = headers[0]
+    if "PixelSpacing" not in first:
+        return None
+    row_spacing, column_spacing = (float(s) for s in first.PixelSpacing)
+
+    if "ImageOrientationPatient" in first:
+        orientation = np.array(first.ImageOrientationPatient, dtype=np.float64)
+        row_direction, column_direction = orientation[:3], orientation[3:]
+    else:
+        row_direction, column_direction = np.array([1.0, 0, 0]), np.array([0, 1.0, 0])
+    normal = np.cross(row_direction, column_direction)
+    origin = np.array(first.ImagePositionPatient, dtype=np.float64) if "ImagePositionPatient" in first \
+        else np.zeros(3)
+
+    # Stepping down a column of pixels moves along the column direction, by the row spacing
+    columns = [column_direction * row_spacing, row_direction * column_spacing]
+    if len(headers) > 1 and all("ImagePositionPatient" in h for h in headers):
+        last = np.array(headers[-1].ImagePositionPatient, dtype=np.float64)
+        slice_step = (last - origin) / (len(headers) - 1)
+    else:
+        slice_step = normal * float(first.get("SpacingBetweenSlices", first.get("SliceThickness", 1.0)) or 1.0)
+
+    affine = np.eye(4)
+    if stacked:
+        affine[:3, :3] = np.column_stack([slice_step] + columns)
+    else:
+        affine[:3, :3] = np.column_stack(columns + [slice_step])
+    affine[:3, 3] = origin
+    return affine
+
+
+def scaled_affine(affine: Optional[np.ndarray], step: Sequence[float]) -> np.ndarray:
+    """
+    Return the affine of an image resampled with voxels step times the size of the original
+    ones along each axis, the resampled and the original grid covering the same extent.
+
+    :param affine: The 4x4 affine of the original image, or None for unit spacing
+    :param step: The ratio of the new to the original spacing along each of the first 3 axes
+    :return: The 4x4 affine of the resampled image
+    """
+    affine = np.eye(4) if affine is None else np.array(affine, dtype=np.float64)
+    step = np.ones(3) if len(step) == 0 else np.concatenate([step, np.ones(3 - len(step))])[:3]
+    # The first voxel's centre moves from the corner of the grid by half a new voxel
+    origin = affine @ np.concatenate([(step - 1) / 2, [1.0]])
+    affine[:3, :3] = affine[:3, :3] * step
+    affine[:3, 3] = origin[:3]
+    return affine
@@ -1,28 +1,285 @@
 from .rad_image import RadImage
-from .rad_dicom_image import RadDicomImage
-from .rad_nifti_image import RadNiftiImage
-from .rad_numpy_image import RadNumpyImage
+from radvis.instrumentation import instrumented, file_bytes
+from .dtype_policy import DTYPE_POLICIES
+from .rad_numpy_image import RadNumpyImage, check_mmap_mode
+from .rad_chunked_image import RadChunkedImage
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Optional
 import numpy as np
 import os
+import threading
 
-def load_image(file_path: str) -> RadImage:
+
+class CacheInfo(NamedTuple):
+    """ Counters and size of the load_image cache """
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    current_bytes: int
+    max_bytes: int
+
+
+class _ImageCache:
+    """
+    Process-wide LRU cache of loaded images with a byte-size budget.
+    Keys include the path, size and modification time of the files, so changed files are reloaded.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.max_bytes = 0
+        self._entries: OrderedDict[tuple, tuple[RadImage, int]] = OrderedDict()
+        self._current_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[RadImage]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0]
+            self._misses += 1
+            return None
+
+    def put(self, key: tuple, image: RadImage) -> None:
+        # Lazily loaded and memory-mapped images only hold the data read so far
+        image_data = image._image_data
+        nbytes = image_data.nbytes if image.is_loaded and image_data is not None and not isinstance(image_data, np.memmap) else 0
+        with self._lock:
+            if not self.enabled or nbytes > self.max_bytes or key in self._entries:
+                return
+            self._entries[key] = (image, nbytes)
+            self._current_bytes += nbytes
+            self._evict()
+
+    def enable(self, max_bytes: int) -> None:
+        with self._lock:
+            self.enabled = True
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self) -> None:
+        # Called with the lock held
+        while self._current_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self._current_bytes -= evicted_bytes
+            self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, len(self._entries),
+                             self._current_bytes, self.max_bytes)
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+
+_image_cache = _ImageCache()
+
+@instrumented("image", bytes_read=lambda file_path, *args, **kwargs: file_bytes(file_path))
+def load_image(file_path: str | list[str], lazy: bool = False, workers: Optional[int] = None,
+               dtype: str | np.dtype = "native", mmap_mode: Optional[str] = None) -> RadImage:
     """
     Infer the file format of the image and load it using the appropriate RadImage subclass.
+    A directory or a list of files is loaded as a DICOM series with one slice per file.
 
-    :param file_path: The file path to the image file
+    :param file_path: The file path to the image file, a DICOM series directory or a list of DICOM files
+    :param lazy: Whether to defer reading the image data until it is accessed, defaults to False.
+        Lazily loaded images read only the slices and regions that are accessed, until image_data
+        is used. Supported for NIFTI, Numpy, chunked volume (.rvc) files and DICOM series.
+    :param workers: The number of threads used to decode a DICOM series, defaults to None
+    :param dtype: The dtype policy for the image data: "native" keeps the dtype stored in the file,
+        "downcast" shrinks it to the narrowest dtype holding the values, or a NumPy dtype to cast to.
+        Defaults to "native".
+    :param mmap_mode: The memory-map mode ('r', 'r+' or 'c') to open Numpy files with, defaults to None.
+        Only supported for Numpy (.npy) files.
     :return: An instance of a RadImage subclass for the corresponding file format
     """
+    check_mmap_mode(mmap_mode)
+    # Memory-mapped loads are not cached, as the page cache already holds the pages they read
+    if not _image_cache.enabled or mmap_mode is not None:
+        return _load_image(file_path, lazy, workers, dtype, mmap_mode)
+
+    key = (_file_signature(file_path), lazy, _dtype_key(dtype), mmap_mode)
+    image = _image_cache.get(key)
+    if image is None:
+        image = _load_image(file_path, lazy, workers, dtype, mmap_mode)
+        _image_cache.put(key, image)
+    # Hand out copy-on-write copies so callers cannot modify the cached image
+    return image.copy()
+
+
+def _load_image(file_path: str | list[str], lazy: bool, workers: Optional[int], dtype: str | np.dtype,
+                mmap_mode: Optional[str]) -> RadImage:
+    """
+    Load the image with the RadImage subclass for its file format, bypassing the cache.
+    See load_image for the parameters. The DICOM and NIFTI backends are imported on first
+    use, so that pydicom and nibabel are only loaded by processes that read those formats.
+    """
+    if isinstance(file_path, (list, tuple)) or os.path.isdir(file_path):
+        _check_mmap_supported(mmap_mode, "DICOM series")
+        from .rad_dicom_series_image import RadDicomSeriesImage
+        return RadDicomSeriesImage(file_path, workers=workers, dtype=dtype, lazy=lazy)
+
+    extension = os.path.splitext(file_path)[1]
     if file_path.find(".dcm") != -1:
-        return RadDicomImage(file_path)
+        _check_lazy_supported(lazy, extension)
+        _check_mmap_supported(mmap_mode, extension)
+        from .rad_dicom_image import RadDicomImage
+        return RadDicomImage(file_path, dtype=dtype)
     elif file_path.find(".nii") != -1:
-        return RadNiftiImage(file_path)
+        _check_mmap_supported(mmap_mode, extension)
+        from .rad_nifti_image import RadNiftiImage
+        return RadNiftiImage(file_path, lazy=lazy, dtype=dtype)
     elif file_path.find(".npy") != -1:
-        return RadNumpyImage(file_path)
+        return RadNumpyImage(file_path, dtype=dtype, mmap_mode=mmap_mode, lazy=lazy)
+    elif file_path.find(".rvc") != -1:
+        _check_mmap_supported(mmap_mode, extension)
+        return RadChunkedImage(file_path, lazy=lazy, dtype=dtype)
     else:
-        extension = os.path.splitext(file_path)[1]
         raise ValueError(f"Unsupported file format: {extension}")
 
 
+def load_images(file_paths: Iterable[str | list[str]], workers: Optional[int] = None, prefetch: int = 2,
+                use_processes: bool = False, **kwargs) -> Iterator[RadImage]:
+    """
+    Load a cohort of images in parallel, yielding them in the order of file_paths.
+    While the caller works on one image, the next `prefetch` images load in the background.
+
+    :param file_paths: The file paths of the images, as accepted by load_image
+    :param workers: The number of worker threads or processes, defaults to None (chosen by concurrent.futures)
+    :param prefetch: The number of images to load ahead of the one being yielded, defaults to 2
+    :param use_processes: Whether to load in worker processes instead of threads, defaults to False.
+        Processes avoid the GIL for pure Python decoding (e.g. pydicom) at the cost of pickling the images.
+    :param kwargs: Keyword arguments passed on to load_image
+    :return: An iterator over the loaded RadImages
+    """
+    if prefetch < 0:
+        raise ValueError(f"prefetch must not be negative, got {prefetch}")
+
+    executor: Executor = ProcessPoolExecutor(workers) if use_processes else ThreadPoolExecutor(workers)
+    file_paths = iter(file_paths)
+    pending: deque[Future] = deque()
+
+    def submit_until(count: int) -> None:
+        while len(pending) < count:
+            file_path = next(file_paths, None)
+            if file_path is None:
+                return
+            pending.append(executor.submit(load_image, file_path, **kwargs))
+
+    try:
+        while True:
+            submit_until(prefetch + 1)
+            if not pending:
+                return
+            future = pending.popleft()
+            # Keep `prefetch` images loading while the caller uses this one
+            submit_until(prefetch)
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def enable_cache(max_bytes: int = 1024 ** 3) -> None:
+    """
+    Enable the process-wide load_image cache. Images are keyed on their path, file size and
+    modification time, evicted least recently used first once max_bytes is exceeded, and
+    returned as copy-on-write copies. Each worker process of load_images has its own cache.
+    Loads with an mmap_mode bypass the cache, so their image data stays mapped to the file.
+
+    :param max_bytes: The maximum total size of the cached image data in bytes, defaults to 1 GiB
+    """
+    _image_cache.enable(max_bytes)
+
+
+def disable_cache() -> None:
+    """
+    Disable the load_image cache and drop the cached images.
+    """
+    _image_cache.enabled = False
+    _image_cache.clear()
+
+
+def clear_cache(reset_counters: bool = False) -> None:
+    """
+    Drop the cached images, keeping the cache enabled.
+
+    :param reset_counters: Whether to also reset the hit, miss and eviction counters, defaults to False
+    """
+    _image_cache.clear()
+    if reset_counters:
+        _image_cache.reset_counters()
+
+
+def cache_info() -> CacheInfo:
+    """
+    Return the hit, miss and eviction counters and the current size of the load_image cache.
+    """
+    return _image_cache.info()
+
+
+def _file_signature(file_path: str | list[str]) -> tuple:
+    """
+    Return the absolute path, size and modification time of every file making up an image.
+
+    :param file_path: A file path, a DICOM series directory or a list of files
+    """
+    if isinstance(file_path, (list, tuple)):
+        file_paths = list(file_path)
+    elif os.path.isdir(file_path):
+        file_paths = sorted(os.path.join(file_path, name) for name in os.listdir(file_path))
+    else:
+        file_paths = [file_path]
+
+    signature = []
+    for path in file_paths:
+        stat = os.stat(path)
+        signature.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def _dtype_key(dtype: str | np.dtype) -> str:
+    """
+    Return a hashable key for a dtype policy.
+
+    :param dtype: The dtype policy
+    """
+    return dtype if isinstance(dtype, str) and dtype in DTYPE_POLICIES else np.dtype(dtype).str
+
+
+def _check_lazy_supported(lazy: bool, extension: str) -> None:
+    """
+    Raise an error if lazy loading was requested for a format that does not support it.
+
+    :param lazy: Whether lazy loading was requested
+    :param extension: The extension of the file being loaded
+    """
+    if lazy:
+        raise ValueError(f"Lazy loading is not supported for file format: {extension}")
+
+
+def _check_mmap_supported(mmap_mode: Optional[str], extension: str) -> None:
+    """
+    Raise an error if memory-mapping was requested for a format that does not support it.
+
+    :param mmap_mode: The requested memory-map mode
+    :param extension: The extension of the file being loaded
+    """
+    if mmap_mode is not None:
+        raise ValueError(f"Memory-mapping is not supported for file format: {extension}")
+
+
 def from_numpy(image_data: np.ndarray) -> RadImage:
     """
     Create a RadImage from a NumPy array.
@@ -0,0 +1,59 @@
+from .rad_image import RadImage
+from .chunked_store import ChunkedVolumeReader, write_chunked
+from .dtype_policy import apply_dtype_policy, resolve_dtype
+from .slice_provider import ArraySliceProvider
+import os
+from typing import Optional
+import numpy as np
+
+
+class RadChunkedImage(RadImage):
+    def __init__(self, file_path: Optional[str] = None, lazy: bool = False, dtype: str | np.dtype = "native",
+                 chunks: Optional[tuple] = None, compression_level: int = 1):
+        """
+        Initialize the RadChunkedImage class.
+
+        :param file_path: The file path to the chunked volume file (.rvc), defaults to None
+        :param lazy: Whether to keep the image data on disk and only decompress the chunks
+            that are accessed, defaults to False
+        :param dtype: The dtype policy for the image data, defaults to "native". In lazy mode
+            integer data is not downcast, as that would require reading the whole volume.
+        :param chunks: The chunk shape used when saving, defaults to 64 voxels along every axis
+        :param compression_level: The zlib compression level used when saving, defaults to 1
+        """
+        self.lazy = lazy
+        self.chunks = chunks
+        self.compression_level = compression_level
+        super().__init__(file_path, dtype=dtype)
+
+    def load(self) -> None:
+        """
+        Load the chunked volume from the file path. The image data is stored as a NumPy array
+        in the image_data attribute. In lazy mode the chunk reader is kept instead, so get_slice
+        along any axis only decompresses the chunks that the slice crosses.
+        """
+        if not os.path.exists(self.file_path):
+            raise FileNotFoundError(f"File not found: {self.file_path}")
+
+        self.data = ChunkedVolumeReader(self.file_path)
+        self.metadata = dict(self.data.metadata)
+        if self.lazy:
+            dtype = resolve_dtype(self.dtype_policy, self.data.dtype)
+            self._set_slice_provider(ArraySliceProvider(self.data, dtype=dtype))
+        else:
+            self.image_data = apply_dtype_policy(self.data[...], self.dtype_policy)
+        if self.data.statistics:
+            self._seed_statistics(self.data.dtype, **self.data.statistics)
+
+    def save(self, output_file_path: str) -> None:
+        """
+        Save the image to a chunked volume file. Lazily loaded data is streamed to the
+        file without reading the whole volume into memory.
+
+        :param output_file_path: The output file path to save the chunked volume
+        """
+        if self.is_loaded and self._image_data is None:
+            raise ValueError("No image data to save.")
+
+        write_chunked(output_file_path, self, chunks=self.chunks, compression_level=self.compression_level,
+                      metadata=self.metadata)
@@ -1,4 +1,6 @@
 from .rad_image import RadImage
+from .dtype_policy import apply_dtype_policy
+from .geometry import dicom_affine
 import pydicom
 import os
 from typing import Optional
@@ -6,13 +8,14 @@ import numpy as np
 
 
 class RadDicomImage(RadImage):
-    def __init__(self, file_path: Optional[str] = None):
+    def __init__(self, file_path: Optional[str] = None, dtype: str | np.dtype = "native"):
         """
         Initialize the RadDicomImage class.
 
         :param file_path: The file path to the DICOM image file, defaults to None
+        :param dtype: The dtype policy for the image data, defaults to "native"
         """
-        super().__init__(file_path)
+        super().__init__(file_path, dtype=dtype)
 
     def load(self) -> None:
         """
@@ -23,8 +26,9 @@ class RadDicomImage(RadImage):
             raise FileNotFoundError(f"File not found: {self.file_path}")
 
         self.data = pydicom.dcmread(self.file_path)
-        self.image_data = np.array(self.data.pixel_array, dtype=np.float32)
+        self.image_data = apply_dtype_policy(self.data.pixel_array, self.dtype_policy)
         self.metadata = self.data.file_meta
+        self.affine = dicom_affine([self.data], stacked=int(self.data.get("NumberOfFrames", 1)) > 1)
 
     def save(self, output_file_path: str) -> None:
         """
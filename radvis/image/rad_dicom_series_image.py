@@ -0,0 +1,163 @@
+from .rad_image import RadImage
+from .dtype_policy import apply_dtype_policy, resolve_dtype
+from .slice_provider import DicomSeriesSliceProvider
+from .geometry import dicom_affine
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import pydicom
+from pydicom.uid import ExplicitVRLittleEndian
+import os
+from typing import Optional
+import numpy as np
+
+
+class RadDicomSeriesImage(RadImage):
+    def __init__(self, file_path: Optional[str | list[str]] = None, workers: Optional[int] = None,
+                 dtype: str | np.dtype = "native", lazy: bool = False):
+        """
+        Initialize the RadDicomSeriesImage class.
+
+        :param file_path: The directory containing the DICOM series, or a list of the
+            DICOM slice files, defaults to None
+        :param workers: The number of threads used to read and decode the slices,
+            defaults to None (chosen by concurrent.futures)
+        :param dtype: The dtype policy for the image data, defaults to "native"
+        :param lazy: Whether to only read the headers on load and decode the slice files when
+            they are accessed, defaults to False
+        """
+        self.workers = workers
+        self.lazy = lazy
+        self.file_paths: list[str] = []
+        super().__init__(file_path, dtype=dtype)
+
+    def load(self) -> None:
+        """
+        Load a DICOM series with one slice per file using the pydicom library.
+        The headers are read first to sort the slices by position, then the pixel data
+        of every slice is decoded on a thread pool straight into one preallocated 3D array.
+        The image data is stored as a NumPy array in the image_data attribute.
+        In lazy mode only the headers are read, and each slice file is decoded when first accessed.
+        The statistics of a lazy series are then seeded with the pixel value range if the headers
+        record it. Once the pixels are decoded they are computed from the pixels instead, as
+        these header values are often stale.
+        """
+        file_paths = self._list_files()
+        if len(file_paths) == 0:
+            raise ValueError(f"No DICOM files found in: {self.file_path}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            headers = list(executor.map(lambda path: pydicom.dcmread(path, stop_before_pixels=True), file_paths))
+
+            order = self._sort_order(headers)
+            self.file_paths = [file_paths[i] for i in order]
+            self.data = [headers[i] for i in order]
+
+            rows, columns = self.data[0].Rows, self.data[0].Columns
+            for path, header in zip(self.file_paths, self.data):
+                if (header.Rows, header.Columns) != (rows, columns):
+                    raise ValueError(f"Slice {path} has shape {(header.Rows, header.Columns)}, expected {(rows, columns)}")
+                if int(header.get("NumberOfFrames", 1)) != 1:
+                    raise ValueError(f"Multi-frame file {path} cannot be part of a series")
+
+            dtype = resolve_dtype(self.dtype_policy, self._pixel_dtype(self.data[0]))
+            self.metadata = self.data[0].file_meta
+            self.affine = dicom_affine(self.data, stacked=True)
+            if self.lazy:
+                shape = (len(self.file_paths), rows, columns)
+                self._set_slice_provider(DicomSeriesSliceProvider(self.file_paths, shape, dtype, workers=self.workers))
+                self._seed_range()
+                return
+
+            image_data = np.empty((len(self.file_paths), rows, columns), dtype=dtype)
+
+            def decode(index: int) -> None:
+                image_data[index] = pydicom.dcmread(self.file_paths[index]).pixel_array
+
+            # Consume the iterator so that decoding errors are raised here
+            list(executor.map(decode, range(len(self.file_paths))))
+
+        self.image_data = apply_dtype_policy(image_data, self.dtype_policy)
+
+    def _seed_range(self) -> None:
+        """
+        Seed the statistics with the pixel value range of the series, if every slice header records
+        the range of its pixel values.
+        """
+        if all("SmallestImagePixelValue" in h and "LargestImagePixelValue" in h for h in self.data):
+            self._seed_statistics(self._pixel_dtype(self.data[0]),
+                                  min=min(h.SmallestImagePixelValue for h in self.data),
+                                  max=max(h.LargestImagePixelValue for h in self.data))
+
+    def save(self, output_file_path: str) -> None:
+        """
+        Save the DICOM series to the output directory using the pydicom library,
+        writing one file per slice with the same file names as the input series.
+
+        :param output_file_path: The output directory to save the DICOM series to
+        """
+        if self.is_loaded and self._image_data is None:
+            raise ValueError("No image data to save.")
+
+        os.makedirs(output_file_path, exist_ok=True)
+        for index, (path, header) in enumerate(zip(self.file_paths, self.data)):
+            dataset = copy.deepcopy(header)
+            pixel_dtype = self._pixel_dtype(header)
+            # The headers were read without pixel data, so the element is added with an explicit VR
+            dataset.add_new(0x7FE00010, "OW" if header.BitsAllocated > 8 else "OB",
+                            self.get_slice(index).astype(pixel_dtype).tobytes())
+            dataset.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+            dataset.save_as(os.path.join(output_file_path, os.path.basename(path)), write_like_original=False)
+
+    @staticmethod
+    def _pixel_dtype(header) -> np.dtype:
+        """
+        Return the dtype of the stored pixel values described by a DICOM header.
+
+        :param header: The DICOM header of a slice
+        :return: The dtype pydicom decodes the pixel data to
+        """
+        signed = "i" if header.PixelRepresentation == 1 else "u"
+        return np.dtype(f"<{signed}{max(header.BitsAllocated // 8, 1)}")
+
+    def _list_files(self) -> list[str]:
+        """
+        Return the slice files of the series. Directories are searched for '.dcm' files,
+        falling back to every regular file if none have that extension.
+        """
+        if isinstance(self.file_path, (list, tuple)):
+            file_paths = list(self.file_path)
+        elif os.path.isdir(self.file_path):
+            file_paths = [os.path.join(self.file_path, name) for name in sorted(os.listdir(self.file_path))
+                          if not name.startswith(".") and name != "DICOMDIR"]
+            file_paths = [path for path in file_paths if os.path.isfile(path)]
+            dcm_paths = [path for path in file_paths if path.lower().endswith(".dcm")]
+            if dcm_paths:
+                file_paths = dcm_paths
+        else:
+            raise FileNotFoundError(f"Directory not found: {self.file_path}")
+
+        for path in file_paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"File not found: {path}")
+        return file_paths
+
+    @staticmethod
+    def _sort_order(headers: list) -> list[int]:
+        """
+        Return the order of the slices along the slice normal. Uses ImagePositionPatient
+        projected onto the normal given by ImageOrientationPatient, falling back to
+        InstanceNumber and then to the order the files were given in.
+
+        :param headers: The DICOM headers of the slices
+        :return: The indices of the headers in slice order
+        """
+        if all("ImagePositionPatient" in h and "ImageOrientationPatient" in h for h in headers):
+            orientation = np.array(headers[0].ImageOrientationPatient, dtype=np.float64)
+            normal = np.cross(orientation[:3], orientation[3:])
+            positions = np.array([h.ImagePositionPatient for h in headers], dtype=np.float64)
+            keys = positions @ normal
+        elif all("InstanceNumber" in h for h in headers):
+            keys = np.array([int(h.InstanceNumber) for h in headers])
+        else:
+            return list(range(len(headers)))
+        return np.argsort(keys, kind="stable").tolist()
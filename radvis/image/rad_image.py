@@ -1,28 +1,241 @@
 from abc import ABC, abstractmethod
 from typing import Optional
+import weakref
 import numpy as np
+from .dtype_policy import DTYPE_POLICIES, check_dtype_policy
+from .geometry import spacing_from_affine
+from .slice_provider import SliceProvider
+from .statistics import ImageStatistics
+from radvis.instrumentation import instrumented, file_bytes
+
+
+class _SharedBuffer:
+    """
+    Tracks the RadImages sharing one image data buffer after RadImage.copy(). The images are
+    held by weak references, so an image that is garbage collected stops sharing the buffer.
+    """
+    def __init__(self):
+        self._images = weakref.WeakSet()
+
+    @property
+    def owners(self) -> int:
+        """
+        Return the number of live images sharing the buffer.
+        """
+        return len(self._images)
+
+    def add(self, image: "RadImage") -> None:
+        self._images.add(image)
+
+    def discard(self, image: "RadImage") -> None:
+        self._images.discard(image)
+
+    def __reduce__(self):
+        # Weak references cannot be pickled. Unpickled images register again, see RadImage.__setstate__
+        return _SharedBuffer, ()
 
 
 class RadImage(ABC):
-    def __init__(self, file_path: Optional[str] = None):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Record the load of every format while instrumentation is on, see radvis.instrumentation
+        if "load" in cls.__dict__:
+            cls.load = instrumented("image", name=f"{cls.__name__}.load",
+                                    bytes_read=lambda self, *args, **kwargs: file_bytes(self.file_path),
+                                    output=lambda result, self, *args, **kwargs: self)(cls.__dict__["load"])
+
+    def __init__(self, file_path: Optional[str] = None, dtype: str | np.dtype = "native"):
         """
         Initialize the RadImage base class.
 
         :param file_path: The file path to the image file, defaults to None
+        :param dtype: The dtype policy used when loading the image data: "native", "downcast"
+            or a NumPy dtype, defaults to "native". See radvis.image.dtype_policy.
         """
+        check_dtype_policy(dtype)
         self.file_path = file_path
+        self.dtype_policy = dtype
         self.data = None
-        self.image_data: np.ndarray = np.array([])
+        self._image_data: np.ndarray = np.array([])
+        self._provider: Optional[SliceProvider] = None
+        self._shared: Optional[_SharedBuffer] = None
+        self._statistics: Optional[ImageStatistics] = None
         self.metadata:dict = {}
+        # The voxel to world affine, if the format records one. See radvis.image.geometry.
+        self.affine: Optional[np.ndarray] = None
+        # Where the image was cut from by radvis.processing.crop_to_foreground, if it was
+        self.crop_offset: Optional[tuple] = None
+        self.original_shape: Optional[tuple] = None
         if self.file_path:
             self.load()
 
+    @property
+    def image_data(self) -> np.ndarray:
+        """
+        Return the image data. If the image was loaded lazily, the full volume
+        is read into memory on first access. If the buffer is shared with a copy
+        of this image, it is duplicated first, as the caller may write to it.
+        For the same reason, the cached statistics are dropped.
+        """
+        self._unshare()
+        self._statistics = None
+        return self._load_image_data()
+
+    @image_data.setter
+    def image_data(self, image_data: np.ndarray) -> None:
+        """
+        Set the image data, replacing any slice provider.
+
+        :param image_data: The image data to set
+        """
+        self._release_shared()
+        self._image_data = image_data
+        self._provider = None
+        self._statistics = None
+
+    @property
+    def shares_image_data(self) -> bool:
+        """
+        Return whether the image data buffer is shared copy-on-write with another image.
+        """
+        return self._shared is not None and self._shared.owners > 1
+
+    def _load_image_data(self) -> np.ndarray:
+        """
+        Return the image data buffer, reading it in full if loaded lazily.
+        """
+        if self._provider is not None:
+            self._image_data = np.asarray(self._provider)
+            self._provider = None
+        return self._image_data
+
+    def _unshare(self) -> None:
+        """
+        Give this image a private copy of a buffer shared with other images.
+        """
+        if self.shares_image_data:
+            self._image_data = np.copy(self._image_data)
+        self._release_shared()
+
+    def _release_shared(self) -> None:
+        """
+        Stop sharing the image data buffer, leaving it to the remaining owners.
+        """
+        if self._shared is not None:
+            self._shared.discard(self)
+            self._shared = None
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        Return the dtype of the image data without reading it if loaded lazily.
+        """
+        if self._provider is not None:
+            return self._provider.dtype
+        return self._image_data.dtype
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Return whether the full image data is held in memory.
+        """
+        return self._provider is None
+
     @property
     def shape(self) -> tuple:
         """
-        Return the shape of the image data.
+        Return the shape of the image data. Lazily loaded images report their
+        shape without reading any voxels.
+        """
+        if self._provider is not None:
+            return self._provider.shape
+        return self._image_data.shape
+
+    @property
+    def spacing(self) -> tuple:
+        """
+        Return the voxel spacing along each axis, from the affine. Images without an affine
+        have a spacing of 1 along every axis.
+        """
+        return spacing_from_affine(self.affine, len(self.shape))
+
+    @property
+    def slice_provider(self) -> Optional[SliceProvider]:
+        """
+        Return the slice provider backing the image data, or None if it is held in memory.
+        """
+        return self._provider
+
+    def _set_slice_provider(self, provider: SliceProvider) -> None:
+        """
+        Back the image data with a slice provider, which only reads the regions that are
+        accessed. The full volume is read on first access of image_data.
+
+        :param provider: The slice provider giving access to the image data
+        """
+        self._release_shared()
+        self._image_data = None
+        self._provider = provider
+        self._statistics = None
+
+    @property
+    def statistics(self) -> ImageStatistics:
+        """
+        Return the intensity statistics of the image data (min, max, mean, histogram and
+        percentiles), each computed on first use and cached until the image data changes.
+        Lazily loaded images are read a block at a time. See radvis.image.statistics.
+
+        :raises ValueError: If image data is not loaded.
         """
-        return self.image_data.shape
+        if self._statistics is None:
+            if self._provider is not None:
+                self._statistics = ImageStatistics(self._provider)
+            elif self._image_data is None:
+                raise ValueError("Image data not loaded")
+            else:
+                data = self._image_data.view()
+                data.flags.writeable = False
+                self._statistics = ImageStatistics(data)
+        return self._statistics
+
+    def invalidate_statistics(self) -> None:
+        """
+        Drop the cached statistics. Needed after writing to the image data through an array
+        obtained before the statistics were computed.
+        """
+        self._statistics = None
+
+    def _seed_statistics(self, stored_dtype: np.dtype, **values) -> None:
+        """
+        Record statistics of the stored data known without reading it, e.g. from a file header.
+        They are converted to the dtype of the image data, unless the dtype policy may have changed
+        the values by casting them.
+
+        :param stored_dtype: The dtype of the data the values describe
+        :param values: The statistics, e.g. min=0, max=4095
+        """
+        dtype = np.dtype(self.dtype)
+        if self.dtype_policy in DTYPE_POLICIES or np.can_cast(stored_dtype, dtype):
+            # Casts are monotonic, so the extremes of the cast data are the cast extremes
+            self.statistics.seed(**{name: dtype.type(value) for name, value in values.items()})
+
+    def _read(self, key) -> np.ndarray:
+        """
+        Read part of the image data, only reading the requested region through the
+        slice provider when the image is not loaded into memory.
+
+        :param key: Any index accepted by NumPy arrays
+        :return: The requested region of the image data
+        """
+        if self._provider is not None:
+            return self._provider[key]
+
+        region = self._image_data[key]
+        if self.shares_image_data and isinstance(region, np.ndarray):
+            # Writes through a view would leak into the copies sharing the buffer
+            region = region.view()
+            region.flags.writeable = False
+        return region
 
     @abstractmethod
     def load(self) -> None:
@@ -46,11 +259,11 @@ class RadImage(ABC):
         """
         Return information about the image shape and header.
         """
-        if self.image_data is None:
+        if self.is_loaded and self._image_data is None:
             return "Image data not loaded"
 
         # Get the shape of the image
-        shape_str = f"Shape: {self.image_data.shape}"
+        shape_str = f"Shape: {self.shape}"
 
         # Get the header information
         header_str = ""
@@ -60,11 +273,22 @@ class RadImage(ABC):
 
         return f"{shape_str}\n{header_str}"
     
-    def get_image_data(self) -> np.ndarray:
+    def get_image_data(self, readonly: bool = False) -> np.ndarray:
         """
         Return the image data.
+
+        :param readonly: Whether to return a read-only view, defaults to False. A read-only
+            view never duplicates a buffer shared with copies of this image.
         """
-        return self.image_data
+        if not readonly:
+            return self.image_data
+
+        image_data = self._load_image_data()
+        if image_data is None:
+            return None
+        image_data = image_data.view()
+        image_data.flags.writeable = False
+        return image_data
 
     def set_image_data(self, image_data: np.ndarray) -> None:
         """
@@ -82,33 +306,51 @@ class RadImage(ABC):
         :param axis: The axis along which to take the slice
         :return: A 2D slice of the image data
         """
-        if self.image_data is None:
+        if self.is_loaded and self._image_data is None:
             raise ValueError("Image data not loaded")
 
+        shape = self.shape
+
         # Checks that axis is within the bounds of the image data
-        if axis < 0 or axis >= len(self.image_data.shape):
-            raise ValueError(f"Axis {axis} is out of bounds for image data of shape {self.image_data.shape}")
+        if axis < 0 or axis >= len(shape):
+            raise ValueError(f"Axis {axis} is out of bounds for image data of shape {shape}")
         
         # Checks that the index is within the bounds of the image data
-        if index < 0 or index >= self.image_data.shape[axis]:
+        if index < 0 or index >= shape[axis]:
             raise ValueError(f"Index {index} is out of bounds for axis {axis}")
 
-        # Slice along the appropriate axis
-        slicer = [slice(None)] * self.image_data.ndim
+        # Slice along the appropriate axis, only reading that slice if loaded lazily
+        slicer = [slice(None)] * len(shape)
         slicer[axis] = index
-        return self.image_data[tuple(slicer)]
+        return self._read(tuple(slicer))
     
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        # Images unpickled together still share their buffer, an image unpickled alone owns it
+        if self._shared is not None:
+            self._shared.add(self)
+
     def copy(self) -> 'RadImage':
         """ 
-        Return a copy of the image.
+        Return a copy of the image without reading the file again.
+        The image data buffer is shared copy-on-write: it is only duplicated once
+        either image's image_data is accessed, and slice providers are shared as is.
+        Buffers memory-mapped to a file (other than with mode 'c') are shared as is too,
+        as writes to them are meant to reach the file.
         """
-        new_image = self.__class__(self.file_path)
-        new_image.data = self.data
+        new_image = self.__class__.__new__(self.__class__)
+        new_image.__dict__.update(self.__dict__)
 
-        if self.image_data is not None:
-            new_image.image_data = np.copy(self.image_data)
+        if self._provider is None and self._image_data is not None and not _maps_file(self._image_data):
+            if self._shared is None:
+                self._shared = _SharedBuffer()
+                self._shared.add(self)
+            self._shared.add(new_image)
+            new_image._shared = self._shared
 
         new_image.metadata = self.metadata.copy()
+        if self.affine is not None:
+            new_image.affine = self.affine.copy()
         return new_image
 
     def __recv__(self) -> str:
@@ -121,7 +363,14 @@ class RadImage(ABC):
         """
         Return the image data at the given index.
         """
-        if self.image_data is not None:
-            return self.image_data[value]
+        if self._provider is not None or self._image_data is not None:
+            return self._read(value)
         else:
-            return None
\ No newline at end of file
+            return None
+
+
+def _maps_file(image_data: np.ndarray) -> bool:
+    """
+    Return whether image data is a memory map whose writes go to its file, or that is read-only.
+    """
+    return isinstance(image_data, np.memmap) and image_data.mode != "c"
@@ -1,4 +1,6 @@
 from .rad_image import RadImage
+from .dtype_policy import apply_dtype_policy, resolve_dtype
+from .slice_provider import ArraySliceProvider
 import nibabel as nib
 import os
 from typing import Optional
@@ -6,25 +8,51 @@ import numpy as np
 nib.Nifti1Header.quaternion_threshold = -1e-06
 
 class RadNiftiImage(RadImage):
-    def __init__(self, file_path: Optional[str] = None):
+    def __init__(self, file_path: Optional[str] = None, lazy: bool = False, dtype: str | np.dtype = "native"):
         """
         Initialize the RadNiftiImage class.
 
         :param file_path: The file path to the NIFTI image file, defaults to None
+        :param lazy: Whether to keep the image data on disk behind nibabel's array proxy
+            and only read the voxels that are accessed, defaults to False
+        :param dtype: The dtype policy for the image data, defaults to "native". In lazy mode
+            integer data is not downcast, as that would require reading the whole volume.
         """
-        super().__init__(file_path)
+        self.lazy = lazy
+        super().__init__(file_path, dtype=dtype)
 
     def load(self) -> None:
         """
         Load the NIFTI image from the file path using the nibabel library.
         The image data is stored as a NumPy array in the image_data attribute.
+        In lazy mode the array proxy is kept instead, so slicing only reads the
+        bytes it touches and the full volume is read on first use of image_data.
+
+        With the "native" dtype policy the on-disk dtype is kept, unless the header's
+        scaling factors require floating point values.
         """
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"File not found: {self.file_path}")
 
-        self.data = nib.load(self.file_path)
-        self.image_data = np.asanyarray(self.data.dataobj, dtype=np.float32)
+        # Eager loads read the voxels into memory rather than memory-mapping uncompressed files
+        self.data = nib.load(self.file_path) if self.lazy else nib.load(self.file_path, mmap=False)
+        if self.lazy:
+            dtype = resolve_dtype(self.dtype_policy, self._native_dtype())
+            self._set_slice_provider(ArraySliceProvider(self.data.dataobj, dtype=dtype))
+        else:
+            self.image_data = apply_dtype_policy(np.asanyarray(self.data.dataobj), self.dtype_policy)
         self.metadata = self.data.header
+        self.affine = self.data.affine
+
+    def _native_dtype(self) -> np.dtype:
+        """
+        Return the dtype the array proxy produces: the on-disk dtype, or a floating point
+        dtype when the data is scaled by scl_slope/scl_inter.
+        """
+        dataobj = self.data.dataobj
+        if dataobj.slope != 1 or dataobj.inter != 0:
+            return np.result_type(dataobj.dtype, np.float32, np.asarray(dataobj.slope).dtype)
+        return dataobj.dtype
 
     def save(self, output_file_path: str) -> None:
         """
@@ -35,5 +63,5 @@ class RadNiftiImage(RadImage):
         if self.image_data is None:
             raise ValueError("No image data to save.")
 
-        nifti_data = nib.Nifti1Image(self.image_data, affine=np.eye(4))
+        nifti_data = nib.Nifti1Image(self.image_data, affine=np.eye(4) if self.affine is None else self.affine)
         nib.save(nifti_data, output_file_path)
\ No newline at end of file
@@ -1,37 +1,124 @@
 from .rad_image import RadImage
+from .dtype_policy import apply_dtype_policy, resolve_dtype
+from .slice_provider import ArraySliceProvider
 import numpy as np
 import os
 
+# The np.load memory-map modes that open an existing file without overwriting it
+MMAP_MODES = ("r", "r+", "c")
+
+
+def check_mmap_mode(mmap_mode: str | None) -> None:
+    """
+    Raise an error if the memory-map mode is not None or one of MMAP_MODES.
+
+    :param mmap_mode: The memory-map mode to check
+    """
+    if mmap_mode is not None and mmap_mode not in MMAP_MODES:
+        # "w+" would truncate the file before reading it
+        raise ValueError(f"Unsupported memory-map mode '{mmap_mode}'. Use one of {MMAP_MODES}.")
+
+
 class RadNumpyImage(RadImage):
 
-    def __init__(self, file_path: str|None = None):
+    def __init__(self, file_path: str|None = None, dtype: str|np.dtype = "native", mmap_mode: str|None = None,
+                 lazy: bool = False):
         """
         Initialize the RadNumpyImage class.
 
         :param file_path: The file path to the Numpy image file, defaults to None
+        :param dtype: The dtype policy for the image data, defaults to "native"
+        :param mmap_mode: The np.load memory-map mode ('r', 'r+' or 'c'), defaults to None.
+            Memory-mapped image data is paged in from disk as it is accessed and can be shared
+            between processes through the page cache. Requires the "native" dtype policy.
+        :param lazy: Whether to read the image data through a read-only memmap, only reading the
+            regions that are accessed and the full volume on first use of image_data, defaults to False
+        """
+        check_mmap_mode(mmap_mode)
+        self.mmap_mode = mmap_mode
+        self.lazy = lazy
+        super().__init__(file_path, dtype=dtype)
+
+    @classmethod
+    def create_memmap(cls, file_path: str, shape: tuple, dtype: np.dtype = np.float32) -> 'RadNumpyImage':
+        """
+        Create a .npy file of the given shape and dtype and return a RadNumpyImage whose image data
+        is memory-mapped to it, so results can be written into it incrementally (e.g. slice by
+        slice) without building the whole volume in memory first. Call flush() when done.
+
+        :param file_path: The file path of the .npy file to create
+        :param shape: The shape of the image data
+        :param dtype: The dtype of the image data, defaults to np.float32
+        :return: A RadNumpyImage backed by the new file
         """
-        super().__init__(file_path)
+        image = cls(dtype=dtype)
+        image.file_path = file_path
+        image.mmap_mode = "r+"
+        image.image_data = np.lib.format.open_memmap(file_path, mode="w+", dtype=dtype, shape=tuple(shape))
+        return image
 
     def load(self) -> None:
         """
         Load the Numpy image from the file path using the numpy library.
-        The image data is stored as a NumPy array in the image_data attribute.
+        The image data is stored as a NumPy array (or a NumPy memmap if mmap_mode is set)
+        in the image_data attribute. In lazy mode a slice provider over a memmap is kept instead.
         """
         if self.file_path is None:
             raise ValueError("No file path provided.")
-        
+        check_mmap_mode(self.mmap_mode)
+
         if not os.path.exists(self.file_path):
             raise FileNotFoundError(f"File not found: {self.file_path}")
 
-        self.image_data = np.load(self.file_path)
+        if self.lazy:
+            image_data = np.load(self.file_path, mmap_mode=self.mmap_mode or "r")
+            dtype = resolve_dtype(self.dtype_policy, image_data.dtype)
+            self._set_slice_provider(ArraySliceProvider(image_data, dtype=dtype))
+            return
+
+        image_data = np.load(self.file_path, mmap_mode=self.mmap_mode)
+        if self.mmap_mode is not None:
+            if self.dtype_policy != "native" and resolve_dtype(self.dtype_policy, image_data.dtype) != image_data.dtype:
+                raise ValueError(f"Memory-mapped images keep their stored dtype {image_data.dtype}, "
+                                 f"got dtype policy '{self.dtype_policy}'")
+            self.image_data = image_data
+        else:
+            self.image_data = apply_dtype_policy(image_data, self.dtype_policy)
 
-    def save(self, output_file_path: str) -> None:
+    def save(self, output_file_path: str, chunk_rows: int = 64) -> None:
         """
         Save the Numpy image to the output file path using the numpy library.
+        Memory-mapped or lazily loaded image data is streamed into a preallocated memory-mapped
+        file chunk_rows slices at a time instead of being read into memory in full.
 
         :param output_file_path: The output file path to save the Numpy image
+        :param chunk_rows: The number of slices along axis 0 copied at a time when streaming, defaults to 64
         """
-        if self.image_data is None:
+        if self.is_loaded and self._image_data is None:
             raise ValueError("No image data to save.")
 
-        np.save(output_file_path, self.image_data)
\ No newline at end of file
+        if self.is_loaded and not isinstance(self._image_data, np.memmap):
+            np.save(output_file_path, self.get_image_data(readonly=True))
+            return
+
+        # Match np.save, which adds the extension if it is missing
+        if not output_file_path.endswith(".npy"):
+            output_file_path += ".npy"
+
+        if isinstance(self._image_data, np.memmap) and os.path.exists(output_file_path) \
+                and os.path.samefile(output_file_path, self._image_data.filename):
+            self._image_data.flush()
+            return
+
+        output = np.lib.format.open_memmap(output_file_path, mode="w+", dtype=self.dtype, shape=self.shape)
+        for start in range(0, self.shape[0], chunk_rows):
+            output[start:start + chunk_rows] = self._read(slice(start, start + chunk_rows))
+        output.flush()
+        del output
+
+    def flush(self) -> None:
+        """
+        Write any changes to memory-mapped image data to disk.
+        """
+        if isinstance(self._image_data, np.memmap):
+            self._image_data.flush()
@@ -0,0 +1,192 @@
+"""
+Slice providers give RadImages read access to image data that has not been loaded into memory.
+Indexing a provider only reads the region that is requested, so a slice costs about one
+slice's worth of I/O, whatever the size of the volume.
+
+Providers:
+    ArraySliceProvider: Wraps any array-like object with shape, dtype and slicing, such as a
+        NumPy memmap, a nibabel array proxy or a ChunkedVolumeReader.
+    DicomSeriesSliceProvider: Decodes only the files of a DICOM series that a region crosses.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Optional
+import numpy as np
+
+
+class SliceProvider(ABC):
+    """ Array-like read access to image data that reads only the requested region """
+
+    @property
+    @abstractmethod
+    def shape(self) -> tuple:
+        """Get the shape of the image data."""
+        pass
+
+    @property
+    @abstractmethod
+    def dtype(self) -> np.dtype:
+        """Get the dtype of the image data returned by the provider."""
+        pass
+
+    @abstractmethod
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Read a region of the image data.
+
+        :param key: Any index accepted by NumPy arrays
+        :return: The region as a NumPy array
+        """
+        pass
+
+    @property
+    def ndim(self) -> int:
+        """Get the number of dimensions of the image data."""
+        return len(self.shape)
+
+    def get_slice(self, index: int, axis: int = 0) -> np.ndarray:
+        """
+        Read a 2D slice of the image data along the specified axis and index.
+
+        :param index: The index of the slice to take
+        :param axis: The axis along which to take the slice
+        :return: The slice as a NumPy array
+        """
+        slicer = [slice(None)] * self.ndim
+        slicer[axis] = index
+        return self[tuple(slicer)]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self[...]
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+
+class ArraySliceProvider(SliceProvider):
+    """ Slice provider over an array-like object, e.g. a memmap or a nibabel array proxy """
+
+    def __init__(self, array, dtype: Optional[np.dtype] = None):
+        """
+        Initialize the ArraySliceProvider class.
+
+        :param array: An array-like object with shape, dtype and slicing that returns NumPy arrays
+        :param dtype: The dtype to cast the regions read to, defaults to the dtype of array
+        """
+        self.array = array
+        self._dtype = np.dtype(array.dtype if dtype is None else dtype)
+
+    @property
+    def shape(self) -> tuple:
+        """Get the shape of the image data."""
+        return tuple(self.array.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Get the dtype of the image data returned by the provider."""
+        return self._dtype
+
+    def __getitem__(self, key) -> np.ndarray:
+        return np.asarray(self.array[key]).astype(self._dtype, copy=False)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.asarray(self.array, dtype=self._dtype if dtype is None else dtype)
+
+
+class DicomSeriesSliceProvider(SliceProvider):
+    """ Slice provider over a sorted DICOM series that only decodes the slice files it needs """
+
+    def __init__(self, file_paths: list[str], shape: tuple, dtype: np.dtype, workers: Optional[int] = None,
+                 cache_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the DicomSeriesSliceProvider class.
+
+        :param file_paths: The slice files, sorted along the slice normal
+        :param shape: The shape of the series (slices, rows, columns)
+        :param dtype: The dtype to cast the decoded slices to
+        :param workers: The number of threads used when a region crosses several files, defaults to None
+        :param cache_bytes: The maximum size of recently decoded slices kept in memory, defaults to 256 MiB
+        """
+        self.file_paths = file_paths
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self) -> tuple:
+        """Get the shape of the image data."""
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Get the dtype of the image data returned by the provider."""
+        return self._dtype
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        first = key[0] if len(key) > 0 and key[0] is not Ellipsis else slice(None)
+        rest = key[1:] if len(key) > 0 and key[0] is not Ellipsis else key
+
+        # Only decode the files selected along the slice axis
+        if isinstance(first, (int, np.integer)) and not isinstance(first, bool):
+            return self._decode(range(self._shape[0])[first])[rest]
+        if isinstance(first, slice):
+            indices = range(self._shape[0])[first]
+            return self._decode_many(indices)[(slice(None),) + rest]
+        return self._decode_many(range(self._shape[0]))[key]
+
+    def __getstate__(self) -> dict:
+        # The lock and slice cache are not sent along when pickling, e.g. to worker processes
+        state = self.__dict__.copy()
+        state.update(_lock=None, _cache=OrderedDict(), _cached_bytes=0)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _decode_many(self, indices: range) -> np.ndarray:
+        """
+        Decode several slices into one array, on a thread pool when there is more than one.
+
+        :param indices: The indices of the slices to decode
+        """
+        out = np.empty((len(indices),) + self._shape[1:], dtype=self._dtype)
+        if len(indices) == 1:
+            out[0] = self._decode(indices[0])
+        elif len(indices) > 1:
+            def decode(position: int) -> None:
+                out[position] = self._decode(indices[position])
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(decode, range(len(indices))))
+        return out
+
+    def _decode(self, index: int) -> np.ndarray:
+        """
+        Decode a single slice, reusing recently decoded slices.
+
+        :param index: The index of the slice to decode
+        """
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+
+        # Imported here so that only series which are actually decoded need pydicom
+        import pydicom
+        pixels = pydicom.dcmread(self.file_paths[index]).pixel_array.astype(self._dtype, copy=False)
+        pixels.flags.writeable = False
+
+        with self._lock:
+            self._cache[index] = pixels
+            self._cached_bytes += pixels.nbytes
+            while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+        return pixels
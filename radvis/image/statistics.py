@@ -0,0 +1,155 @@
+"""
+Cached intensity statistics of image data.
+
+RadImage.statistics computes each statistic on first use and keeps it until the image data
+changes: setting image_data, or accessing it (which hands out a writable array), drops the cached
+statistics. Writes through an array obtained before the statistics were computed are not seen,
+so call RadImage.invalidate_statistics() after them.
+
+Some statistics are known without reading the image data: DICOM headers may record the smallest
+and largest pixel values, and chunked volumes record their range as they are written. Lazy DICOM
+series and chunked volumes seed the statistics with these values. Images decoded into memory
+compute them from the pixels, as the DICOM header values are often stale.
+
+Lazily loaded images are read a block of slices at a time, so their statistics do not load the
+whole volume.
+
+Example:
+    image = load_image("ct.nii.gz")
+    image.statistics.min, image.statistics.max
+    lower, upper = image.statistics.percentiles([0.5, 99.5])
+"""
+from typing import Optional, Sequence
+import numpy as np
+from .slice_provider import SliceProvider
+
+# The approximate number of voxels read at a time from lazily loaded images
+_BLOCK_VOXELS = 1 << 22
+
+
+class ImageStatistics:
+    def __init__(self, data: np.ndarray | SliceProvider, **known):
+        """
+        Initialize the ImageStatistics class.
+
+        :param data: The image data, as a read-only array or the slice provider of a lazily loaded image
+        :param known: Statistics known in advance, e.g. min and max from a file header
+        """
+        self._data = data
+        self._values: dict = dict(known)
+        self._percentiles: dict[float, float] = {}
+        self._histograms: dict[tuple, tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def min(self):
+        """
+        The minimum intensity.
+        """
+        if "min" not in self._values:
+            self._compute_range()
+        return self._values["min"]
+
+    @property
+    def max(self):
+        """
+        The maximum intensity.
+        """
+        if "max" not in self._values:
+            self._compute_range()
+        return self._values["max"]
+
+    @property
+    def mean(self) -> float:
+        """
+        The mean intensity, accumulated in float64.
+        """
+        if "mean" not in self._values:
+            if isinstance(self._data, np.ndarray) and not isinstance(self._data, np.memmap):
+                self._values["mean"] = float(np.mean(self._data, dtype=np.float64))
+            else:
+                total = sum(float(np.sum(block, dtype=np.float64)) for block in self._blocks())
+                self._values["mean"] = total / max(1, int(np.prod(self._data.shape, dtype=np.int64)))
+        return self._values["mean"]
+
+    def histogram(self, bins: int = 256, range: Optional[tuple] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the histogram of the intensities, as np.histogram does.
+
+        :param bins: The number of equal width bins, defaults to 256
+        :param range: The lower and upper edges of the bins, defaults to the intensity range
+        :return: The counts and the bin edges
+        """
+        if range is None:
+            range = (float(self.min), float(self.max))
+        key = (int(bins), float(range[0]), float(range[1]))
+        if key not in self._histograms:
+            if isinstance(self._data, np.ndarray) and not isinstance(self._data, np.memmap):
+                self._histograms[key] = np.histogram(self._data, bins=key[0], range=key[1:])
+            else:
+                edges = np.histogram_bin_edges([], bins=key[0], range=key[1:])
+                counts = sum(np.histogram(block, bins=edges)[0] for block in self._blocks())
+                self._histograms[key] = (counts, edges)
+        counts, edges = self._histograms[key]
+        return counts.copy(), edges.copy()
+
+    def percentiles(self, percentiles: float | Sequence[float]) -> np.ndarray:
+        """
+        Return exact percentiles of the intensities, as np.percentile does. Percentiles that were
+        not asked for before are computed together in one pass.
+
+        :param percentiles: The percentiles, between 0 and 100
+        :return: The value of each percentile
+        """
+        # Imported here as the processing package imports this one
+        from radvis.processing.percentiles import compute_percentiles
+
+        q = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+        missing = sorted({float(p) for p in q} - self._percentiles.keys())
+        if missing:
+            values = compute_percentiles(self._data, missing).values
+            self._percentiles.update(zip(missing, values))
+        values = np.array([self._percentiles[float(p)] for p in q])
+        return values if np.ndim(percentiles) else values[0]
+
+    def seed(self, **values) -> None:
+        """
+        Record statistics known without reading the image data.
+
+        :param values: The statistics, e.g. min=0, max=4095
+        """
+        self._values.update(values)
+
+    def is_cached(self, name: str) -> bool:
+        """
+        Return whether a statistic (min, max or mean) is known without reading the image data.
+
+        :param name: The name of the statistic
+        """
+        return name in self._values
+
+    def _compute_range(self) -> None:
+        """
+        Compute the minimum and maximum together.
+        """
+        if isinstance(self._data, np.ndarray) and not isinstance(self._data, np.memmap):
+            self._values["min"], self._values["max"] = self._data.min(), self._data.max()
+        else:
+            ranges = [(block.min(), block.max()) for block in self._blocks() if block.size]
+            self._values["min"] = min(low for low, _ in ranges)
+            self._values["max"] = max(high for _, high in ranges)
+
+    def _blocks(self):
+        """
+        Yield the image data a block of slices along axis 0 at a time.
+        """
+        shape = self._data.shape
+        if len(shape) == 0:
+            yield np.reshape(np.asarray(self._data), 1)
+            return
+        rows = max(1, _BLOCK_VOXELS // max(1, int(np.prod(shape[1:], dtype=np.int64))))
+        for row in range(0, shape[0], rows):
+            yield np.asarray(self._data[row:row + rows])
+
+    def __repr__(self) -> str:
+        known = ", ".join(f"{name}={value}" for name, value in self._values.items())
+        return f"ImageStatistics({known})"
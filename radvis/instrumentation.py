@@ -0,0 +1,303 @@
+"""
+Opt-in instrumentation of loading, processing, meshing and rendering.
+
+Instrumented calls (load_image and every RadImage.load, the radvis.processing functions,
+compute_marching_cubes, RadMesh.save/load and RadSlicer frame renders) record an Event with their
+wall time, the bytes they read, the bytes they allocated and the size of their output. Events are
+only recorded while a profile is open or a callback is registered. Otherwise an instrumented call
+costs one flag check.
+
+Fields of an Event:
+    name, category: What was called, e.g. "noise_reduction" in "processing".
+    start, seconds: When it started (time.perf_counter) and how long it took.
+    bytes_read: The size of the files loaded, or of the image data a function was given.
+    bytes_allocated: The peak memory allocated during the call, traced with tracemalloc when the
+        profile measures memory, otherwise None. Threads allocating at the same time are counted too.
+    output_bytes: The size of the image data, mesh or array returned.
+    thread: The id of the calling thread.
+    depth: How many instrumented calls the call is nested in.
+
+Example:
+    with profile(memory=True) as session:
+        image = load_image("ct.nii.gz")
+        noise_reduction(image, 1.5)
+    print(session)
+    session.to_chrome_trace("trace.json")  # open in chrome://tracing or Perfetto
+
+    add_callback(lambda event: logger.info("%s took %.3f s", event.name, event.seconds))
+"""
+from contextlib import contextmanager
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Callable, Iterator, NamedTuple, Optional
+
+
+class Event(NamedTuple):
+    """ One instrumented call """
+    name: str
+    category: str
+    start: float
+    seconds: float
+    bytes_read: int
+    bytes_allocated: Optional[int]
+    output_bytes: int
+    thread: int
+    depth: int
+
+
+# Checked by every instrumented call, so that instrumentation costs nothing measurable when off
+_enabled = False
+_profiles: list["Profile"] = []
+_callbacks: list[Callable[[Event], None]] = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Profile:
+    def __init__(self, memory: bool = False):
+        """
+        Initialize the Profile class. Use profile() to record one.
+
+        :param memory: Whether to trace the bytes allocated by each call with tracemalloc, defaults
+            to False. Tracing slows down allocations.
+        """
+        self.memory = memory
+        self.events: list[Event] = []
+        self.start = time.perf_counter()
+
+    def summary(self) -> list[dict]:
+        """
+        Return the calls, total time and largest allocation of each instrumented function,
+        slowest first.
+        """
+        totals: dict[tuple, dict] = {}
+        for event in self.events:
+            total = totals.setdefault((event.category, event.name), {
+                "name": event.name, "category": event.category, "calls": 0, "seconds": 0.0,
+                "bytes_read": 0, "peak_bytes_allocated": None, "output_bytes": 0})
+            total["calls"] += 1
+            total["seconds"] += event.seconds
+            total["bytes_read"] += event.bytes_read
+            total["output_bytes"] += event.output_bytes
+            if event.bytes_allocated is not None:
+                total["peak_bytes_allocated"] = max(total["peak_bytes_allocated"] or 0, event.bytes_allocated)
+        return sorted(totals.values(), key=lambda total: -total["seconds"])
+
+    def to_json(self, file_path: Optional[str] = None) -> str:
+        """
+        Return the events as JSON, with start times relative to the start of the profile.
+
+        :param file_path: A file to also write the JSON to, defaults to None
+        """
+        events = [dict(event._asdict(), start=event.start - self.start) for event in self.events]
+        text = json.dumps({"events": events, "summary": self.summary()}, indent=2)
+        if file_path is not None:
+            with open(file_path, "w") as file:
+                file.write(text)
+        return text
+
+    def to_chrome_trace(self, file_path: str) -> None:
+        """
+        Write the events in the Chrome trace event format, which chrome://tracing and Perfetto display
+        as a timeline per thread.
+
+        :param file_path: The file to write the trace to
+        """
+        pid = os.getpid()
+        trace = [{
+            "name": event.name, "cat": event.category, "ph": "X", "pid": pid, "tid": event.thread,
+            "ts": (event.start - self.start) * 1e6, "dur": event.seconds * 1e6,
+            "args": {"bytes_read": event.bytes_read, "bytes_allocated": event.bytes_allocated,
+                     "output_bytes": event.output_bytes},
+        } for event in self.events]
+        with open(file_path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+
+    def __str__(self) -> str:
+        lines = [f"{'name':32} {'calls':>6} {'seconds':>10} {'read MiB':>10} {'alloc MiB':>10} {'out MiB':>10}"]
+        for total in self.summary():
+            allocated = total["peak_bytes_allocated"]
+            lines.append(f"{total['name']:32} {total['calls']:6d} {total['seconds']:10.4f} "
+                         f"{total['bytes_read'] / 2 ** 20:10.1f} "
+                         f"{'-' if allocated is None else f'{allocated / 2 ** 20:.1f}':>10} "
+                         f"{total['output_bytes'] / 2 ** 20:10.1f}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Profile]:
+    """
+    Record the instrumented calls made inside the context, from any thread.
+
+    :param memory: Whether to trace the bytes allocated by each call with tracemalloc, defaults to False
+    :return: The Profile holding the recorded events
+    """
+    session = Profile(memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    with _lock:
+        _profiles.append(session)
+        _update_enabled()
+    try:
+        yield session
+    finally:
+        with _lock:
+            _profiles.remove(session)
+            _update_enabled()
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def add_callback(callback: Callable[[Event], None]) -> None:
+    """
+    Call a function with every Event recorded from now on, until it is removed.
+
+    :param callback: The function to call
+    """
+    with _lock:
+        _callbacks.append(callback)
+        _update_enabled()
+
+
+def remove_callback(callback: Callable[[Event], None]) -> None:
+    """
+    Stop calling a function added with add_callback.
+
+    :param callback: The function to remove
+    """
+    with _lock:
+        _callbacks.remove(callback)
+        _update_enabled()
+
+
+def instrumented(category: str, name: Optional[str] = None,
+                 bytes_read: Optional[Callable[..., int]] = None,
+                 output: Optional[Callable[..., object]] = None) -> Callable:
+    """
+    Decorate a function so that its calls are recorded while instrumentation is on.
+
+    :param category: The category of the events, e.g. "processing"
+    :param name: The name of the events, defaults to the name of the function
+    :param bytes_read: Returns the bytes read by a call given its arguments, defaults to the size
+        of the image data or array passed first
+    :param output: Returns what a call produced, or its size in bytes, given its result and arguments,
+        defaults to the result
+    """
+    def decorate(function: Callable) -> Callable:
+        event_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            read = bytes_read(*args, **kwargs) if bytes_read is not None else _first_input_bytes(args, kwargs)
+            stack = _stack()
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                # Fold the peak so far into the enclosing call before resetting it for this one
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                stack.append([current, current])
+            else:
+                stack.append(None)
+
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                frame = stack.pop()
+                allocated = None
+                if frame is not None and tracemalloc.is_tracing():
+                    frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+                    allocated = frame[1] - frame[0]
+                    if stack and stack[-1] is not None:
+                        stack[-1][1] = max(stack[-1][1], frame[1])
+            produced = output(result, *args, **kwargs) if output is not None else result
+            output_bytes = produced if isinstance(produced, int) else nbytes(produced)
+            _record(Event(event_name, category, start, seconds, read, allocated, output_bytes,
+                          threading.get_ident(), len(stack)))
+            return result
+
+        return wrapper
+    return decorate
+
+
+def nbytes(value: object) -> int:
+    """
+    Return the size of the data held by an image, mesh, array, or a tuple or list of them.
+    Lazily loaded images only count the data read so far.
+
+    :param value: The object to measure
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if hasattr(value, "slice_provider") and hasattr(value, "is_loaded"):
+        data = value._image_data if value.is_loaded else None
+        return int(getattr(data, "nbytes", 0))
+    if hasattr(value, "vertices") and hasattr(value, "faces"):
+        return sum(int(getattr(part, "nbytes", 0)) for part in (value.vertices, value.faces, value.normals, value.values))
+    return int(getattr(value, "nbytes", 0))
+
+
+def file_bytes(file_path) -> int:
+    """
+    Return the size of a file, of the files in a directory, or of a list of files.
+
+    :param file_path: The path, or a list of paths
+    """
+    if isinstance(file_path, (list, tuple)):
+        return sum(file_bytes(path) for path in file_path)
+    if not isinstance(file_path, (str, os.PathLike)) or not os.path.exists(file_path):
+        return 0
+    if os.path.isdir(file_path):
+        return sum(entry.stat().st_size for entry in os.scandir(file_path) if entry.is_file())
+    return os.path.getsize(file_path)
+
+
+def _first_input_bytes(args: tuple, kwargs: dict) -> int:
+    """
+    Return the size of the image data or array passed first to a call.
+    """
+    values = list(args[:1]) or list(kwargs.values())[:1]
+    return nbytes(values[0]) if values else 0
+
+
+def _stack() -> list:
+    """
+    Return the calling thread's stack of open instrumented calls.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _record(event: Event) -> None:
+    """
+    Add an event to the open profiles and pass it to the callbacks.
+    """
+    with _lock:
+        profiles, callbacks = list(_profiles), list(_callbacks)
+    for session in profiles:
+        session.events.append(event)
+    for callback in callbacks:
+        callback(event)
+
+
+def _update_enabled() -> None:
+    """
+    Turn instrumentation on while a profile is open or a callback is registered. Called with _lock held.
+    """
+    global _enabled
+    _enabled = bool(_profiles or _callbacks)
@@ -1,4 +1,14 @@
-from .compute_mesh import compute_marching_cubes
-from .rad_mesh import RadMesh
+from typing import TYPE_CHECKING
+from .._lazy import attach
 
-__all__ = ["compute_marching_cubes", "RadMesh"]
\ No newline at end of file
+__all__ = ["compute_marching_cubes", "compute_label_meshes", "RadMesh"]
+
+__getattr__, __dir__ = attach(__name__, {
+    "compute_marching_cubes": ".compute_mesh",
+    "compute_label_meshes": ".compute_mesh",
+    "RadMesh": ".rad_mesh",
+})
+
+if TYPE_CHECKING:
+    from .compute_mesh import compute_marching_cubes, compute_label_meshes
+    from .rad_mesh import RadMesh
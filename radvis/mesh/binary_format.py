@@ -0,0 +1,152 @@
+"""
+A compact binary mesh format (.rvm) holding the vertices, faces, normals and values of a RadMesh.
+
+File layout:
+    MAGIC | array 0 | array 1 | ... | JSON index | index offset (uint64) | MAGIC
+
+Each array is written as raw little-endian bytes, or zlib compressed, starting at a multiple of
+64 bytes. The JSON index holds the dtype, shape, byte offset and length of every array and the
+compression. Vertices, normals and values are stored as float32 and faces as uint32 by default,
+so a round trip of a mesh with these dtypes (as marching cubes gives) is lossless.
+
+Uncompressed arrays are written straight from memory and can be read back as memory maps, so
+opening a mesh does not read it.
+
+Usage:
+    write_binary_mesh("mesh.rvm", vertices, faces, normals, values)
+    vertices, faces, normals, values = read_binary_mesh("mesh.rvm", mmap_mode="r")
+"""
+import json
+import struct
+import zlib
+from typing import Optional
+import numpy as np
+
+MAGIC = b"RVMESH01"
+_TRAILER = struct.Struct("<Q8s")
+_ALIGNMENT = 64
+_ARRAYS = ("vertices", "faces", "normals", "values")
+
+
+def write_binary_mesh(file_path: str, vertices: np.ndarray, faces: np.ndarray, normals: Optional[np.ndarray] = None,
+                      values: Optional[np.ndarray] = None, compression_level: int = 0,
+                      float_dtype: Optional[np.dtype] = np.float32) -> None:
+    """
+    Write a mesh to a binary .rvm file.
+
+    Args:
+        file_path (str): the path of the file to write
+        vertices (np.ndarray): the (n, 3) vertex positions
+        faces (np.ndarray): the (m, 3) vertex indices of the faces, stored as uint32 (uint64 for
+            meshes of more than 2**32 vertices)
+        normals (np.ndarray, optional): the (n, 3) vertex normals
+        values (np.ndarray, optional): the (n,) vertex values
+        compression_level (int): the zlib compression level, 0 stores the arrays uncompressed, defaults to 0
+        float_dtype (np.dtype, optional): the dtype vertices, normals and values are stored as,
+            defaults to float32. None keeps their dtypes.
+    """
+    vertices = np.asarray(vertices)
+    faces = np.asarray(faces)
+    if vertices.ndim != 2 or vertices.shape[1] != 3:
+        raise ValueError(f"Vertices must have shape (n, 3), got {vertices.shape}")
+    if faces.ndim != 2 or faces.shape[1] != 3:
+        raise ValueError(f"Faces must have shape (m, 3), got {faces.shape}")
+    if normals is not None and np.shape(normals) != vertices.shape:
+        raise ValueError(f"Normals must have the shape of the vertices {vertices.shape}, got {np.shape(normals)}")
+    if values is not None and np.shape(values) != vertices.shape[:1]:
+        raise ValueError(f"Values must have shape {vertices.shape[:1]}, got {np.shape(values)}")
+
+    face_dtype = np.uint32 if len(vertices) <= np.iinfo(np.uint32).max + 1 else np.uint64
+    arrays = {
+        "vertices": _stored(vertices, float_dtype),
+        "faces": np.ascontiguousarray(faces, dtype=np.dtype(face_dtype).newbyteorder("<")),
+        "normals": None if normals is None else _stored(normals, float_dtype),
+        "values": None if values is None else _stored(values, float_dtype),
+    }
+
+    index = {"compression": "zlib" if compression_level > 0 else "none", "arrays": {}}
+    with open(file_path, "wb") as file:
+        file.write(MAGIC)
+        for name, array in arrays.items():
+            if array is None:
+                continue
+            file.write(b"\0" * (-file.tell() % _ALIGNMENT))
+            offset = file.tell()
+            if compression_level > 0:
+                file.write(zlib.compress(_bytes(array), compression_level))
+            else:
+                file.write(_bytes(array))
+            index["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape),
+                                     "offset": offset, "length": file.tell() - offset}
+        index_offset = file.tell()
+        file.write(json.dumps(index).encode("utf-8"))
+        file.write(_TRAILER.pack(index_offset, MAGIC))
+
+
+def read_binary_mesh(file_path: str, mmap_mode: Optional[str] = None) -> tuple:
+    """
+    Read a mesh from a binary .rvm file.
+
+    Args:
+        file_path (str): the path of the file to read
+        mmap_mode (str, optional): memory map the arrays with this np.memmap mode ("r", "r+" or
+            "c") instead of reading them, defaults to None. Only for uncompressed files.
+
+    Returns:
+        tuple: the vertices, faces, normals and values, with None for normals and values not stored
+    """
+    if mmap_mode not in (None, "r", "r+", "c"):
+        # "w+" would truncate the file before reading it
+        raise ValueError(f"mmap_mode must be 'r', 'r+' or 'c', got {mmap_mode!r}")
+    with open(file_path, "rb") as file:
+        file.seek(0, 2)
+        size = file.tell()
+        if size < len(MAGIC) + _TRAILER.size:
+            raise ValueError(f"{file_path} is not a RadMesh binary file")
+        file.seek(size - _TRAILER.size)
+        index_offset, magic = _TRAILER.unpack(file.read(_TRAILER.size))
+        file.seek(0)
+        if magic != MAGIC or file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} is not a RadMesh binary file")
+        file.seek(index_offset)
+        index = json.loads(file.read(size - _TRAILER.size - index_offset).decode("utf-8"))
+
+        compressed = index["compression"] == "zlib"
+        if mmap_mode is not None and compressed:
+            raise ValueError("Compressed meshes cannot be memory mapped")
+
+        arrays = {}
+        for name in _ARRAYS:
+            entry = index["arrays"].get(name)
+            if entry is None:
+                arrays[name] = None
+                continue
+            dtype, shape = np.dtype(entry["dtype"]), tuple(entry["shape"])
+            if mmap_mode is not None and np.prod(shape) > 0:
+                arrays[name] = np.memmap(file_path, dtype=dtype, mode=mmap_mode, offset=entry["offset"], shape=shape)
+                continue
+            file.seek(entry["offset"])
+            if compressed:
+                data = zlib.decompress(file.read(entry["length"]))
+                arrays[name] = np.frombuffer(data, dtype=dtype).reshape(shape).copy()
+            else:
+                array = np.empty(shape, dtype=dtype)
+                if file.readinto(_bytes(array)) != array.nbytes:
+                    raise ValueError(f"{file_path} is truncated")
+                arrays[name] = array
+    return tuple(arrays[name] for name in _ARRAYS)
+
+
+def _stored(array: np.ndarray, float_dtype: Optional[np.dtype]) -> np.ndarray:
+    """
+    Return a float array as the contiguous little-endian array written to the file.
+    """
+    dtype = np.asarray(array).dtype if float_dtype is None else np.dtype(float_dtype)
+    return np.ascontiguousarray(array, dtype=dtype.newbyteorder("<"))
+
+
+def _bytes(array: np.ndarray) -> np.ndarray:
+    """
+    Return the bytes of a contiguous array as a flat uint8 view, for reading and writing files.
+    """
+    return array.reshape(-1).view(np.uint8)
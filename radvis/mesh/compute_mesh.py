@@ -5,6 +5,9 @@ including a class to store the results.
 Usage:
     Call the 'marching_cubes' function with a 3D numpy array and a threshold value.
     Additional arguments for skimage.measure.marching_cubes can be passed as keyword arguments.
+    Large volumes can be meshed in blocks of slices along axis 0, in parallel worker processes,
+    by passing workers and/or block_size.
+    Call 'compute_label_meshes' with a label image to mesh the surface of every label.
     
 Returns:
     A ResMesh object with the following attributes:
@@ -13,23 +16,306 @@ Returns:
         normals: A numpy array of shape (n, 3) containing the normals of the mesh.
         values: A numpy array of shape (n,) containing the values of the mesh.
 """
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+from scipy import ndimage
 from skimage import measure
-from typing import Any, Dict
+import numpy as np
+from typing import Any, Dict, Optional, Sequence
 from .rad_mesh import RadMesh    
 from radvis.image.rad_image import RadImage    
+from radvis.instrumentation import instrumented
 
-def compute_marching_cubes(radimage: RadImage, threshold: float, **kwargs: Dict[str, Any]) -> RadMesh:
-    """ Wrapper for skimage.measure.marching_cubes """
+# Voxels kept around the bounding box of a label, so that the gradients of the normals on its
+# surface are taken from the same voxels as in the whole volume
+_LABEL_MARGIN = 2
+# Blocks per worker when only workers is given, so that blocks with more surface do not leave workers idle
+_BLOCKS_PER_WORKER = 4
+
+
+@instrumented("mesh")
+def compute_marching_cubes(radimage: RadImage, threshold: float, workers: Optional[int] = None,
+                           block_size: Optional[int] = None, **kwargs: Dict[str, Any]) -> RadMesh:
+    """
+    Wrapper for skimage.measure.marching_cubes. Meshes of cropped images are placed in the original frame.
+
+    With workers or block_size, the volume is meshed in blocks of slices along axis 0, which
+    share the slice on their seams, and the vertices on the seams are welded so the mesh stays
+    watertight. It has the same vertices (up to float32 rounding), faces, normals and values as
+    the mesh of the whole volume, in another order. Each block is read with a slice of margin on either side, so that the normals on the
+    seams are the same too. Lazily loaded images are only read a block at a time.
+
+    :param radimage: The 3D RadImage to mesh
+    :param threshold: The intensity of the surface
+    :param workers: The number of worker processes meshing blocks, defaults to None, meshing the
+        whole volume at once unless block_size is given, then using os.cpu_count() processes.
+        skimage holds the GIL while meshing, so blocks are meshed in processes rather than threads.
+        With 1 the blocks are meshed one after the other in this process.
+    :param block_size: The number of slices of cubes in each block, defaults to splitting the
+        volume into a few blocks per worker
+    :param kwargs: Keyword arguments passed on to skimage.measure.marching_cubes. step_size is
+        not supported in blocks.
+    """
 
     if not isinstance(radimage, RadImage) or len(radimage.shape) != 3:
         raise ValueError("Input 'radimage' must be a 3D image.")
     
     if not isinstance(threshold, (int, float)):
         raise ValueError("Input 'threshold' must be a numeric value (int or float).")
-    
+
+    if workers is None and block_size is None:
+        # Read-only, so that the buffer of a copy is not copied to be meshed
+        data = _writable_view(radimage.get_image_data(readonly=True))
+        try:
+            vertices, faces, normals, values = measure.marching_cubes(data, threshold, **kwargs)
+        except Exception as e:
+            raise RuntimeError(f"Error encountered while computing marching cubes: {str(e)}")
+    else:
+        vertices, faces, normals, values = _block_marching_cubes(radimage, threshold, workers, block_size, kwargs)
+
+    if radimage.crop_offset is not None:
+        vertices += np.asarray(radimage.crop_offset) * np.asarray(kwargs.get("spacing", (1.0, 1.0, 1.0)))
+
+    return RadMesh(vertices, faces, normals, values)
+
+
+@instrumented("mesh")
+def compute_label_meshes(radimage: RadImage, labels: Optional[Sequence[int]] = None, workers: Optional[int] = None,
+                         **kwargs: Dict[str, Any]) -> dict[int, RadMesh]:
+    """
+    Mesh the surface of each label of a label image.
+
+    The bounding boxes of all the labels are found in one pass over the image, with
+    scipy.ndimage.find_objects, and each label is meshed within its bounding box only. The mesh
+    of a label is the same as compute_marching_cubes gives for the image binarised to that label,
+    placed in the frame of the image (and of the original image, for cropped images).
+
+    :param radimage: The 3D RadImage of non-negative integer labels, 0 being the background
+    :param labels: The labels to mesh, defaults to None, meshing every label in the image.
+        Labels not in the image are left out of the result.
+    :param workers: The number of worker processes meshing labels, defaults to None, meshing
+        them one after the other in this process
+    :param kwargs: Keyword arguments passed on to skimage.measure.marching_cubes
+    :return: The mesh of each label, keyed by label
+    """
+    if not isinstance(radimage, RadImage) or len(radimage.shape) != 3:
+        raise ValueError("Input 'radimage' must be a 3D image.")
+    data = radimage.get_image_data(readonly=True)
+    if not np.issubdtype(data.dtype, np.integer) and data.dtype != bool:
+        raise ValueError(f"Label images must have an integer dtype, got {data.dtype}")
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+
+    if labels is not None:
+        labels = sorted({int(label) for label in labels if label > 0})
+        if not labels:
+            return {}
+    # Negative labels are ignored by find_objects, like the background
+    boxes = ndimage.find_objects(data.view(np.uint8) if data.dtype == bool else data,
+                                 max_label=max(labels) if labels else 0)
+    if labels is None:
+        labels = [label for label, box in enumerate(boxes, start=1) if box is not None]
+    labels = [label for label in labels if label <= len(boxes) and boxes[label - 1] is not None]
+
+    kwargs = dict(kwargs)
+    spacing = np.asarray(kwargs.get("spacing", (1.0, 1.0, 1.0)))
+    mask = kwargs.pop("mask", None)
+
+    def jobs():
+        for label in labels:
+            box = tuple(slice(max(0, s.start - _LABEL_MARGIN), min(size, s.stop + _LABEL_MARGIN))
+                        for s, size in zip(boxes[label - 1], data.shape))
+            job_kwargs = kwargs if mask is None else dict(kwargs, mask=np.asarray(mask[box]))
+            yield data[box] == label, job_kwargs
+
     try:
-        vertices, faces, normals, values = measure.marching_cubes(radimage.image_data, threshold, **kwargs)
+        if workers is None or workers == 1:
+            results = [measure.marching_cubes(volume, 0.5, **job_kwargs) for volume, job_kwargs in jobs()]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(measure.marching_cubes, volume, 0.5, **job_kwargs)
+                           for volume, job_kwargs in jobs()]
+                results = [future.result() for future in futures]
     except Exception as e:
         raise RuntimeError(f"Error encountered while computing marching cubes: {str(e)}")
-    
-    return RadMesh(vertices, faces, normals, values)
+
+    meshes = {}
+    for label, (vertices, faces, normals, values) in zip(labels, results):
+        offset = np.array([max(0, s.start - _LABEL_MARGIN) for s in boxes[label - 1]])
+        if radimage.crop_offset is not None:
+            offset += np.asarray(radimage.crop_offset)
+        vertices += offset * spacing
+        meshes[label] = RadMesh(vertices, faces, normals, values)
+    return meshes
+
+
+def _writable_view(data: np.ndarray) -> np.ndarray:
+    """
+    Return a writable view of read-only data when its memory is writable, and a copy otherwise.
+    skimage takes float32 volumes through a writable memoryview, though it never writes to them,
+    and converts the other dtypes itself.
+    """
+    if data.flags.writeable or data.dtype != np.float32:
+        return data
+    view = data.view()
+    try:
+        view.flags.writeable = True
+    except ValueError:
+        return data.copy()
+    return view
+
+
+def _block_marching_cubes(radimage: RadImage, threshold: float, workers: Optional[int],
+                          block_size: Optional[int], kwargs: dict) -> tuple:
+    """
+    Mesh a volume in blocks of slices along axis 0 and weld the blocks together.
+
+    :param radimage: The 3D RadImage to mesh
+    :param threshold: The intensity of the surface
+    :param workers: The number of worker processes, defaults to os.cpu_count()
+    :param block_size: The number of slices of cubes in each block
+    :param kwargs: Keyword arguments for skimage.measure.marching_cubes
+    :return: The vertices, faces, normals and values, as skimage.measure.marching_cubes returns them
+    """
+    kwargs = dict(kwargs)
+    if kwargs.pop("step_size", 1) != 1:
+        raise ValueError("step_size is not supported when meshing in blocks")
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    if block_size is not None and block_size < 1:
+        raise ValueError(f"block_size must be at least 1, got {block_size}")
+    spacing = kwargs.pop("spacing", (1.0, 1.0, 1.0))
+    mask = kwargs.pop("mask", None)
+
+    workers = workers or os.cpu_count() or 1
+    # Cube i lies between slices i and i + 1
+    cubes = radimage.shape[0] - 1
+    if block_size is None:
+        block_size = math.ceil(cubes / (workers * _BLOCKS_PER_WORKER))
+    starts = range(0, max(cubes, 1), block_size)
+
+    def blocks():
+        for start in starts:
+            stop = min(start + block_size, cubes)
+            # The cubes either side of the block are meshed too, so that the normals and values of
+            # the vertices on the seams get the contributions of all the cubes around them, and
+            # a slice of margin beyond them for the gradients. Their faces are dropped.
+            low, high = max(0, start - 1), min(cubes, stop + 1)
+            first, last = max(0, low - 1), min(radimage.shape[0], high + 2)
+            # skimage meshes the cube ending at each True voxel of the mask
+            block_mask = np.zeros((last - first,) + tuple(radimage.shape[1:]), dtype=bool)
+            block_mask[low + 1 - first:high + 1 - first] = True
+            if mask is not None:
+                block_mask &= np.asarray(mask[first:last], dtype=bool)
+            volume = np.asarray(radimage._read(slice(first, last)))
+            margins = (start - 1 - first if start > 0 else None, stop - first if stop < cubes else None)
+            yield volume, block_mask, margins
+
+    try:
+        if workers == 1:
+            results = [_mesh_block(*block, threshold, kwargs) for block in blocks()]
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(_mesh_block, *block, threshold, kwargs) for block in blocks()]
+                results = [future.result() for future in futures]
+    except Exception as e:
+        raise RuntimeError(f"Error encountered while computing marching cubes: {str(e)}")
+
+    firsts = [max(0, start - 2) for start in starts]
+    vertices, faces, normals, values = _weld_blocks(results, firsts)
+    if not len(vertices):
+        raise RuntimeError("Error encountered while computing marching cubes: No surface found at the given iso value.")
+    if not np.array_equal(spacing, (1, 1, 1)):
+        vertices = vertices * np.r_[spacing]
+    return vertices, faces, normals, values
+
+
+def _mesh_block(volume: np.ndarray, block_mask: np.ndarray, margins: tuple[Optional[int], Optional[int]],
+                threshold: float, kwargs: dict) -> tuple:
+    """
+    Mesh the cubes of one block and of its margins, in its own index coordinates.
+
+    skimage lists the faces cube by cube, slice after slice, so the faces of the margins are the
+    first and last ones. They are counted by meshing each margin on its own.
+
+    :param volume: The slices of the block, with its margins
+    :param block_mask: The cubes to mesh, as the mask of skimage.measure.marching_cubes
+    :param margins: The slice of cubes before and after the block, None at the ends of the volume
+    :return: The vertices, faces, normals and values, empty if the block has no surface, and the
+        number of faces of the margin before and after the block
+    """
+    volume = np.ascontiguousarray(volume, np.float32)
+    counts = []
+    for layer in margins:
+        layer_mesh = None
+        if layer is not None:
+            layer_mask = block_mask[layer:layer + 2].copy()
+            layer_mask[0] = False
+            layer_mesh = _masked_marching_cubes(volume[layer:layer + 2], layer_mask, threshold, kwargs)
+        counts.append(0 if layer_mesh is None else len(layer_mesh[1]))
+
+    mesh = _masked_marching_cubes(volume, block_mask, threshold, kwargs)
+    if mesh is None:
+        mesh = (np.empty((0, 3), np.float32), np.empty((0, 3), np.int32), np.empty((0, 3), np.float32),
+                np.empty(0, np.float32))
+    return mesh + tuple(counts)
+
+
+def _masked_marching_cubes(volume: np.ndarray, mask: np.ndarray, threshold: float, kwargs: dict) -> Optional[tuple]:
+    """
+    Run skimage.measure.marching_cubes on the cubes of a mask, returning None if no surface crosses them.
+    """
+    if not volume.size or not volume.min() <= threshold <= volume.max():
+        return None
+    try:
+        return tuple(measure.marching_cubes(volume, threshold, mask=mask, **kwargs))
+    except RuntimeError:
+        return None
+
+
+def _weld_blocks(results: list[tuple], firsts: list[int]) -> tuple:
+    """
+    Join the meshes of consecutive blocks, merging the vertices they share on each seam.
+
+    The cubes either side of a seam are meshed by both blocks, which list their faces in the same
+    order and with their vertices in the same order. The vertices of these faces are matched one
+    to one, so each vertex is matched to the one on the same edge of the volume, even where
+    several vertices lie at the same position, as they do where voxels equal the threshold.
+
+    :param results: The vertices, faces, normals and values of each block, in its own index
+        coordinates, and the number of faces of its margins
+    :param firsts: The first slice of each block, including its margin
+    :return: The vertices, faces, normals and values of the whole mesh
+    """
+    vertices, faces, normals, values = [], [], [], []
+    count = 0
+    previous = None
+    for (block_vertices, block_faces, block_normals, block_values, before, after), first in zip(results, firsts):
+        own = block_faces[before:len(block_faces) - after]
+        used = np.zeros(len(block_vertices), dtype=bool)
+        used[own] = True
+        index = np.full(len(block_vertices), -1, dtype=np.int64)
+        if previous is not None:
+            previous_faces, previous_after, previous_index = previous
+            # The faces of the last slice of cubes of the previous block and of its margin after
+            # it are the faces of the margin before this block and of its first slice of cubes
+            shared = before + previous_after
+            below = previous_index[previous_faces[len(previous_faces) - shared:]].ravel()
+            above = block_faces[:shared].ravel()
+            welded = used[above] & (below >= 0)
+            index[above[welded]] = below[welded]
+        added = used & (index < 0)
+        index[added] = np.arange(count, count + int(added.sum()))
+
+        shifted = block_vertices[added].copy()
+        shifted[:, 0] += first
+        vertices.append(shifted)
+        faces.append(index[own])
+        normals.append(block_normals[added])
+        values.append(block_values[added])
+        count += int(added.sum())
+        previous = (block_faces, after, index)
+
+    return (np.concatenate(vertices).astype(np.float32), np.concatenate(faces).astype(np.int32),
+            np.concatenate(normals).astype(np.float32), np.concatenate(values).astype(np.float32))
@@ -0,0 +1,328 @@
+"""
+Quadric error metric decimation of triangle meshes.
+
+Every vertex holds the quadric of the planes of its faces, weighted by their area (Garland and
+Heckbert). Collapsing an edge moves its two vertices to the point minimising the sum of their
+quadrics, and the sum measures how far that point is from the original surface.
+
+Edges are collapsed in rounds rather than one at a time, so that each round is a few vectorised
+NumPy passes over the mesh. A round picks the edges that are the cheapest of all the edges
+touching their faces, then again among the edges touching none of the faces of those already
+picked, until enough are picked to reach the number of faces asked for. Equal costs, as on flat
+regions, are ordered at random, so that picks spread over the whole mesh in a few passes, and
+later passes only look at the edges still available. The picked edges touch no face in common,
+so their collapses do not interact. Only the edges around the collapses are rebuilt and costed
+again for the next round, the costs of the others being unchanged. Collapses that would fold a
+face over, and with manifold=True collapses that would make the mesh non-manifold, are skipped.
+
+Example:
+    mesh = compute_marching_cubes(image, 0.5)
+    small = mesh.decimate(ratio=0.05)
+"""
+import math
+from typing import Optional
+import numpy as np
+from scipy import sparse
+
+# Collapses turning a face by more than about 75 degrees are rejected as fold-overs
+_MIN_NORMAL_COSINE = 0.25
+# A round stops picking edges when a pass picks fewer than this fraction of the first pass, or
+# after this many passes. The edges left are picked by the next round.
+_MIN_PASS_FRACTION = 0.1
+_MAX_PASSES = 8
+
+
+def decimate_mesh(vertices: np.ndarray, faces: np.ndarray, normals: Optional[np.ndarray],
+                  values: Optional[np.ndarray], target_faces: int, preserve_boundary: bool = True,
+                  manifold: bool = False) -> tuple:
+    """
+    Decimate a triangle mesh by collapsing edges with the lowest quadric error.
+
+    Args:
+        vertices (np.ndarray): the (n, 3) vertex positions
+        faces (np.ndarray): the (m, 3) vertex indices of the faces
+        normals (np.ndarray, optional): the (n, 3) vertex normals, interpolated along collapsed edges
+        values (np.ndarray, optional): the (n,) vertex values, interpolated along collapsed edges
+        target_faces (int): the number of faces to decimate to
+        preserve_boundary (bool): whether to keep the vertices on boundary edges in place
+        manifold (bool): whether to skip collapses that would make the mesh non-manifold
+
+    Returns:
+        tuple: the vertices, faces, normals and values of the decimated mesh, with the dtypes of
+            the input. Decimation stops early when no edge can be collapsed.
+    """
+    count = len(vertices)
+    positions = np.array(vertices, dtype=np.float64)
+    mesh_faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    mesh_normals = None if normals is None else np.array(normals, dtype=np.float64)
+    mesh_values = None if values is None else np.array(values, dtype=np.float64)
+    quadrics = _vertex_quadrics(positions, mesh_faces, count)
+
+    edges, face_counts = _edges(mesh_faces, count)
+    targets, costs = _collapse_targets(positions, quadrics, edges[:, 0], edges[:, 1])
+    locked = np.zeros(count, dtype=bool)
+    if preserve_boundary:
+        locked[edges[face_counts == 1].ravel()] = True
+    # Edges rejected in a round, skipped until a collapse moves one of their vertices
+    blocked = np.zeros(len(edges), dtype=bool)
+    # Ties between equal costs are broken the same way on every call
+    rng = np.random.default_rng(0)
+
+    while len(mesh_faces) > target_faces:
+        candidates = np.flatnonzero(~locked[edges[:, 0]] & ~locked[edges[:, 1]] & ~blocked & (face_counts <= 2))
+        if not len(candidates):
+            break
+        selected = _independent_edges(costs[candidates], candidates, edges, count,
+                                      math.ceil((len(mesh_faces) - target_faces) / 2), rng)
+        first, second, collapse_targets = edges[selected, 0], edges[selected, 1], targets[selected]
+
+        rejected = _fold_overs(positions, mesh_faces, first, second, collapse_targets, count)
+        if manifold:
+            rejected |= _breaks_manifold(edges, face_counts, selected, count)
+        blocked[selected[rejected]] = True
+        if rejected.all():
+            continue
+        first, second, collapse_targets = first[~rejected], second[~rejected], collapse_targets[~rejected]
+
+        # Interpolate the attributes at the projection of the new position onto the edge
+        direction = positions[second] - positions[first]
+        length = np.einsum("ij,ij->i", direction, direction)
+        t = np.clip(np.einsum("ij,ij->i", collapse_targets - positions[first], direction)
+                    / np.where(length > 0, length, 1), 0, 1)
+        if mesh_normals is not None:
+            mesh_normals[first] += t[:, None] * (mesh_normals[second] - mesh_normals[first])
+        if mesh_values is not None:
+            mesh_values[first] += t * (mesh_values[second] - mesh_values[first])
+        positions[first] = collapse_targets
+        quadrics[:, first] += quadrics[:, second]
+
+        remap = np.arange(count)
+        remap[second] = first
+        mesh_faces = remap[mesh_faces]
+        mesh_faces = mesh_faces[(mesh_faces[:, 0] != mesh_faces[:, 1]) & (mesh_faces[:, 1] != mesh_faces[:, 2])
+                                & (mesh_faces[:, 2] != mesh_faces[:, 0])]
+
+        # The edges touching a collapsed vertex are rebuilt from the faces around them, the
+        # only faces they lie on. The other edges keep their face counts and costs.
+        changed = np.zeros(count, dtype=bool)
+        changed[first] = True
+        changed[second] = True
+        stale = changed[edges[:, 0]] | changed[edges[:, 1]]
+        new_edges, new_counts = _edges(mesh_faces[changed[mesh_faces].any(axis=1)], count)
+        fresh = changed[new_edges[:, 0]] | changed[new_edges[:, 1]]
+        new_edges, new_counts = new_edges[fresh], new_counts[fresh]
+        new_targets, new_costs = _collapse_targets(positions, quadrics, new_edges[:, 0], new_edges[:, 1])
+        edges = np.concatenate([edges[~stale], new_edges])
+        face_counts = np.concatenate([face_counts[~stale], new_counts])
+        targets = np.concatenate([targets[~stale], new_targets])
+        costs = np.concatenate([costs[~stale], new_costs])
+        blocked = np.concatenate([blocked[~stale], np.zeros(len(new_edges), dtype=bool)])
+
+    used = np.zeros(count, dtype=bool)
+    used[mesh_faces] = True
+    index = np.cumsum(used) - 1
+    new_normals = None
+    if mesh_normals is not None:
+        new_normals = mesh_normals[used]
+        new_normals /= np.maximum(np.linalg.norm(new_normals, axis=1, keepdims=True), np.finfo(np.float64).tiny)
+        new_normals = new_normals.astype(np.asarray(normals).dtype)
+    new_values = None if mesh_values is None else mesh_values[used].astype(np.asarray(values).dtype)
+    return (positions[used].astype(np.asarray(vertices).dtype), index[mesh_faces].astype(np.asarray(faces).dtype),
+            new_normals, new_values)
+
+
+def _edges(faces: np.ndarray, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the unique edges of the faces, lower vertex first, and the number of faces on each.
+    """
+    pairs = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    codes, face_counts = np.unique(pairs[:, 0] * count + pairs[:, 1], return_counts=True)
+    return np.stack([codes // count, codes % count], axis=1), face_counts
+
+
+def _vertex_quadrics(positions: np.ndarray, faces: np.ndarray, count: int) -> np.ndarray:
+    """
+    Return the quadric of each vertex, the sum of the area weighted plane quadrics of its faces,
+    as the 10 coefficients of the symmetric 4x4 matrix (xx, xy, xz, xw, yy, yz, yw, zz, zw, ww)
+    along axis 0.
+    """
+    corners = positions[faces]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    double_area = np.linalg.norm(cross, axis=1)
+    normal = cross / np.where(double_area > 0, double_area, 1)[:, None]
+    plane = np.concatenate([normal, -np.einsum("ij,ij->i", normal, corners[:, 0])[:, None]], axis=1)
+    weight = double_area / 2
+    rows, columns = np.triu_indices(4)
+    coefficients = plane[:, rows] * plane[:, columns] * weight[:, None]
+
+    quadrics = np.empty((10, count))
+    for k in range(10):
+        quadrics[k] = np.bincount(faces.ravel(), weights=np.repeat(coefficients[:, k], 3), minlength=count)
+    return quadrics
+
+
+def _quadric_error(quadric: np.ndarray, point: np.ndarray) -> np.ndarray:
+    """
+    Return the error of each point, given as (n, 3), under its quadric, given as (10, n).
+    """
+    x, y, z = point[:, 0], point[:, 1], point[:, 2]
+    xx, xy, xz, xw, yy, yz, yw, zz, zw, ww = quadric
+    return (x * (xx * x + 2 * (xy * y + xz * z + xw)) + y * (yy * y + 2 * (yz * z + yw))
+            + z * (zz * z + 2 * zw) + ww)
+
+
+def _collapse_targets(positions: np.ndarray, quadrics: np.ndarray, first: np.ndarray,
+                      second: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the position minimising the summed quadric of each edge, and its error. Where the
+    quadric is singular (e.g. on flat regions) the best of the end points and the midpoint is used.
+    """
+    quadric = quadrics[:, first] + quadrics[:, second]
+    xx, xy, xz, xw, yy, yz, yw, zz, zw, _ = quadric
+    # Solve the 3x3 system with the adjugate of the symmetric matrix
+    c00, c01, c02 = yy * zz - yz * yz, xz * yz - xy * zz, xy * yz - xz * yy
+    c11, c12, c22 = xx * zz - xz * xz, xy * xz - xx * yz, xx * yy - xy * xy
+    determinant = xx * c00 + xy * c01 + xz * c02
+    scale = (xx + yy + zz) ** 3
+    solvable = np.abs(determinant) > 1e-10 * np.maximum(scale, np.finfo(np.float64).tiny)
+    safe = np.where(solvable, determinant, 1)
+    targets = -np.stack([c00 * xw + c01 * yw + c02 * zw,
+                         c01 * xw + c11 * yw + c12 * zw,
+                         c02 * xw + c12 * yw + c22 * zw], axis=1) / safe[:, None]
+
+    singular = np.flatnonzero(~solvable)
+    if len(singular):
+        start, end = positions[first[singular]], positions[second[singular]]
+        candidates = (start, end, (start + end) / 2)
+        errors = np.stack([_quadric_error(quadric[:, singular], candidate) for candidate in candidates])
+        best = np.argmin(errors, axis=0)
+        targets[singular] = np.choose(best[:, None], candidates)
+    return targets, np.maximum(_quadric_error(quadric, targets), 0)
+
+
+def _independent_edges(costs: np.ndarray, candidates: np.ndarray, edges: np.ndarray, count: int, limit: int,
+                       rng: np.random.Generator) -> np.ndarray:
+    """
+    Return up to limit candidate edges, no two of which touch the same face, so that they can be
+    collapsed together. Each is the cheapest of the candidates touching any face it touches,
+    among the candidates not touching the faces of the edges picked before it. Equal costs are
+    ordered at random.
+
+    The vertices of the faces around a vertex are its neighbours along the edges, so the
+    minimum over the faces around a vertex is found from the edges, sorted by vertex once.
+    """
+    edge_count = len(edges)
+    unset = len(candidates)
+    shuffled = rng.permutation(len(candidates))
+    rank = np.full(edge_count, unset)
+    rank[candidates[shuffled[np.argsort(costs[shuffled])]]] = np.arange(len(candidates))
+
+    # Every edge end, sorted by vertex, with the vertex at the other end. Each pass keeps the
+    # ones still in play, which stay sorted.
+    order = np.argsort(edges.T.ravel())
+    end_edge = np.where(order < edge_count, order, order - edge_count)
+    end_vertex = edges.T.ravel()[order]
+    other_vertex = np.where(order < edge_count, edges[end_edge, 1], edges[end_edge, 0])
+    open_edges = candidates
+    open_ends = rank[end_edge] < unset
+    available = np.zeros(edge_count, dtype=bool)
+    available[candidates] = True
+    claimed = np.zeros(count, dtype=bool)
+    picked = []
+    total = 0
+
+    while total < limit and len(picked) < _MAX_PASSES:
+        # The cheapest available edge at each vertex, then around each vertex
+        vertex_minimum = _group_minimum(end_vertex[open_ends], rank[end_edge[open_ends]], count, unset)
+        # Ends next to no available edge take no further part
+        reached = vertex_minimum[other_vertex] < unset
+        end_vertex, end_edge, other_vertex = end_vertex[reached], end_edge[reached], other_vertex[reached]
+        open_ends = open_ends[reached]
+        neighbourhood_minimum = _group_minimum(end_vertex, vertex_minimum[other_vertex], count, unset)
+        np.minimum(neighbourhood_minimum, vertex_minimum, out=neighbourhood_minimum)
+
+        open_rank = rank[open_edges]
+        independent = open_edges[(neighbourhood_minimum[edges[open_edges, 0]] == open_rank)
+                                 & (neighbourhood_minimum[edges[open_edges, 1]] == open_rank)]
+        if not len(independent):
+            break
+        if total + len(independent) > limit:
+            independent = independent[np.argsort(rank[independent])][:limit - total]
+        picked.append(independent)
+        total += len(independent)
+        # Later passes find fewer and fewer edges, which the next round finds anyway
+        if len(independent) < len(picked[0]) * _MIN_PASS_FRACTION:
+            break
+
+        # The edges touching the faces around the picked edges, that is touching the picked
+        # edges' ends or their neighbours, are no longer independent of them
+        ends = np.zeros(count, dtype=bool)
+        ends[edges[independent].ravel()] = True
+        claimed[edges[independent].ravel()] = True
+        claimed[other_vertex[ends[end_vertex]]] = True
+        still = ~claimed[edges[open_edges, 0]] & ~claimed[edges[open_edges, 1]]
+        available[open_edges[~still]] = False
+        open_edges = open_edges[still]
+        open_ends &= available[end_edge]
+
+    return np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+
+
+def _group_minimum(groups: np.ndarray, values: np.ndarray, count: int, unset: int) -> np.ndarray:
+    """
+    Return the minimum of the values in each of count groups, given sorted by group, with unset
+    for the empty groups.
+    """
+    minimum = np.full(count, unset)
+    if len(groups):
+        starts = np.flatnonzero(np.concatenate([[True], groups[1:] != groups[:-1]]))
+        minimum[groups[starts]] = np.minimum.reduceat(values, starts)
+    return minimum
+
+
+def _fold_overs(positions: np.ndarray, faces: np.ndarray, first: np.ndarray, second: np.ndarray,
+                targets: np.ndarray, count: int) -> np.ndarray:
+    """
+    Return which collapses would turn one of the faces they keep by too much, or to no area.
+    """
+    collapse = np.full(count, -1)
+    collapse[first] = np.arange(len(first))
+    collapse[second] = np.arange(len(first))
+    touching = np.maximum(np.maximum(collapse[faces[:, 0]], collapse[faces[:, 1]]), collapse[faces[:, 2]])
+    touched = np.flatnonzero(touching >= 0)
+    touched_faces, owner = faces[touched], touching[touched]
+
+    moved = (touched_faces == first[owner][:, None]) | (touched_faces == second[owner][:, None])
+    # Faces on the edge itself are removed by the collapse
+    kept = moved.sum(axis=1) == 1
+    touched_faces, owner, moved = touched_faces[kept], owner[kept], moved[kept]
+
+    before = positions[touched_faces]
+    after = np.where(moved[:, :, None], targets[owner][:, None], before)
+    old_normal = np.cross(before[:, 1] - before[:, 0], before[:, 2] - before[:, 0])
+    new_normal = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+    old_length, new_length = np.linalg.norm(old_normal, axis=1), np.linalg.norm(new_normal, axis=1)
+    cosine = np.einsum("ij,ij->i", old_normal, new_normal) / np.maximum(old_length * new_length, np.finfo(np.float64).tiny)
+    # Faces that had no area have no orientation to keep
+    folded = (old_length > 0) & ((new_length <= 0) | (cosine < _MIN_NORMAL_COSINE))
+
+    rejected = np.zeros(len(first), dtype=bool)
+    rejected[owner[folded]] = True
+    return rejected
+
+
+def _breaks_manifold(edges: np.ndarray, face_counts: np.ndarray, selected: np.ndarray, count: int) -> np.ndarray:
+    """
+    Return which edge collapses would make the mesh non-manifold: those failing the link
+    condition (the end points share neighbours other than the opposite corners of the edge's
+    faces), and those of interior edges joining two boundary vertices.
+    """
+    adjacency = sparse.coo_matrix((np.ones(2 * len(edges), dtype=np.int32),
+                                   (edges.ravel(), edges[:, ::-1].ravel())), shape=(count, count)).tocsr()
+    first, second = edges[selected, 0], edges[selected, 1]
+    shared = np.asarray(adjacency[first].multiply(adjacency[second]).sum(axis=1)).ravel()
+
+    boundary = np.zeros(count, dtype=bool)
+    boundary[edges[face_counts == 1].ravel()] = True
+    interior = face_counts[selected] == 2
+    return (shared != face_counts[selected]) | (interior & boundary[first] & boundary[second])
@@ -1,6 +1,7 @@
 import numpy as np
 import meshio
 import os
+from radvis.instrumentation import instrumented, file_bytes
 
 
 class RadMesh:
@@ -55,37 +56,80 @@ class RadMesh:
         """Set the values of the mesh."""
         self._values = values
         
-    def save(self, file_path: str, file_format: str):
+    def decimate(self, target_faces: int = None, ratio: float = None, preserve_boundary: bool = True,
+                 manifold: bool = False) -> "RadMesh":
+        """
+        Reduce the number of faces by collapsing the edges with the lowest quadric error.
+        See radvis.mesh.decimation.
+
+        Args:
+            target_faces (int, optional): the number of faces to keep
+            ratio (float, optional): the fraction of faces to keep, instead of target_faces
+            preserve_boundary (bool): whether to keep the vertices on boundary edges in place, defaults to True
+            manifold (bool): whether to skip collapses that would make the mesh non-manifold, defaults to False
+
+        Returns:
+            RadMesh: the decimated mesh, with normals and values interpolated along the collapsed edges.
+                It may keep more faces than asked for when no more edges can be collapsed.
+        """
+        from .decimation import decimate_mesh
+
+        if (target_faces is None) == (ratio is None):
+            raise ValueError("Exactly one of target_faces and ratio must be given")
+        if ratio is not None:
+            if not 0 <= ratio <= 1:
+                raise ValueError(f"ratio must be between 0 and 1, got {ratio}")
+            target_faces = int(round(len(self.faces) * ratio))
+        if target_faces < 0:
+            raise ValueError(f"target_faces must not be negative, got {target_faces}")
+
+        vertices, faces, normals, values = decimate_mesh(self.vertices, self.faces, self.normals, self.values,
+                                                         target_faces, preserve_boundary, manifold)
+        return RadMesh(vertices, faces, normals, values)
+
+    @instrumented("mesh", name="RadMesh.save", bytes_read=lambda *args, **kwargs: 0,
+                  output=lambda result, self, file_path, *args, **kwargs: file_bytes(file_path))
+    def save(self, file_path: str, file_format: str, compression_level: int = 0):
         """
         Save the RadMesh object to a specified file format.
 
         Args:
             file_path (str): the path to the output file
-            file_format (str): the file format to export ('stl', 'obj', 'ply', 'collada', or 'vtk')
+            file_format (str): the file format to export ('stl', 'obj', 'ply', 'collada', 'vtk', or 'rvm').
+                'rvm' is the binary format of radvis.mesh.binary_format, which keeps the normals and values.
+            compression_level (int): the zlib compression level of 'rvm' files, 0 for none, defaults to 0
         """
-        supported_formats = {"stl", "obj", "ply", "vtk"}
+        supported_formats = {"stl", "obj", "ply", "vtk", "rvm"}
 
         if file_format.lower() not in supported_formats:
             raise ValueError(f"Unsupported file format '{file_format}'. Supported formats are {', '.join(supported_formats)}")
 
+        if file_format.lower() == "rvm":
+            from .binary_format import write_binary_mesh
+            write_binary_mesh(file_path, self.vertices, self.faces, self.normals, self.values, compression_level)
+            return
+
         mesh = meshio.Mesh(points=self.vertices, cells=[("triangle", self.faces)], point_data={
                            "Normals": self.normals, "Values": self.values})
         meshio.write(file_path, mesh, file_format=file_format.lower())
 
     @classmethod
-    def load(cls, file_path: str, file_format: str = None):
+    @instrumented("mesh", name="RadMesh.load", bytes_read=lambda cls, file_path, *args, **kwargs: file_bytes(file_path))
+    def load(cls, file_path: str, file_format: str = None, mmap_mode: str = None):
         """
         Import a mesh file in a specified format and convert it to a RadMesh object.
 
         Args:
             file_path (str): the path to the input file
-            file_format (str, optional): the file format to import ('stl', 'obj', 'ply', 'collada', or 'vtk'). 
+            file_format (str, optional): the file format to import ('stl', 'obj', 'ply', 'collada', 'vtk', or 'rvm'). 
                 If not provided, it will be inferred from the file extension.
+            mmap_mode (str, optional): memory map the arrays of uncompressed 'rvm' files with this
+                np.memmap mode instead of reading them
 
         Returns:
             RadMesh: the imported RadMesh object
         """
-        supported_formats = ["stl", "obj", "ply", "vtk"]
+        supported_formats = ["stl", "obj", "ply", "vtk", "rvm"]
 
         if file_format:
             file_format = file_format.lower()
@@ -97,6 +141,11 @@ class RadMesh:
                 raise ValueError(f"Unsupported file format '{ext}'. Supported formats are: {', '.join(supported_formats)}")
             file_format = ext
 
+        if file_format == "rvm":
+            from .binary_format import read_binary_mesh
+            vertices, faces, normals, values = read_binary_mesh(file_path, mmap_mode)
+            return cls(vertices=vertices, faces=faces, normals=normals, values=values)
+
         mesh = meshio.read(file_path, file_format=file_format)
 
         # Extract vertices, faces, normals, and values from the mesh
@@ -1,3 +1,36 @@
-from .image import normalization, noise_reduction, percentile_clipping, add_padding, apply_mask
+from typing import TYPE_CHECKING
+from .._lazy import attach
 
-__all__ = ["normalization", "noise_reduction", "percentile_clipping", "add_padding", "apply_mask"]
\ No newline at end of file
+__all__ = ["normalization", "noise_reduction", "percentile_clipping", "add_padding", "apply_mask", "Pipeline",
+           "compute_percentiles", "batch_normalization", "batch_noise_reduction", "batch_percentile_clipping",
+           "batch_add_padding", "batch_apply_mask", "SparseMask", "resample",
+           "crop_to_foreground", "uncrop"]
+
+__getattr__, __dir__ = attach(__name__, {
+    "normalization": ".image",
+    "noise_reduction": ".image",
+    "percentile_clipping": ".image",
+    "add_padding": ".image",
+    "apply_mask": ".image",
+    "Pipeline": ".pipeline",
+    "compute_percentiles": ".percentiles",
+    "batch_normalization": ".batch",
+    "batch_noise_reduction": ".batch",
+    "batch_percentile_clipping": ".batch",
+    "batch_add_padding": ".batch",
+    "batch_apply_mask": ".batch",
+    "SparseMask": ".masks",
+    "resample": ".resample",
+    "crop_to_foreground": ".crop",
+    "uncrop": ".crop",
+})
+
+if TYPE_CHECKING:
+    from .image import normalization, noise_reduction, percentile_clipping, add_padding, apply_mask
+    from .pipeline import Pipeline
+    from .percentiles import compute_percentiles
+    from .batch import (batch_normalization, batch_noise_reduction, batch_percentile_clipping, batch_add_padding,
+                        batch_apply_mask)
+    from .masks import SparseMask
+    from .resample import resample
+    from .crop import crop_to_foreground, uncrop
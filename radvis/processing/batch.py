@@ -0,0 +1,222 @@
+"""
+Batched variants of the processing functions, for many images of the same shape.
+
+Each function takes either a list of RadImages or a stack of image data with the images along
+axis 0 (e.g. a 4D array of 3D volumes), and processes the whole batch with one vectorised NumPy or
+SciPy call instead of one call per image. Per-image parameters broadcast: pass a scalar to use the
+same value for every image, or a sequence with one value per image.
+
+A stack in gives a stack out. A list of RadImages gives a list of copies of the images, whose image
+data are views into one stacked result array.
+
+Every image gets the same values as with the single-image function. The result has one dtype for
+the whole batch, so percentile clipping keeps an integer dtype only when it would for every image.
+
+Example:
+    images = batch_percentile_clipping(images, 0.5, 99.5)
+    images = batch_normalization(images, min_val=[image.image_data.min() for image in images], max_val=1)
+"""
+from typing import Optional, Sequence
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented
+from radvis.image.dtype_policy import narrowest_float_dtype
+from .percentiles import compute_percentiles
+
+Batch = list[RadImage] | np.ndarray
+
+
+@instrumented("processing")
+def batch_normalization(images: Batch, min_val: float | Sequence[float], max_val: float | Sequence[float]) -> Batch:
+    """
+    Perform intensity normalization on a batch of images.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data.
+    :param min_val: The intensity mapped to 0, for all images or per image.
+    :param max_val: The intensity mapped to 1, for all images or per image.
+
+    :return: The normalized batch. Integer data is promoted to the narrowest floating point dtype
+        that holds it exactly.
+    """
+    stack = _stack(images)
+    dtype = narrowest_float_dtype(stack.dtype)
+    min_val = _per_image(min_val, stack)
+    max_val = _per_image(max_val, stack)
+
+    result = np.subtract(stack, min_val, dtype=dtype)
+    np.divide(result, np.subtract(max_val, min_val), out=result, casting="unsafe")
+    return _unstack(result, images)
+
+
+@instrumented("processing")
+def batch_noise_reduction(images: Batch, sigma: float | Sequence[float]) -> Batch:
+    """
+    Reduce noise in a batch of images using Gaussian filtering. The batch is filtered in one call,
+    without smoothing across images, when all images use the same sigma.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data.
+    :param sigma: Standard deviation for the Gaussian filter, for all images or per image.
+
+    :return: The filtered batch. Integer data is promoted to the narrowest floating point dtype
+        that holds it exactly.
+    """
+    # Imported here so that scipy is only loaded by processes that filter images
+    from scipy.ndimage import gaussian_filter
+
+    stack = _stack(images)
+    dtype = narrowest_float_dtype(stack.dtype)
+    sigmas = np.broadcast_to(np.asarray(sigma, dtype=np.float64), (len(stack),))
+
+    if np.all(sigmas == sigmas[0]):
+        result = gaussian_filter(stack, sigma=(0,) + (float(sigmas[0]),) * (stack.ndim - 1), output=dtype)
+    else:
+        result = np.empty(stack.shape, dtype=dtype)
+        for index, image_sigma in enumerate(sigmas):
+            gaussian_filter(stack[index], sigma=float(image_sigma), output=result[index])
+    return _unstack(result, images)
+
+
+@instrumented("processing")
+def batch_percentile_clipping(images: Batch, lower_percentile: float | Sequence[float],
+                              upper_percentile: float | Sequence[float], method: str = "exact",
+                              mask: Optional[np.ndarray] = None) -> Batch:
+    """
+    Perform percentile clipping on a batch of images, with percentiles computed per image.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data.
+    :param lower_percentile: The lower percentile for intensity clipping, for all images or per image.
+    :param upper_percentile: The upper percentile for intensity clipping, for all images or per image.
+    :param method: How the percentiles are computed: "exact", "histogram" or "sample".
+        See radvis.processing.percentiles.
+    :param mask: A mask selecting the voxels the percentiles are computed on, for all images or
+        a stack with one mask per image.
+
+    :return: The clipped batch. Integer data keeps its dtype unless a percentile of an image falls
+        between two integers.
+    """
+    stack = _stack(images)
+    count = len(stack)
+    lower_percentile = np.broadcast_to(np.asarray(lower_percentile, dtype=np.float64), (count,))
+    upper_percentile = np.broadcast_to(np.asarray(upper_percentile, dtype=np.float64), (count,))
+
+    if method == "exact" and mask is None:
+        # One vectorised call for every image and every distinct percentile
+        percentiles, index = np.unique(np.concatenate([lower_percentile, upper_percentile]), return_inverse=True)
+        values = np.percentile(stack.reshape(count, -1), percentiles, axis=1)
+        lower = values[index[:count], np.arange(count)]
+        upper = values[index[count:], np.arange(count)]
+    else:
+        masks = None if mask is None else np.broadcast_to(np.asarray(mask), stack.shape)
+        bounds = np.array([compute_percentiles(stack[i], [lower_percentile[i], upper_percentile[i]], method=method,
+                                               mask=None if masks is None else masks[i]).values
+                           for i in range(count)])
+        lower, upper = bounds[:, 0], bounds[:, 1]
+
+    # Keep integer dtypes when the bounds of every image are whole numbers
+    dtype = stack.dtype
+    if not (np.all(np.mod(lower, 1) == 0) and np.all(np.mod(upper, 1) == 0)):
+        dtype = narrowest_float_dtype(dtype)
+
+    result = np.clip(stack, _per_image(lower.astype(dtype), stack), _per_image(upper.astype(dtype), stack), dtype=dtype)
+    return _unstack(result, images)
+
+
+@instrumented("processing")
+def batch_add_padding(images: Batch, target_shape: tuple) -> Batch:
+    """
+    Add padding to either side of every image of a batch to match the expected shape.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data.
+    :param target_shape: The expected shape of each image.
+
+    :return: The padded batch. The crop_offset of cropped images is moved by the padding before
+        them, as with add_padding.
+    """
+    stack = _stack(images)
+    padding = np.subtract(target_shape, stack.shape[1:])
+    padding = [(0, 0)] + [(before, after) for before, after in zip(padding // 2, padding - padding // 2)]
+    padded = _unstack(np.pad(stack, padding, mode='constant'), images)
+    if not isinstance(padded, np.ndarray):
+        for image in padded:
+            if image.crop_offset is not None:
+                image.crop_offset = tuple(int(o - before) for o, (before, _) in zip(image.crop_offset, padding[1:]))
+    return padded
+
+
+@instrumented("processing")
+def batch_apply_mask(images: Batch, mask: np.ndarray, invert: bool | Sequence[bool] = False) -> Batch:
+    """
+    Apply a mask to every image of a batch.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data.
+    :param mask: The mask, for all images or a stack with one mask per image.
+    :param invert: Whether to invert the mask, for all images or per image.
+
+    :return: The masked batch. The dtype of the image data is kept.
+    """
+    stack = _stack(images)
+    # Label masks are only used for their truth value
+    mask = np.asarray(mask).astype(bool, copy=False)
+    zeroed = np.logical_xor(mask, _per_image(np.asarray(invert, dtype=bool), stack))
+    return _unstack(np.where(zeroed, stack.dtype.type(0), stack), images)
+
+
+def _stack(images: Batch) -> np.ndarray:
+    """
+    Return the image data of a batch as one array with the images along axis 0.
+
+    :param images: A list of RadImages of the same shape, or a stack of image data
+
+    :raises ValueError: If the batch is empty, an image is not loaded or the shapes differ.
+    """
+    if isinstance(images, np.ndarray):
+        if images.ndim < 2:
+            raise ValueError(f"A stack of images needs at least 2 dimensions, got shape {images.shape}")
+        return images
+
+    images = list(images)
+    if not images:
+        raise ValueError("The batch is empty")
+    shapes = {tuple(image.shape) for image in images}
+    if len(shapes) > 1:
+        raise ValueError(f"The images of a batch must have the same shape, got {sorted(shapes)}")
+
+    arrays = [image.get_image_data(readonly=True) for image in images]
+    if any(array is None for array in arrays):
+        raise ValueError("Image data not loaded")
+    return np.stack(arrays)
+
+
+def _unstack(result: np.ndarray, images: Batch) -> Batch:
+    """
+    Return a result in the form of the batch it was computed from.
+
+    :param result: The stacked result
+    :param images: The batch the result was computed from
+    """
+    if isinstance(images, np.ndarray):
+        return result
+
+    new_images = []
+    for image, image_data in zip(images, result):
+        new_image = image.copy()
+        new_image.image_data = image_data
+        new_images.append(new_image)
+    return new_images
+
+
+def _per_image(value, stack: np.ndarray) -> np.ndarray:
+    """
+    Broadcast a scalar or per-image parameter against a stack of images.
+
+    :param value: A scalar, or a sequence with one value per image
+    :param stack: The stack of images
+
+    :raises ValueError: If the number of values does not match the number of images.
+    """
+    value = np.asarray(value)
+    if value.ndim == 0:
+        return value
+    if value.shape != (len(stack),):
+        raise ValueError(f"Expected a scalar or {len(stack)} per-image values, got shape {value.shape}")
+    return value.reshape((len(stack),) + (1,) * (stack.ndim - 1))
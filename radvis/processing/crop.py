@@ -0,0 +1,163 @@
+"""
+Cropping of images to their foreground, and the inverse.
+
+crop_to_foreground cuts an image down to the bounding box of its foreground, plus a margin. The
+cropped image records where it was cut from in crop_offset and original_shape, and its affine is
+moved so that it stays aligned in world coordinates. Images processed from it (e.g. with
+noise_reduction) keep these, so uncrop can put the result back into the original frame, and
+compute_marching_cubes places the vertices of meshes in the original frame. add_padding moves the
+crop_offset by the padding before the image, and resample clears both, as its voxels no longer
+line up with the original ones.
+
+Example:
+    cropped = crop_to_foreground(image, threshold=-500, margin=4)
+    filtered = uncrop(noise_reduction(cropped, 1.5), background=image)
+"""
+from typing import Optional, Sequence
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented
+from .masks import bounding_box
+
+
+@instrumented("processing")
+def crop_to_foreground(rad_image: RadImage, threshold: Optional[float] = None,
+                       mask: Optional[np.ndarray | RadImage] = None, margin: int | Sequence[int] = 0,
+                       inplace: bool = False) -> RadImage:
+    """
+    Crop a RadImage to the bounding box of its foreground.
+
+    :param rad_image: The RadImage object to be cropped.
+    :param threshold: Voxels above this intensity are foreground. Defaults to the minimum intensity
+        of the image, so that everything but the background at the minimum is kept.
+    :param mask: A mask of the foreground, used instead of a threshold.
+    :param margin: The number of voxels kept around the foreground, for all axes or per axis, defaults to 0.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+
+    :return: The cropped RadImage object, recording its crop_offset and original_shape.
+
+    :raises ValueError: If image data is not loaded, both threshold and mask are given, or there
+        is no foreground.
+    """
+    if threshold is not None and mask is not None:
+        raise ValueError("Only one of threshold and mask can be given")
+
+    image_data = rad_image.get_image_data(readonly=True)
+    if image_data is None:
+        raise ValueError("Image data not loaded")
+
+    if mask is not None:
+        if isinstance(mask, RadImage):
+            mask = mask.get_image_data(readonly=True)
+        mask = np.asarray(mask)
+        if mask.shape != image_data.shape:
+            raise ValueError(f"Mask has shape {mask.shape}, expected {image_data.shape}")
+        box = bounding_box(mask)
+    else:
+        if threshold is None:
+            threshold = rad_image.statistics.min
+        box = _threshold_box(image_data, threshold)
+    if box is None:
+        raise ValueError("The image has no foreground voxels")
+
+    margin = np.broadcast_to(np.asarray(margin, dtype=int), (image_data.ndim,))
+    box = tuple(slice(max(0, s.start - m), min(size, s.stop + m)) for s, m, size in zip(box, margin, image_data.shape))
+    start = tuple(s.start for s in box)
+
+    new_rad_image = rad_image if inplace else rad_image.copy()
+    new_rad_image.image_data = np.array(image_data[box])
+    # Offsets of nested crops add up to the offset in the first image
+    if rad_image.crop_offset is None:
+        new_rad_image.crop_offset = start
+        new_rad_image.original_shape = tuple(image_data.shape)
+    else:
+        new_rad_image.crop_offset = tuple(o + s for o, s in zip(rad_image.crop_offset, start))
+    if rad_image.affine is not None and image_data.ndim <= 3:
+        new_rad_image.affine = _translated_affine(rad_image.affine, start)
+    return new_rad_image
+
+
+@instrumented("processing")
+def uncrop(rad_image: RadImage, background: Optional[np.ndarray | RadImage] = None, fill_value: float = 0,
+           inplace: bool = False) -> RadImage:
+    """
+    Put a cropped RadImage back into the frame it was cropped from.
+
+    :param rad_image: The cropped RadImage object, or an image processed from one.
+    :param background: The image data around the cropped region, e.g. the original image. Defaults
+        to None, filling the region around the crop with fill_value.
+    :param fill_value: The value around the cropped region when no background is given, defaults to 0.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+
+    :return: The RadImage object in the original frame. The dtype of the cropped image data is kept.
+
+    :raises ValueError: If the image was not cropped, its image data is not loaded, it does not fit
+        in the original shape at its crop_offset, or the background does not have the original shape.
+    """
+    if rad_image.crop_offset is None:
+        raise ValueError("The image was not cropped")
+    image_data = rad_image.get_image_data(readonly=True)
+    if image_data is None:
+        raise ValueError("Image data not loaded")
+
+    shape = rad_image.original_shape
+    offset = rad_image.crop_offset
+    if (shape is None or len(offset) != image_data.ndim or len(shape) != image_data.ndim
+            or any(o < 0 or o + size > length for o, size, length in zip(offset, image_data.shape, shape))):
+        raise ValueError(f"Image of shape {image_data.shape} at crop offset {offset} does not fit in "
+                         f"the original shape {shape}")
+    if background is None:
+        out = np.full(shape, fill_value, dtype=image_data.dtype)
+    else:
+        if isinstance(background, RadImage):
+            background = background.get_image_data(readonly=True)
+        if tuple(background.shape) != tuple(shape):
+            raise ValueError(f"Background has shape {background.shape}, expected {shape}")
+        out = np.empty(shape, dtype=image_data.dtype)
+        np.copyto(out, background, casting="unsafe")
+    out[tuple(slice(o, o + size) for o, size in zip(offset, image_data.shape))] = image_data
+
+    new_rad_image = rad_image if inplace else rad_image.copy()
+    new_rad_image.image_data = out
+    new_rad_image.crop_offset = None
+    new_rad_image.original_shape = None
+    if rad_image.affine is not None and image_data.ndim <= 3:
+        new_rad_image.affine = _translated_affine(rad_image.affine, [-o for o in offset])
+    return new_rad_image
+
+
+def _threshold_box(image_data: np.ndarray, threshold: float) -> Optional[tuple[slice, ...]]:
+    """
+    Return the bounding box of the voxels above a threshold, or None if there are none.
+
+    The maximum along the other axes is taken for each axis in turn, within the extent found
+    along the previous axes, so no mask of the whole volume is built.
+
+    :param image_data: The image data
+    :param threshold: The intensity voxels must exceed
+    """
+    box = []
+    region = image_data
+    for axis in range(image_data.ndim):
+        others = tuple(a for a in range(image_data.ndim) if a != axis)
+        present = np.flatnonzero(np.max(region, axis=others) > threshold) if region.size else []
+        if not len(present):
+            return None
+        extent = slice(int(present[0]), int(present[-1]) + 1)
+        box.append(extent)
+        region = region[(slice(None),) * axis + (extent,)]
+    return tuple(box)
+
+
+def _translated_affine(affine: np.ndarray, offset: Sequence[int]) -> np.ndarray:
+    """
+    Return the affine of an image whose voxel indices are shifted by an offset.
+
+    :param affine: The 4x4 affine
+    :param offset: The voxel index of the new image's first voxel in the original image
+    """
+    affine = np.array(affine, dtype=np.float64)
+    shift = np.zeros(4)
+    shift[:len(offset)] = offset
+    affine[:3, 3] = (affine @ (shift + [0, 0, 0, 1]))[:3]
+    return affine
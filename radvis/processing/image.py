@@ -1,114 +1,428 @@
-from radvis.image.rad_image import RadImage 
+from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented
+from radvis.image.dtype_policy import narrowest_float_dtype
+from .percentiles import compute_percentiles
+from .filters import parallel_gaussian_filter
+from .out_of_core import stream_blocks
+from .masks import SparseMask, bounding_box
+from .crop import _translated_affine
+from typing import Optional
 import numpy as np
-from scipy.ndimage import gaussian_filter
 
 
-def normalization(rad_image: RadImage, min_val:float, max_val:float) -> RadImage:
+@instrumented("processing")
+def normalization(rad_image: RadImage, min_val:float, max_val:float, inplace: bool = False,
+                  out: Optional[np.ndarray] = None, block_size: Optional[int] = None) -> RadImage:
     """
     Perform intensity normalization on a given RadImage.
-    
+
     :param rad_image: The RadImage object to be normalized.
+    :param min_val: The intensity mapped to 0.
+    :param max_val: The intensity mapped to 1.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the shape of the image data.
+    :param block_size: Process the image this many slices along axis 0 at a time, reading lazily
+        loaded or memory-mapped data one block at a time. out may then also be a ChunkedVolumeWriter.
+        See radvis.processing.out_of_core.
 
-    :return: The normalized RadImage object.
+    :return: The normalized RadImage object. Integer data is promoted to the narrowest
+        floating point dtype that holds it exactly.
 
     :raises ValueError: If image data is not loaded.
     """
-    new_rad_image = rad_image.copy()
-    if new_rad_image.image_data is None:
-        raise ValueError("Image data not loaded")
+    if block_size is not None:
+        dtype = narrowest_float_dtype(rad_image.dtype)
+
+        def normalize_block(block: np.ndarray, rows: slice, inner: slice) -> np.ndarray:
+            result = np.subtract(block, min_val, dtype=dtype)
+            return np.divide(result, max_val - min_val, out=result, casting="unsafe")
+
+        return stream_blocks(rad_image, inplace, out, dtype, block_size, normalize_block)
+
+    image_data = _input_data(rad_image)
+    dtype = narrowest_float_dtype(image_data.dtype)
+    new_rad_image = _output_image(rad_image, inplace)
+    out = _output_array(new_rad_image, inplace, out, image_data.shape, dtype)
 
-    # Normalize the image data
-    new_rad_image.image_data = (new_rad_image.image_data - min_val) / (max_val - min_val)
+    # Normalize the image data, computing in the output dtype to avoid a float64 temporary
+    if out is None:
+        out = np.subtract(image_data, min_val, dtype=dtype)
+    else:
+        np.subtract(image_data, min_val, out=out, dtype=out.dtype, casting="unsafe")
+    np.divide(out, max_val - min_val, out=out, casting="unsafe")
+    new_rad_image.image_data = out
     return new_rad_image
 
-def noise_reduction(rad_image: RadImage, sigma: float) -> RadImage:
+@instrumented("processing")
+def noise_reduction(rad_image: RadImage, sigma: float, inplace: bool = False,
+                    out: Optional[np.ndarray] = None, workers: Optional[int] = 1,
+                    per_axis: bool = False, block_size: Optional[int] = None) -> RadImage:
     """
     Reduce noise in a given RadImage using Gaussian filtering.
-    
+
     :param rad_image: The RadImage object to be processed.
     :param sigma: Standard deviation for the Gaussian filter.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the shape of the image data.
+    :param workers: The number of threads to filter with, or None for one per CPU. Several
+        threads filter blocks of slices with halos of the kernel radius; the result is identical.
+    :param per_axis: Whether to run each separable 1D pass over the whole volume in cache-sized
+        chunks, which is often faster for large volumes even with one thread.
+    :param block_size: Process the image this many slices along axis 0 at a time, plus halos of
+        the kernel radius, reading lazily loaded or memory-mapped data one block at a time. out may
+        then also be a ChunkedVolumeWriter. See radvis.processing.out_of_core.
 
-    :return: The RadImage object with reduced noise.
+    :return: The RadImage object with reduced noise. Integer data is promoted to the
+        narrowest floating point dtype that holds it exactly, rather than truncating.
 
     :raises ValueError: If image data is not loaded.
     """
-    new_rad_image = rad_image.copy()
-    if new_rad_image.image_data is None:
-        raise ValueError("Image data not loaded")
+    # Imported here so that scipy is only loaded by processes that filter images
+    from scipy.ndimage import gaussian_filter
+
+    if block_size is not None:
+        dtype = narrowest_float_dtype(rad_image.dtype)
+        sigma_0 = float(np.ravel(sigma)[0])
+        halo = int(4.0 * sigma_0 + 0.5) if sigma_0 > 1e-15 else 0
+
+        def filter_block(block: np.ndarray, rows: slice, inner: slice) -> np.ndarray:
+            if workers == 1 and not per_axis:
+                result = gaussian_filter(block, sigma=sigma, output=dtype)
+            else:
+                result = parallel_gaussian_filter(block, sigma, np.empty(block.shape, dtype=dtype),
+                                                  workers=workers, per_axis=per_axis)
+            return result[inner]
 
-    new_rad_image.image_data = gaussian_filter(new_rad_image.image_data, sigma=sigma)
+        return stream_blocks(rad_image, inplace, out, dtype, block_size, filter_block, halo=halo)
+
+    image_data = _input_data(rad_image)
+    dtype = narrowest_float_dtype(image_data.dtype)
+    new_rad_image = _output_image(rad_image, inplace)
+    out = _output_array(new_rad_image, inplace, out, image_data.shape, dtype)
+
+    if workers == 1 and not per_axis:
+        new_rad_image.image_data = gaussian_filter(image_data, sigma=sigma, output=dtype if out is None else out)
+    else:
+        out = np.empty(image_data.shape, dtype=dtype) if out is None else out
+        new_rad_image.image_data = parallel_gaussian_filter(image_data, sigma, out, workers=workers,
+                                                            per_axis=per_axis)
     return new_rad_image
 
-def percentile_clipping(rad_image: RadImage, lower_percentile: float, upper_percentile: float) -> RadImage:
+@instrumented("processing")
+def percentile_clipping(rad_image: RadImage, lower_percentile: float, upper_percentile: float,
+                        inplace: bool = False, out: Optional[np.ndarray] = None, method: str = "exact",
+                        mask: Optional[np.ndarray|RadImage] = None, block_size: Optional[int] = None) -> RadImage:
     """
     Perform percentile clipping on a given RadImage.
-    
+
     :param rad_image: The RadImage object to be clipped.
     :param lower_percentile: The lower percentile for intensity clipping.
     :param upper_percentile: The upper percentile for intensity clipping.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the shape of the image data.
+    :param method: How the percentiles are computed: "exact", or the faster approximate "histogram"
+        or "sample". See radvis.processing.percentiles for their error bounds.
+    :param mask: A mask selecting the voxels (e.g. the foreground) the percentiles are computed on.
+        The whole image is clipped.
+    :param block_size: Process the image this many slices along axis 0 at a time, in a pass
+        computing the percentiles and a pass clipping, reading lazily loaded or memory-mapped data
+        one block at a time. out may then also be a ChunkedVolumeWriter. See
+        radvis.processing.out_of_core.
 
     :return: The RadImage object with intensity values clipped within the specified percentiles.
+        Integer data keeps its dtype unless a percentile falls between two integers.
 
     :raises ValueError: If image data is not loaded.
     """
-    new_rad_image = rad_image.copy()
-    if new_rad_image.image_data is None:
-        raise ValueError("Image data not loaded")
+    image_data = _input_data(rad_image) if block_size is None else rad_image
+
+    # Compute the lower and upper intensity values in one pass, or reuse the image's cached percentiles
+    if method == "exact" and mask is None:
+        lower, upper = rad_image.statistics.percentiles([lower_percentile, upper_percentile])
+    else:
+        lower, upper = compute_percentiles(image_data, [lower_percentile, upper_percentile], method=method,
+                                           mask=mask).values
+
+    # Keep integer dtypes when the bounds are whole numbers
+    dtype = np.dtype(image_data.dtype)
+    if not (float(lower).is_integer() and float(upper).is_integer()):
+        dtype = narrowest_float_dtype(dtype)
+
+    if block_size is not None:
+        def clip_block(block: np.ndarray, rows: slice, inner: slice) -> np.ndarray:
+            return np.clip(block, dtype.type(lower), dtype.type(upper), dtype=dtype)
+
+        return stream_blocks(rad_image, inplace, out, dtype, block_size, clip_block)
 
-    # Compute the lower and upper intensity values
-    lower = np.percentile(new_rad_image.image_data, lower_percentile)
-    upper = np.percentile(new_rad_image.image_data, upper_percentile)
+    new_rad_image = _output_image(rad_image, inplace)
+    out = _output_array(new_rad_image, inplace, out, image_data.shape, dtype)
 
     # Clip the image data
-    new_rad_image.image_data = np.clip(new_rad_image.image_data, lower, upper)
+    if out is None:
+        out = np.clip(image_data, dtype.type(lower), dtype.type(upper), dtype=dtype)
+    else:
+        np.clip(image_data, lower, upper, out=out, casting="unsafe")
+    new_rad_image.image_data = out
     return new_rad_image
 
 
-def add_padding(rad_image: RadImage, target_shape: tuple) -> RadImage:
+@instrumented("processing")
+def add_padding(rad_image: RadImage, target_shape: tuple, inplace: bool = False,
+                out: Optional[np.ndarray] = None) -> RadImage:
     """
     Adds padding to either side of the image to match the expected shape.
 
     :param rad_image: The RadImage object to be padded.
     :param target_shape: The expected shape of the image.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the target shape.
 
-    :return: The RadImage object with padding added.
+    :return: The RadImage object with padding added. The crop_offset of a cropped image is moved
+        by the padding before it, see radvis.processing.crop.
     """
-    new_rad_image = rad_image.copy()
-    if new_rad_image.image_data is None:
-        raise ValueError("Image data not loaded")
+    image_data = _input_data(rad_image)
+    new_rad_image = _output_image(rad_image, inplace)
+    out = _output_array(new_rad_image, False, out, tuple(target_shape), image_data.dtype)
 
     # Compute the padding
-    padding = np.subtract(target_shape, new_rad_image.image_data.shape)
+    padding = np.subtract(target_shape, image_data.shape)
     padding = np.array([padding // 2, padding - padding // 2]).T
 
     # Pad the image data
-    new_rad_image.image_data = np.pad(new_rad_image.image_data, padding, mode='constant')
+    if out is None:
+        out = np.pad(image_data, padding, mode='constant')
+    else:
+        out[...] = 0
+        out[tuple(slice(before, before + size) for (before, _), size in zip(padding, image_data.shape))] = image_data
+    new_rad_image.image_data = out
+    if rad_image.crop_offset is not None:
+        new_rad_image.crop_offset = tuple(int(o - before) for o, (before, _) in zip(rad_image.crop_offset, padding))
     return new_rad_image
 
 
-def apply_mask(rad_image: RadImage, mask: np.ndarray|RadImage, invert=False) -> RadImage:
+@instrumented("processing")
+def apply_mask(rad_image: RadImage, mask: np.ndarray|RadImage|SparseMask, invert=False, inplace: bool = False,
+               out: Optional[np.ndarray] = None, block_size: Optional[int] = None,
+               crop: bool = False) -> RadImage | tuple[RadImage, tuple]:
     """
     Apply a mask to a given RadImage.
 
+    Only the bounding box of the mask is processed, the rest of the volume being copied (or, when
+    inverting, zeroed) as a whole. A SparseMask only touches the voxels it selects.
+
     :param rad_image: The RadImage object to be masked.
-    :param mask: The mask to be applied to the RadImage.
+    :param mask: The mask to be applied to the RadImage: an array, a RadImage or a SparseMask.
     :param invert: Whether to invert the mask.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the shape of the image data (or of the
+        cropped region when cropping).
+    :param block_size: Process the image this many slices along axis 0 at a time, reading lazily
+        loaded or memory-mapped data and masks one block at a time. out may then also be a
+        ChunkedVolumeWriter. See radvis.processing.out_of_core.
+    :param crop: Whether to crop the result to the bounding box of the voxels that are kept.
 
-    :return: The RadImage object with the mask applied.
+    :return: The RadImage object with the mask applied. The dtype of the image data is kept.
+        When cropping, a tuple of the cropped RadImage and the offset of the crop in the image.
+        The cropped RadImage records the crop as crop_to_foreground does, see radvis.processing.crop.
 
-    :raises ValueError: If image data is not loaded.
+    :raises ValueError: If image data is not loaded, or crop is combined with block_size.
     """
-    new_rad_image = rad_image.copy()
-    if new_rad_image.image_data is None:
-        raise ValueError("Image data not loaded")
+    if block_size is not None:
+        if crop:
+            raise ValueError("crop is not supported with block_size")
+        dtype = np.dtype(rad_image.dtype)
+        zero = dtype.type(0)
+        if isinstance(mask, (RadImage, SparseMask)):
+            if tuple(mask.shape) != tuple(rad_image.shape):
+                raise ValueError(f"Mask has shape {mask.shape}, expected {rad_image.shape}")
+            read_mask = mask._read if isinstance(mask, RadImage) else mask.__getitem__
+        else:
+            read_mask = np.broadcast_to(np.asarray(mask), rad_image.shape).__getitem__
+
+        def mask_block(block: np.ndarray, rows: slice, inner: slice) -> np.ndarray:
+            selected = np.asarray(read_mask(rows)).astype(bool, copy=False)
+            return np.where(selected, block, zero) if invert else np.where(selected, zero, block)
+
+        return stream_blocks(rad_image, inplace, out, dtype, block_size, mask_block)
+
+    image_data = _input_data(rad_image)
 
     # Check if the mask is a RadImage
     if isinstance(mask, RadImage):
-        mask = mask.image_data
+        mask = mask.get_image_data(readonly=True)
+
+    if isinstance(mask, SparseMask):
+        if mask.shape != image_data.shape:
+            raise ValueError(f"Mask has shape {mask.shape}, expected {image_data.shape}")
+        box = mask.bounding_box()
+    else:
+        # Label masks are only used for their truth value
+        mask = np.broadcast_to(np.asarray(mask).astype(bool, copy=False), image_data.shape)
+        box = bounding_box(mask)
+
+    if crop:
+        return _crop_to_mask(rad_image, image_data, mask, box, invert, inplace, out)
+
+    new_rad_image = _output_image(rad_image, inplace)
+    out = _output_array(new_rad_image, inplace, out, image_data.shape, image_data.dtype)
 
     # Apply the mask
+    zero = image_data.dtype.type(0)
     if invert:
-        new_rad_image.image_data = np.where(mask, new_rad_image.image_data, 0)
+        # Keep the voxels of the mask, all inside its bounding box
+        if out is None:
+            out = np.zeros(image_data.shape, dtype=image_data.dtype)
+            if isinstance(mask, SparseMask):
+                target, index = _sparse_index(out, mask)
+                source, source_index = _sparse_index(image_data, mask)
+                target[index] = source[source_index]
+            elif box is not None:
+                np.copyto(out[box], image_data[box], where=mask[box])
+        else:
+            _fill_outside(out, box, 0)
+            if box is not None:
+                selected = mask.to_dense(box) if isinstance(mask, SparseMask) else mask[box]
+                out[box] = np.where(selected, image_data[box], zero)
     else:
-        new_rad_image.image_data = np.where(mask, 0, new_rad_image.image_data)
-    return new_rad_image
\ No newline at end of file
+        # Zero the voxels of the mask, copying the rest of the image as a whole
+        if out is None:
+            out = np.array(image_data)
+        elif not np.shares_memory(out, image_data):
+            np.copyto(out, image_data, casting="unsafe")
+        if isinstance(mask, SparseMask):
+            target, index = _sparse_index(out, mask)
+            target[index] = 0
+        elif box is not None:
+            np.copyto(out[box], 0, where=mask[box])
+    new_rad_image.image_data = out
+    return new_rad_image
+
+
+def _crop_to_mask(rad_image: RadImage, image_data: np.ndarray, mask: np.ndarray|SparseMask,
+                  box: Optional[tuple], invert: bool, inplace: bool, out: Optional[np.ndarray]) -> tuple[RadImage, tuple]:
+    """
+    Apply a mask and crop the result to the bounding box of the voxels that are kept.
+
+    :param rad_image: The RadImage object to be masked.
+    :param image_data: The image data of rad_image.
+    :param mask: The dense boolean mask, broadcast to the image's shape, or a SparseMask.
+    :param box: The bounding box of the mask.
+    :param invert: Whether the mask selects the voxels to keep rather than the voxels to zero.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the shape of the cropped region.
+
+    :return: The cropped RadImage and the offset of the crop in the image.
+    """
+    if not invert:
+        dense = mask.to_dense() if isinstance(mask, SparseMask) else mask
+        box = bounding_box(np.logical_not(dense))
+    if box is None:
+        box = tuple(slice(0, 0) for _ in image_data.shape)
+
+    if isinstance(mask, SparseMask):
+        selected = mask.to_dense(box)
+    else:
+        selected = mask[box]
+    zero = image_data.dtype.type(0)
+    result = np.where(selected, image_data[box], zero) if invert else np.where(selected, zero, image_data[box])
+    if out is not None:
+        if out.shape != result.shape:
+            raise ValueError(f"Output array has shape {out.shape}, expected {result.shape}")
+        np.copyto(out, result, casting="unsafe")
+        result = out
+
+    offset = tuple(s.start for s in box)
+    new_rad_image = _output_image(rad_image, inplace)
+    new_rad_image.image_data = result
+    # Record the crop as crop_to_foreground does, so that uncrop can undo it
+    if rad_image.crop_offset is None:
+        new_rad_image.crop_offset = offset
+        new_rad_image.original_shape = tuple(image_data.shape)
+    else:
+        new_rad_image.crop_offset = tuple(o + s for o, s in zip(rad_image.crop_offset, offset))
+    if rad_image.affine is not None and image_data.ndim <= 3:
+        new_rad_image.affine = _translated_affine(rad_image.affine, offset)
+    return new_rad_image, offset
+
+
+def _sparse_index(array: np.ndarray, mask: SparseMask) -> tuple[np.ndarray, np.ndarray | tuple]:
+    """
+    Return a view of an array and the index selecting the voxels of a sparse mask in it. Flat
+    indices are used on contiguous arrays, as they are faster than coordinates.
+
+    :param array: The array to index, with the mask's shape.
+    :param mask: The sparse mask.
+    """
+    if array.flags.c_contiguous:
+        return array.reshape(-1), mask.indices
+    return array, mask.coordinates
+
+
+def _fill_outside(out: np.ndarray, box: Optional[tuple], value) -> None:
+    """
+    Fill the voxels of an array outside a box.
+
+    :param out: The array to fill.
+    :param box: One slice per axis, or None to fill the whole array.
+    :param value: The fill value.
+    """
+    if box is None:
+        out[...] = value
+        return
+    # Slabs before and after the box along each axis, within the box along the previous axes
+    for axis, extent in enumerate(box):
+        out[box[:axis] + (slice(0, extent.start),)] = value
+        out[box[:axis] + (slice(extent.stop, None),)] = value
+
+
+def _input_data(rad_image: RadImage) -> np.ndarray:
+    """
+    Return a read-only view of the image data to process, without duplicating
+    a buffer shared copy-on-write with other images.
+
+    :param rad_image: The RadImage object to be processed.
+
+    :raises ValueError: If image data is not loaded.
+    """
+    image_data = rad_image.get_image_data(readonly=True)
+    if image_data is None:
+        raise ValueError("Image data not loaded")
+    return image_data
+
+
+def _output_image(rad_image: RadImage, inplace: bool) -> RadImage:
+    """
+    Return the RadImage the result is stored in: rad_image itself when processing
+    in place, otherwise a copy-on-write copy of it.
+
+    :param rad_image: The RadImage object to be processed.
+    :param inplace: Whether the result replaces the data of rad_image.
+    """
+    return rad_image if inplace else rad_image.copy()
+
+
+def _output_array(rad_image: RadImage, inplace: bool, out: Optional[np.ndarray],
+                  shape: tuple, dtype: np.dtype) -> Optional[np.ndarray]:
+    """
+    Return the array to write the result into: out if given, or the image's own buffer when
+    processing in place and the buffer is private, writable and of the result's shape and dtype.
+    Returns None if a new array has to be allocated.
+
+    :param rad_image: The RadImage object the result is stored in.
+    :param inplace: Whether the result replaces the data of rad_image.
+    :param out: The array requested by the caller, if any.
+    :param shape: The shape of the result.
+    :param dtype: The dtype of the result.
+
+    :raises ValueError: If out does not have the shape of the result.
+    """
+    if out is not None:
+        if out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape}, expected {shape}")
+        return out
+
+    if inplace and rad_image.is_loaded and not rad_image.shares_image_data:
+        image_data = rad_image.image_data
+        if image_data.shape == shape and image_data.dtype == dtype and image_data.flags.writeable:
+            return image_data
+    return None
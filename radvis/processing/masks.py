@@ -0,0 +1,170 @@
+"""
+Masks that only cover part of the image.
+
+A brain or organ mask often selects a small part of the field of view. apply_mask works out the
+bounding box of the mask and only processes the voxels inside it, and a SparseMask goes further by
+storing the selected voxels themselves, so that applying it touches those voxels only.
+
+A SparseMask can be built from:
+    A dense mask: SparseMask.from_dense(mask)
+    Voxel coordinates, such as the output of np.nonzero: SparseMask.from_coordinates(coordinates, shape)
+    Runs of voxels in C order, as in run-length encoded masks: SparseMask.from_runs(starts, lengths, shape)
+
+Example:
+    mask = SparseMask.from_dense(brain_mask)
+    brain, offset = apply_mask(image, mask, invert=True, crop=True)
+"""
+from typing import Optional
+import numpy as np
+
+
+class SparseMask:
+    def __init__(self, indices: np.ndarray, shape: tuple):
+        """
+        Initialize the SparseMask class.
+
+        :param indices: The indices of the selected voxels in the flattened (C order) volume
+        :param shape: The shape of the volume the mask applies to
+
+        :raises ValueError: If an index is outside the volume.
+        """
+        self.shape = tuple(int(size) for size in shape)
+        self.indices = np.unique(np.asarray(indices, dtype=np.intp).ravel())
+        size = int(np.prod(self.shape, dtype=np.int64))
+        if len(self.indices) and (self.indices[0] < 0 or self.indices[-1] >= size):
+            raise ValueError(f"Mask indices must be within a volume of {size} voxels")
+        self._coordinates = None
+
+    @classmethod
+    def from_dense(cls, mask: np.ndarray) -> "SparseMask":
+        """
+        Create a SparseMask from a dense mask. Non-zero voxels are selected.
+
+        :param mask: The dense mask
+        """
+        mask = np.asarray(mask)
+        return cls(np.flatnonzero(mask), mask.shape)
+
+    @classmethod
+    def from_coordinates(cls, coordinates: tuple, shape: tuple) -> "SparseMask":
+        """
+        Create a SparseMask from the coordinates of the selected voxels.
+
+        :param coordinates: One array of indices per axis, as returned by np.nonzero
+        :param shape: The shape of the volume
+
+        :raises ValueError: If a coordinate is outside the volume.
+        """
+        return cls(np.ravel_multi_index(tuple(np.asarray(c) for c in coordinates), shape), shape)
+
+    @classmethod
+    def from_runs(cls, starts: np.ndarray, lengths: np.ndarray, shape: tuple) -> "SparseMask":
+        """
+        Create a SparseMask from runs of consecutive voxels in the flattened (C order) volume.
+
+        :param starts: The flat index of the first voxel of each run
+        :param lengths: The number of voxels in each run
+        :param shape: The shape of the volume
+        """
+        starts = np.asarray(starts, dtype=np.intp)
+        lengths = np.asarray(lengths, dtype=np.intp)
+        # Offset of every voxel from the start of its run
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return cls(np.repeat(starts, lengths) + offsets, shape)
+
+    @property
+    def count(self) -> int:
+        """
+        The number of selected voxels.
+        """
+        return len(self.indices)
+
+    @property
+    def coordinates(self) -> tuple:
+        """
+        The coordinates of the selected voxels, one array per axis.
+        """
+        if self._coordinates is None:
+            self._coordinates = np.unravel_index(self.indices, self.shape)
+        return self._coordinates
+
+    def runs(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the mask as runs of consecutive voxels in the flattened (C order) volume.
+
+        :return: The start and the length of each run
+        """
+        breaks = np.flatnonzero(np.diff(self.indices) != 1) + 1
+        starts = np.concatenate([[0], breaks]).astype(np.intp) if self.count else np.empty(0, dtype=np.intp)
+        lengths = np.diff(np.concatenate([starts, [self.count]]))
+        return self.indices[starts], lengths
+
+    def bounding_box(self) -> Optional[tuple[slice, ...]]:
+        """
+        Return the smallest box holding every selected voxel, or None if the mask is empty.
+        """
+        if not self.count:
+            return None
+        return tuple(slice(int(c.min()), int(c.max()) + 1) for c in self.coordinates)
+
+    def to_dense(self, box: Optional[tuple[slice, ...]] = None) -> np.ndarray:
+        """
+        Return the mask as a dense boolean array.
+
+        :param box: Only return this box of the volume, given as one slice with a step of 1 per
+            axis, defaults to None (the whole volume)
+        """
+        if box is None:
+            dense = np.zeros(self.shape, dtype=bool)
+            dense.reshape(-1)[self.indices] = True
+            return dense
+
+        bounds = [s.indices(size)[:2] for s, size in zip(box, self.shape)]
+        dense = np.zeros(tuple(max(0, stop - start) for start, stop in bounds), dtype=bool)
+        inside = np.ones(self.count, dtype=bool)
+        for c, (start, stop) in zip(self.coordinates, bounds):
+            inside &= (c >= start) & (c < stop)
+        dense[tuple(c[inside] - start for c, (start, _) in zip(self.coordinates, bounds))] = True
+        return dense
+
+    def __getitem__(self, rows: slice) -> np.ndarray:
+        """
+        Return the slices `rows` along axis 0 of the mask as a dense boolean array, as used by
+        out-of-core processing.
+
+        :param rows: The slices along axis 0, with a step of 1
+        """
+        start, stop, _ = rows.indices(self.shape[0])
+        stop = max(start, stop)
+        stride = int(np.prod(self.shape[1:], dtype=np.int64))
+        first, last = np.searchsorted(self.indices, [start * stride, stop * stride])
+        dense = np.zeros((stop - start,) + self.shape[1:], dtype=bool)
+        dense.reshape(-1)[self.indices[first:last] - start * stride] = True
+        return dense
+
+    def __repr__(self) -> str:
+        return f"SparseMask(shape={self.shape}, count={self.count})"
+
+
+def bounding_box(mask: np.ndarray) -> Optional[tuple[slice, ...]]:
+    """
+    Return the smallest box holding every non-zero voxel of a dense mask, or None if it is empty.
+
+    Each axis is searched within the extent found along the previous axes, so masks covering a
+    small part of the volume are only read in full once.
+
+    :param mask: The dense mask
+    :return: One slice per axis
+    """
+    mask = np.asarray(mask)
+    box = []
+    region = mask
+    for axis in range(mask.ndim):
+        others = tuple(a for a in range(mask.ndim) if a != axis)
+        present = np.flatnonzero(np.any(region, axis=others))
+        if not len(present):
+            return None
+        extent = slice(int(present[0]), int(present[-1]) + 1)
+        box.append(extent)
+        region = region[(slice(None),) * axis + (extent,)]
+    return tuple(box)
@@ -0,0 +1,117 @@
+"""
+Out-of-core execution of the processing functions.
+
+Passing block_size to normalization, apply_mask, percentile_clipping or noise_reduction streams
+the image through the function block_size slices along axis 0 at a time. Lazily loaded and
+memory-mapped images are only read a block at a time, and each block of the result is written to
+the output before the next block is read, so peak memory is a few blocks whatever the size of the
+volume. percentile_clipping makes two passes, one for the percentiles and one to clip, and
+noise_reduction reads every block with a halo of the kernel radius.
+
+The output can be:
+    None: A new in-memory array.
+    A NumPy array, typically a memmap from RadNumpyImage.create_memmap or np.lib.format.open_memmap.
+    A ChunkedVolumeWriter: Blocks are compressed as they arrive. The writer is closed, and the
+        returned image reads the chunked file lazily. If processing fails, the file is removed.
+
+Example:
+    output = RadNumpyImage.create_memmap("normalized.npy", image.shape, np.float32)
+    normalization(load_image("ct.npy", lazy=True), -1000, 3000, out=output.image_data, block_size=16)
+"""
+from typing import Callable, Optional
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.image.chunked_store import ChunkedVolumeReader, ChunkedVolumeWriter
+from radvis.image.slice_provider import ArraySliceProvider
+
+
+def stream_blocks(rad_image: RadImage, inplace: bool, out: Optional[np.ndarray | ChunkedVolumeWriter],
+                  dtype: np.dtype, block_size: int, process: Callable, halo: int = 0) -> RadImage:
+    """
+    Run a processing step over the image one block of slices along axis 0 at a time.
+
+    :param rad_image: The RadImage object to be processed.
+    :param inplace: Whether to store the result in rad_image instead of a copy. Its buffer is
+        overwritten block by block when it is held in memory (or memory-mapped), private, writable
+        and of the result's dtype.
+    :param out: Where to write the result: None, an array or a ChunkedVolumeWriter.
+    :param dtype: The dtype of the result.
+    :param block_size: The number of slices along axis 0 processed at a time.
+    :param process: A function (block, rows, inner) returning the result for the slices `rows` of
+        the volume, given the block read, which holds those slices at `inner` plus any halo.
+    :param halo: The number of slices read on either side of every block, defaults to 0.
+
+    :return: The RadImage object holding the result.
+
+    :raises ValueError: If image data is not loaded or the output does not have the image's shape.
+    """
+    if rad_image.is_loaded and rad_image._image_data is None:
+        raise ValueError("Image data not loaded")
+    if block_size < 1:
+        raise ValueError(f"block_size must be positive, got {block_size}")
+
+    shape = tuple(rad_image.shape)
+    new_rad_image = rad_image if inplace else rad_image.copy()
+    if isinstance(out, ChunkedVolumeWriter):
+        if out.shape != shape:
+            raise ValueError(f"Output volume has shape {out.shape}, expected {shape}")
+        write = lambda rows, result: out.write_slab(result)
+    else:
+        if out is None:
+            out = _inplace_buffer(rad_image, dtype) if inplace else None
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape}, expected {shape}")
+
+        def write(rows: slice, result: np.ndarray) -> None:
+            out[rows] = result
+
+    # Blocks must be at least as thick as the halo, so a block only reads the slices of its neighbours
+    block_size = max(block_size, halo)
+    # Blocks read from the output itself are copied, as their halo is overwritten before they are processed
+    aliased = halo > 0 and isinstance(out, np.ndarray) and rad_image.is_loaded \
+        and np.may_share_memory(out, rad_image._image_data)
+    length = shape[0]
+    pending = None
+    try:
+        for start in range(0, length, block_size):
+            stop = min(length, start + block_size)
+            first, last = max(0, start - halo), min(length, stop + halo)
+            block = rad_image._read(slice(first, last))
+            block = np.array(block) if aliased else np.asarray(block)
+            # The result of the previous block is written once this block is read, as the output may be
+            # the input itself, whose slices this block reads as its halo
+            if pending is not None:
+                write(*pending)
+            pending = (slice(start, stop), process(block, slice(start, stop), slice(start - first, stop - first)))
+        if pending is not None:
+            write(*pending)
+    except BaseException:
+        # The chunked file is removed rather than left without its last blocks
+        if isinstance(out, ChunkedVolumeWriter):
+            out.discard()
+        raise
+
+    if isinstance(out, ChunkedVolumeWriter):
+        out.close()
+        new_rad_image._set_slice_provider(ArraySliceProvider(ChunkedVolumeReader(out.file_path)))
+    else:
+        if isinstance(out, np.memmap):
+            out.flush()
+        new_rad_image.image_data = out
+    return new_rad_image
+
+
+def _inplace_buffer(rad_image: RadImage, dtype: np.dtype) -> Optional[np.ndarray]:
+    """
+    Return the image's own buffer if the result can overwrite it, or None.
+
+    :param rad_image: The RadImage object processed in place
+    :param dtype: The dtype of the result
+    """
+    if rad_image.is_loaded and not rad_image.shares_image_data:
+        buffer = rad_image._image_data
+        if buffer.dtype == dtype and buffer.flags.writeable:
+            return buffer
+    return None
@@ -0,0 +1,419 @@
+"""
+Percentiles of image intensities, computed for several percentiles at once.
+
+Methods:
+    exact: The same values as np.percentile (linear interpolation). 8 and 16 bit integer data, and
+        other integer data spanning at most 2**20 distinct values, is counted in one streaming pass
+        (O(n), no copy of the data). Other in-memory data is partitioned once for all the
+        percentiles; memory-mapped or lazily loaded data is narrowed down with streaming
+        histogram passes until the few values around each rank can be gathered and selected.
+    histogram: One streaming pass over the data into `bins` equal-width bins. Each value is
+        within one bin width, (max - min) / bins, of the exact percentile. Integer data whose
+        range fits in the bins is counted exactly.
+    sample: The percentiles of `sample_size` voxels drawn uniformly at random (with replacement).
+        By the Dvoretzky-Kiefer-Wolfowitz inequality, with probability `confidence` the rank of
+        each value is within sqrt(ln(2 / (1 - confidence)) / (2 * sample_size)) of the requested
+        percentile, about 0.16 percentile points for a million samples at 99% confidence.
+
+All methods can restrict the statistics to the voxels selected by a foreground mask, and read
+memory-mapped and lazily loaded images a block of slices at a time, so they never hold more than
+a block of the volume in memory.
+"""
+import math
+from typing import NamedTuple, Optional
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.image.slice_provider import SliceProvider
+from radvis.instrumentation import instrumented
+
+PERCENTILE_METHODS = ("exact", "histogram", "sample")
+
+# Integer data spanning at most this many values is counted rather than partitioned
+_COUNTING_RANGE = 1 << 20
+
+# The number of voxels processed at a time by the streaming passes
+_BLOCK_VOXELS = 1 << 22
+
+# Streamed exact percentiles select among the values around a rank once there are at most this many
+_GATHER_VALUES = 1 << 22
+
+
+class PercentileEstimate(NamedTuple):
+    """ Percentile values with bounds on their error """
+    values: np.ndarray
+    # The maximum distance to the exact value, in intensity units (None if not bounded)
+    value_error: Optional[float]
+    # The maximum distance between the requested percentile and the actual rank of the value,
+    # in percentile points, holding with the requested confidence for the sample method
+    rank_error: float
+
+
+@instrumented("processing")
+def compute_percentiles(data: np.ndarray | RadImage, percentiles, method: str = "exact",
+                        mask: Optional[np.ndarray | RadImage] = None, bins: int = 4096,
+                        sample_size: int = 1_000_000, confidence: float = 0.99,
+                        seed: Optional[int] = None) -> PercentileEstimate:
+    """
+    Compute several percentiles of image data in a single call.
+
+    :param data: The image data, or a RadImage. Lazily loaded RadImages are read through their
+        slice provider without being loaded in full.
+    :param percentiles: The percentiles to compute, between 0 and 100
+    :param method: "exact", "histogram" or "sample", defaults to "exact". See the module docstring.
+    :param mask: A mask selecting the voxels the statistics are computed on, defaults to all voxels
+    :param bins: The number of bins of the histogram method, defaults to 4096
+    :param sample_size: The number of voxels drawn by the sample method, defaults to 1,000,000
+    :param confidence: The probability with which the rank error bound of the sample method holds,
+        defaults to 0.99
+    :param seed: The seed of the random generator of the sample method, defaults to None
+    :return: The percentile values, in the order requested, with their error bounds
+
+    :raises ValueError: If the method is unknown, a percentile is out of range or the mask is empty.
+    """
+    if method not in PERCENTILE_METHODS:
+        raise ValueError(f"Unknown percentile method '{method}', expected one of {PERCENTILE_METHODS}")
+    q = np.asarray(percentiles, dtype=np.float64)
+    if np.any((q < 0) | (q > 100)):
+        raise ValueError(f"Percentiles must be between 0 and 100, got {percentiles}")
+
+    data = _as_array(data)
+    mask = None if mask is None else _as_mask(mask, data.shape)
+
+    if method == "sample":
+        count = _count_selected(data, mask)
+        if sample_size < count:
+            rank_error = math.sqrt(math.log(2 / (1 - confidence)) / (2 * sample_size))
+            sample = _sample(data, mask, count, sample_size, seed)
+            return PercentileEstimate(np.percentile(sample, q), None, rank_error * 100)
+        method = "exact"
+
+    if data.dtype.kind in "biu":
+        if data.dtype.itemsize <= 2:
+            # Small integers are counted over the whole range of the dtype, without a min/max pass
+            lower = 0 if data.dtype.kind == "b" else int(np.iinfo(data.dtype).min)
+            size = 2 if data.dtype.kind == "b" else 1 << (8 * data.dtype.itemsize)
+        else:
+            lower, upper, _ = _min_max(data, mask)
+            lower, size = int(lower), int(upper) - int(lower) + 1
+        if size <= (_COUNTING_RANGE if method == "exact" else max(bins, 1 << 16)):
+            counts = _count(data, mask, lower, size)
+            return PercentileEstimate(_counted_percentiles(counts, lower, q), 0.0, 0.0)
+
+    if method == "exact" and not _is_streamed(data):
+        values = data if mask is None else data[mask]
+        if values.size == 0:
+            raise ValueError("The mask does not select any voxels")
+        return PercentileEstimate(np.percentile(values, q), 0.0, 0.0)
+
+    lower, upper, count = _min_max(data, mask)
+    lower, upper = float(lower), float(upper)
+    if lower == upper:
+        return PercentileEstimate(np.full(q.shape, lower), 0.0, 0.0)
+    if method == "exact":
+        return PercentileEstimate(_refined_percentiles(data, mask, q, count, lower, upper, bins), 0.0, 0.0)
+
+    counts = _histogram(data, mask, lower, upper, bins)
+    width = (upper - lower) / bins
+    return PercentileEstimate(_binned_percentiles(counts, lower, width, q), width, 0.0)
+
+
+def _as_array(data: np.ndarray | RadImage) -> np.ndarray | SliceProvider:
+    """
+    Return the image data of a RadImage, without duplicating a shared buffer or reading a lazily
+    loaded image in full, or data as an array.
+
+    :param data: The image data, or a RadImage
+    """
+    if isinstance(data, RadImage):
+        if data.slice_provider is not None:
+            return data.slice_provider
+        image_data = data.get_image_data(readonly=True)
+        if image_data is None:
+            raise ValueError("Image data not loaded")
+        return image_data
+    if isinstance(data, SliceProvider):
+        return data
+    return np.asarray(data)
+
+
+def _as_mask(mask: np.ndarray | RadImage, shape: tuple) -> np.ndarray | SliceProvider:
+    """
+    Return a mask as a boolean array of the given shape, or as is if streamed.
+
+    :param mask: The mask, or a RadImage
+    :param shape: The shape of the image data
+    """
+    mask = _as_array(mask)
+    if _is_streamed(mask):
+        if tuple(mask.shape) != tuple(shape):
+            raise ValueError(f"Mask has shape {mask.shape}, expected {shape}")
+        return mask
+    return np.broadcast_to(mask.astype(bool, copy=False), shape)
+
+
+def _is_streamed(data: np.ndarray | SliceProvider) -> bool:
+    """
+    Return whether data is read from disk as it is accessed, so should be read in blocks.
+
+    :param data: The image data
+    """
+    return isinstance(data, (np.memmap, SliceProvider))
+
+
+def _blocks(data: np.ndarray | SliceProvider, mask: Optional[np.ndarray | SliceProvider]):
+    """
+    Yield the selected values of data a block of slices along axis 0 at a time, so that streaming
+    passes only hold one block of temporaries, and memory-mapped data is read in order.
+
+    :param data: The image data
+    :param mask: A mask of the shape of data, or None
+    """
+    if len(data.shape) == 0:
+        data = np.reshape(data, 1)
+        mask = None if mask is None else np.reshape(mask, 1)
+    rows = max(1, _BLOCK_VOXELS // max(1, int(np.prod(data.shape[1:], dtype=np.int64))))
+    for row in range(0, data.shape[0], rows):
+        block = np.asarray(data[row:row + rows])
+        if mask is not None:
+            block = block[np.asarray(mask[row:row + rows]).astype(bool, copy=False)]
+        yield block.reshape(-1)
+
+
+def _count_selected(data: np.ndarray | SliceProvider, mask: Optional[np.ndarray | SliceProvider]) -> int:
+    """
+    Return the number of voxels selected by the mask.
+
+    :param data: The image data
+    :param mask: The mask selecting the values, or None
+
+    :raises ValueError: If the mask does not select any voxels.
+    """
+    if mask is None:
+        count = int(np.prod(data.shape, dtype=np.int64))
+    elif _is_streamed(mask):
+        count = sum(int(np.count_nonzero(block)) for block in _blocks(mask, None))
+    else:
+        count = int(np.count_nonzero(mask))
+    if count == 0:
+        raise ValueError("The mask does not select any voxels")
+    return count
+
+
+def _min_max(data: np.ndarray | SliceProvider, mask: Optional[np.ndarray | SliceProvider]) -> tuple:
+    """
+    Return the minimum, maximum and number of the selected values.
+
+    :param data: The image data
+    :param mask: The mask selecting the values, or None
+
+    :raises ValueError: If the mask does not select any voxels.
+    """
+    if mask is None and not _is_streamed(data):
+        return data.min(), data.max(), data.size
+    blocks = [(block.min(), block.max(), block.size) for block in _blocks(data, mask) if block.size]
+    if not blocks:
+        raise ValueError("The mask does not select any voxels")
+    return min(block[0] for block in blocks), max(block[1] for block in blocks), sum(block[2] for block in blocks)
+
+
+def _count(data: np.ndarray, mask: Optional[np.ndarray], lower: int, size: int) -> np.ndarray:
+    """
+    Count the occurrences of every integer value between lower and lower + size - 1.
+
+    :param data: The integer image data
+    :param mask: The mask selecting the values, or None
+    :param lower: The smallest value
+    :param size: The number of values
+    """
+    counts = np.zeros(size, dtype=np.int64)
+    for block in _blocks(data, mask):
+        counts += np.bincount(np.subtract(block, lower, dtype=np.intp), minlength=size)
+    return counts
+
+
+def _histogram(data: np.ndarray, mask: Optional[np.ndarray], lower: float, upper: float,
+               bins: int) -> np.ndarray:
+    """
+    Count the selected values in equal-width bins between lower and upper.
+
+    :param data: The image data
+    :param mask: The mask selecting the values, or None
+    :param lower: The lower edge of the first bin
+    :param upper: The upper edge of the last bin
+    :param bins: The number of bins
+    """
+    counts = np.zeros(bins, dtype=np.int64)
+    scale = bins / (upper - lower)
+    for block in _blocks(data, mask):
+        index = np.subtract(block, lower, dtype=np.float64)
+        index *= scale
+        index = index.astype(np.intp)
+        # The maximum falls on the upper edge of the last bin
+        np.minimum(index, bins - 1, out=index)
+        counts += np.bincount(index, minlength=bins)
+    return counts
+
+
+def _virtual_ranks(n: int, q: np.ndarray) -> tuple:
+    """
+    Return the ranks of the values interpolated between for each percentile, and the
+    interpolation weights, as np.percentile computes them for its default linear method.
+
+    :param n: The number of values
+    :param q: The percentiles
+    """
+    if n == 0:
+        raise ValueError("The mask does not select any voxels")
+    virtual = (n - 1) * (q / 100)
+    previous = np.floor(virtual)
+    weights = virtual - previous
+    previous = np.clip(previous, 0, n - 1).astype(np.int64)
+    following = np.clip(previous + 1, 0, n - 1)
+    return previous, following, weights
+
+
+def _lerp(a: np.ndarray, b: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """
+    Interpolate linearly between a and b the way np.percentile does, for identical results.
+    """
+    difference = np.subtract(b, a)
+    result = np.add(a, difference * t)
+    np.subtract(b, difference * (1 - t), out=result, where=t >= 0.5)
+    return result
+
+
+def _counted_percentiles(counts: np.ndarray, lower: int, q: np.ndarray) -> np.ndarray:
+    """
+    Return the exact percentiles of integer values from their counts.
+
+    :param counts: The number of occurrences of each value, starting at lower
+    :param lower: The value counted first
+    :param q: The percentiles
+    """
+    cumulative = np.cumsum(counts)
+    previous, following, weights = _virtual_ranks(int(cumulative[-1]), q)
+    a = (lower + np.searchsorted(cumulative, previous, side="right")).astype(np.float64)
+    b = (lower + np.searchsorted(cumulative, following, side="right")).astype(np.float64)
+    return _lerp(a, b, weights)
+
+
+def _binned_percentiles(counts: np.ndarray, lower: float, width: float, q: np.ndarray) -> np.ndarray:
+    """
+    Return percentiles estimated from a histogram, spreading the values of each bin evenly over it.
+    Each estimate lies in the bin of the exact value, so is within one bin width of it.
+
+    :param counts: The histogram
+    :param lower: The lower edge of the first bin
+    :param width: The width of the bins
+    :param q: The percentiles
+    """
+    cumulative = np.cumsum(counts)
+    before = cumulative - counts
+
+    def value(rank: np.ndarray) -> np.ndarray:
+        bin_index = np.searchsorted(cumulative, rank, side="right")
+        position = (rank - before[bin_index] + 0.5) / counts[bin_index]
+        return lower + (bin_index + position) * width
+
+    previous, following, weights = _virtual_ranks(int(cumulative[-1]), q)
+    return _lerp(value(previous), value(following), weights)
+
+
+def _refined_percentiles(data: np.ndarray | SliceProvider, mask: Optional[np.ndarray | SliceProvider],
+                         q: np.ndarray, count: int, lower: float, upper: float, bins: int) -> np.ndarray:
+    """
+    Return exact percentiles of streamed data. Every pass histograms the values in the interval
+    known to hold each rank and narrows the interval to the bin holding it, until the interval
+    holds few enough values to gather and select from, or only equal values.
+
+    :param data: The image data
+    :param mask: The mask selecting the values, or None
+    :param q: The percentiles
+    :param count: The number of selected values
+    :param lower: The minimum of the selected values
+    :param upper: The maximum of the selected values
+    :param bins: The number of bins of each pass
+    """
+    previous, following, weights = _virtual_ranks(count, q)
+
+    # Each rank is searched in a half-open interval [low, high), with `below` smaller values
+    searches = {int(rank): [lower, np.nextafter(upper, np.inf), 0, count]
+                for rank in np.union1d(previous, following)}
+    found: dict[int, float] = {}
+    while searches:
+        gather = {rank for rank, (_, _, _, inside) in searches.items() if inside <= _GATHER_VALUES}
+        histograms = {rank: np.zeros(bins, dtype=np.int64) for rank in searches if rank not in gather}
+        edges = {rank: np.linspace(low, high, bins + 1) for rank, (low, high, _, _) in searches.items()}
+        gathered = {rank: [] for rank in gather}
+        extremes = {rank: [np.inf, -np.inf] for rank in histograms}
+
+        for block in _blocks(data, mask):
+            for rank, (low, high, _, _) in searches.items():
+                values = block[(block >= low) & (block < high)]
+                if rank in gather:
+                    gathered[rank].append(values)
+                elif values.size:
+                    bin_index = np.searchsorted(edges[rank], values, side="right") - 1
+                    histograms[rank] += np.bincount(bin_index, minlength=bins)[:bins]
+                    extremes[rank] = [min(extremes[rank][0], values.min()), max(extremes[rank][1], values.max())]
+
+        for rank in list(searches):
+            low, high, below, inside = searches[rank]
+            if rank in gather:
+                values = np.concatenate(gathered.pop(rank))
+                found[rank] = np.partition(values, rank - below)[rank - below]
+            elif extremes[rank][0] == extremes[rank][1]:
+                # Only equal values are left in the interval
+                found[rank] = extremes[rank][0]
+            else:
+                counts = histograms[rank]
+                cumulative = np.cumsum(counts)
+                bin_index = int(np.searchsorted(cumulative, rank - below, side="right"))
+                searches[rank] = [edges[rank][bin_index], edges[rank][bin_index + 1],
+                                  below + int(cumulative[bin_index] - counts[bin_index]), int(counts[bin_index])]
+                continue
+            del searches[rank]
+
+    a = np.array([found[int(rank)] for rank in previous], dtype=data.dtype)
+    b = np.array([found[int(rank)] for rank in following], dtype=data.dtype)
+    return _lerp(a, b, weights)
+
+
+def _sample(data: np.ndarray | SliceProvider, mask: Optional[np.ndarray | SliceProvider], count: int,
+            sample_size: int, seed: Optional[int]) -> np.ndarray:
+    """
+    Draw voxels uniformly at random, with replacement, from those selected by the mask.
+
+    :param data: The image data
+    :param mask: The mask selecting the voxels, or None
+    :param count: The number of voxels selected by the mask
+    :param sample_size: The number of voxels to draw
+    :param seed: The seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    if _is_streamed(data) or _is_streamed(mask):
+        # Split the draws between blocks (a multinomial draw, one block at a time) and draw
+        # within each block as it is read
+        samples = []
+        for block in _blocks(data, mask):
+            if block.size == 0:
+                continue
+            draws = rng.binomial(sample_size, block.size / count) if count > block.size else sample_size
+            samples.append(block[rng.integers(0, block.size, draws)])
+            sample_size, count = sample_size - draws, count - block.size
+        return np.concatenate(samples)
+
+    flat_data = data.reshape(-1)
+    if mask is None:
+        return flat_data[np.sort(rng.integers(0, data.size, sample_size))]
+
+    # Rejection sampling: draw from the whole volume and keep the voxels inside the mask
+    flat_mask = mask.reshape(-1)
+    samples, drawn = [], 0
+    while drawn < sample_size:
+        draws = int((sample_size - drawn) * data.size / count * 1.1) + 16
+        indices = np.sort(rng.integers(0, data.size, draws))
+        indices = indices[flat_mask[indices]][:sample_size - drawn]
+        samples.append(flat_data[indices])
+        drawn += indices.size
+    return np.concatenate(samples)
@@ -0,0 +1,422 @@
+"""
+Fused processing pipelines.
+
+A Pipeline chains the functions of radvis.processing.image and runs them in as few passes over
+the image data as possible, with a single output buffer. Consecutive elementwise stages
+(percentile_clipping, normalization and apply_mask) are fused: the image is processed in slabs
+along axis 0 that fit in cache, and every slab goes through all of them before it is written,
+once, into the output buffer. add_padding has the fused stages write straight into the center of
+the padded buffer. noise_reduction and any other function need the whole volume at once, and
+split the pipeline into separate passes.
+
+Example:
+    pipeline = (Pipeline()
+                .add(percentile_clipping, 0.5, 99.5)
+                .add(normalization, 0, 1)
+                .add(apply_mask, mask)
+                .add(add_padding, (256, 256, 256)))
+    for image in load_images(file_paths):
+        result = pipeline.run(image)
+        print(pipeline.report)
+"""
+import inspect
+import time
+import tracemalloc
+from typing import Callable, NamedTuple, Optional
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented, nbytes
+from radvis.image.dtype_policy import narrowest_float_dtype
+from .image import normalization, noise_reduction, percentile_clipping, add_padding, apply_mask
+from .masks import SparseMask
+from .percentiles import compute_percentiles
+from .filters import parallel_gaussian_filter
+
+# The stages the pipeline knows how to fuse, by processing function
+_STAGE_KINDS = {
+    percentile_clipping: "clip",
+    normalization: "normalize",
+    apply_mask: "mask",
+    add_padding: "pad",
+    noise_reduction: "filter",
+}
+_ELEMENTWISE = ("clip", "normalize", "mask")
+
+
+class StageReport(NamedTuple):
+    """ The time spent in one stage of a pipeline run """
+    name: str
+    seconds: float
+    pass_index: int
+
+
+class PipelineReport(NamedTuple):
+    """ Per-stage times, number of passes over the data and peak memory of a pipeline run """
+    stages: list[StageReport]
+    seconds: float
+    passes: int
+    peak_bytes: Optional[int]
+
+    def __str__(self) -> str:
+        lines = [f"{'stage':<24}{'pass':>6}{'ms':>12}"]
+        for stage in self.stages:
+            lines.append(f"{stage.name:<24}{stage.pass_index:>6}{stage.seconds * 1000:>12.2f}")
+        lines.append(f"{'total':<24}{self.passes:>6}{self.seconds * 1000:>12.2f}")
+        if self.peak_bytes is not None:
+            lines.append(f"peak memory: {self.peak_bytes / 1024 ** 2:.1f} MiB")
+        return "\n".join(lines)
+
+
+class _Stage:
+    """ A processing function with its bound arguments """
+
+    def __init__(self, function: Callable, args: tuple, kwargs: dict):
+        self.function = function
+        self.name = getattr(function, "__name__", repr(function))
+        self.kind = _STAGE_KINDS.get(function, "call")
+        self.args = args
+        self.kwargs = kwargs
+
+        if self.kind != "call":
+            # Bind once, so that bad arguments fail when the pipeline is built rather than run
+            bound = inspect.signature(function).bind(None, *args, **kwargs)
+            bound.apply_defaults()
+            self.params = bound.arguments
+            if self.params["inplace"] or self.params["out"] is not None:
+                raise ValueError(f"{self.name}: the pipeline manages the output buffers, "
+                                 f"inplace and out cannot be set per stage")
+
+
+class Pipeline:
+    def __init__(self, slab_bytes: int = 8 * 1024 * 1024):
+        """
+        Initialize the Pipeline class.
+
+        :param slab_bytes: The approximate size of the slabs that fused stages process at a time,
+            defaults to 8 MiB. Slabs span whole slices along axis 0.
+        """
+        if slab_bytes <= 0:
+            raise ValueError(f"slab_bytes must be positive, got {slab_bytes}")
+        self.slab_bytes = slab_bytes
+        self.stages: list[_Stage] = []
+        self.report: Optional[PipelineReport] = None
+
+    def add(self, function: Callable, *args, **kwargs) -> 'Pipeline':
+        """
+        Append a stage to the pipeline. The stage is called as function(rad_image, *args, **kwargs).
+        The functions of radvis.processing.image are fused where possible; any other function
+        taking and returning a RadImage runs on its own.
+
+        :param function: The processing function
+        :param args: Positional arguments following the image
+        :param kwargs: Keyword arguments
+        :return: The pipeline itself, so that calls can be chained
+        """
+        if not callable(function):
+            raise ValueError(f"Pipeline stages must be callable, got {function!r}")
+        self.stages.append(_Stage(function, args, kwargs))
+        return self
+
+    @property
+    def passes(self) -> list[tuple[str, ...]]:
+        """
+        Return the planned passes over the image data, as tuples of the names of the stages
+        that each pass runs.
+        """
+        passes, current = [], []
+        for stage in self.stages:
+            if stage.kind == "clip" and current:
+                # Percentiles are computed on the result of the stages before
+                passes.append(tuple(current))
+                current = []
+            if stage.kind in _ELEMENTWISE or stage.kind == "pad":
+                current.append(stage.name)
+                if stage.kind == "pad":
+                    passes.append(tuple(current))
+                    current = []
+            else:
+                if current:
+                    passes.append(tuple(current))
+                passes.append((stage.name,))
+                current = []
+        if current:
+            passes.append(tuple(current))
+        return passes
+
+    @instrumented("processing", name="Pipeline.run", bytes_read=lambda self, rad_image, *args, **kwargs: nbytes(rad_image))
+    def run(self, rad_image: RadImage, inplace: bool = False, trace_memory: bool = True) -> RadImage:
+        """
+        Run the pipeline on a RadImage. Lazily loaded images are read slab by slab, unless a
+        stage needs the whole volume. The time spent in each stage, the number of passes over
+        the data and the peak memory allocated are stored in the report attribute.
+
+        :param rad_image: The RadImage object to be processed.
+        :param inplace: Whether to modify and return rad_image instead of a copy. Its buffer is
+            reused for the result when it is private and of the result's dtype.
+        :param trace_memory: Whether to measure the peak memory with tracemalloc, defaults to True.
+            The peak of a trace already running is reset.
+
+        :return: The processed RadImage object, with the same result as calling the stages in turn.
+
+        :raises ValueError: If image data is not loaded.
+        """
+        if rad_image.is_loaded and rad_image._image_data is None:
+            raise ValueError("Image data not loaded")
+
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        try:
+            start = time.perf_counter()
+            run = _PipelineRun(self, rad_image, inplace)
+            data = run.execute()
+            seconds = time.perf_counter() - start
+            peak_bytes = tracemalloc.get_traced_memory()[1] - baseline if trace_memory else None
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        self.report = PipelineReport(
+            stages=[StageReport(stage.name, run.seconds[i], run.pass_of[i]) for i, stage in enumerate(self.stages)],
+            seconds=seconds,
+            passes=run.passes,
+            peak_bytes=peak_bytes,
+        )
+
+        new_rad_image = rad_image if inplace else rad_image.copy()
+        if data is not None:
+            new_rad_image.image_data = data
+        new_rad_image.crop_offset, new_rad_image.original_shape = run.crop_offset, run.original_shape
+        return new_rad_image
+
+    def __repr__(self) -> str:
+        return f"Pipeline({' | '.join(' -> '.join(names) for names in self.passes)})"
+
+
+class _PipelineRun:
+    """ The state of one run of a pipeline: the current data and the fused stages not yet applied """
+
+    def __init__(self, pipeline: Pipeline, rad_image: RadImage, inplace: bool):
+        self.pipeline = pipeline
+        self.rad_image = rad_image
+        self.inplace = inplace
+        # The data to process: the input image until the first pass writes an array of our own
+        self.current: RadImage | np.ndarray = rad_image
+        self.owned = False
+        self.shape = tuple(rad_image.shape)
+        self.dtype = np.dtype(rad_image.dtype)
+        # Where the current data lies in the uncropped image, see radvis.processing.crop
+        self.crop_offset, self.original_shape = rad_image.crop_offset, rad_image.original_shape
+        # Elementwise operations waiting to be fused into the next pass, as (stage index, operation)
+        self.pending: list[tuple[int, Callable]] = []
+        self.pending_dtype = self.dtype
+        self.passes = 0
+        self.pass_of = [0] * len(pipeline.stages)
+        self.seconds = [0.0] * len(pipeline.stages)
+        self.fused_seconds = 0.0
+
+    def execute(self) -> Optional[np.ndarray]:
+        """
+        Run every stage and return the resulting array, or None if there are no stages.
+        """
+        for index, stage in enumerate(self.pipeline.stages):
+            start, fused = time.perf_counter(), self.fused_seconds
+            getattr(self, f"_{stage.kind}")(index, stage)
+            # Time spent running fused operations is counted against their own stages
+            self.seconds[index] += time.perf_counter() - start - (self.fused_seconds - fused)
+        self._flush()
+        return None if self.current is self.rad_image else self.current
+
+    def _read(self, key) -> np.ndarray:
+        """
+        Read part of the current data, through the slice provider for a lazily loaded input image.
+
+        :param key: Any index accepted by NumPy arrays
+        """
+        if isinstance(self.current, RadImage):
+            return self.current._read(key)
+        return self.current[key]
+
+    def _whole(self) -> np.ndarray:
+        """
+        Return the whole current data, loading the input image in full if needed.
+        """
+        if isinstance(self.current, RadImage):
+            return self.current.get_image_data(readonly=True)
+        return self.current
+
+    def _queue(self, index: int, operation: Callable, dtype: np.dtype) -> None:
+        """
+        Add an elementwise operation to the next pass.
+
+        :param index: The index of the stage
+        :param operation: A function (source slab, destination slab, slab key) writing its result
+            into the destination slab. The source may be the destination itself.
+        :param dtype: The dtype of the result of the operation
+        """
+        self.pass_of[index] = self.passes + 1
+        self.pending.append((index, operation))
+        self.pending_dtype = dtype
+
+    def _flush(self, destination: Optional[np.ndarray] = None) -> None:
+        """
+        Run the pending elementwise operations in one pass, slab by slab.
+
+        :param destination: The array to write into, defaults to the current data when it is our own
+            array of the right dtype, the input buffer when running in place, or a new array
+        """
+        if not self.pending:
+            return
+
+        dtype = self.pending_dtype
+        if destination is None:
+            destination = self._reusable_buffer(dtype)
+        if destination is None:
+            destination = np.empty(self.shape, dtype=dtype)
+
+        row_bytes = max(1, int(np.prod(self.shape[1:], dtype=np.int64)) * max(dtype.itemsize, self.dtype.itemsize))
+        rows = max(1, self.pipeline.slab_bytes // row_bytes)
+        for row in range(0, self.shape[0], rows):
+            key = slice(row, row + rows)
+            start = time.perf_counter()
+            target = destination[key]
+            # Reading the slab is counted against the first stage
+            source = self._read(key)
+            for index, operation in self.pending:
+                operation(source, target, key)
+                source, end = target, time.perf_counter()
+                self.seconds[index] += end - start
+                self.fused_seconds += end - start
+                start = end
+
+        self.current, self.owned, self.dtype = destination, True, dtype
+        self.pending = []
+        self.passes += 1
+
+    def _reusable_buffer(self, dtype: np.dtype) -> Optional[np.ndarray]:
+        """
+        Return an existing buffer the next pass can overwrite, or None to allocate one.
+
+        :param dtype: The dtype of the result of the pass
+        """
+        if self.owned and self.current.dtype == dtype:
+            return self.current
+        image = self.rad_image
+        if self.current is image and self.inplace and image.is_loaded and not image.shares_image_data:
+            buffer = image._image_data
+            if buffer.dtype == dtype and buffer.flags.writeable:
+                return buffer
+        return None
+
+    def _clip(self, index: int, stage: _Stage) -> None:
+        # Percentiles are taken on the result of the stages before, so those run first
+        self._flush()
+        params = stage.params
+        lower, upper = compute_percentiles(self._whole(), [params["lower_percentile"], params["upper_percentile"]],
+                                           method=params["method"], mask=params["mask"]).values
+
+        # Keep integer dtypes when the bounds are whole numbers, as percentile_clipping does
+        dtype = self.pending_dtype
+        if not (float(lower).is_integer() and float(upper).is_integer()):
+            dtype = narrowest_float_dtype(dtype)
+        lower, upper = dtype.type(lower), dtype.type(upper)
+
+        def clip(source: np.ndarray, target: np.ndarray, key) -> None:
+            np.clip(source, lower, upper, out=target, casting="unsafe")
+
+        self._queue(index, clip, dtype)
+
+    def _normalize(self, index: int, stage: _Stage) -> None:
+        params = stage.params
+        min_val, scale = params["min_val"], params["max_val"] - params["min_val"]
+        dtype = narrowest_float_dtype(self.pending_dtype)
+
+        def normalize(source: np.ndarray, target: np.ndarray, key) -> None:
+            np.subtract(source, min_val, out=target, dtype=target.dtype, casting="unsafe")
+            np.divide(target, scale, out=target, casting="unsafe")
+
+        self._queue(index, normalize, dtype)
+
+    def _mask(self, index: int, stage: _Stage) -> None:
+        params = stage.params
+        mask, invert = params["mask"], params["invert"]
+        shape = self.shape
+        if params["crop"]:
+            raise ValueError("apply_mask: crop is not supported in a pipeline")
+        if isinstance(mask, (RadImage, SparseMask)):
+            if tuple(mask.shape) != shape:
+                raise ValueError(f"Mask has shape {mask.shape}, expected {shape}")
+            read_mask = mask._read if isinstance(mask, RadImage) else mask.__getitem__
+        else:
+            mask = np.broadcast_to(np.asarray(mask), shape)
+            read_mask = mask.__getitem__
+
+        def apply(source: np.ndarray, target: np.ndarray, key) -> None:
+            if source is not target:
+                np.copyto(target, source, casting="unsafe")
+            selected = np.asarray(read_mask(key)).astype(bool, copy=False)
+            np.copyto(target, 0, where=np.logical_not(selected) if invert else selected)
+
+        self._queue(index, apply, self.pending_dtype)
+
+    def _pad(self, index: int, stage: _Stage) -> None:
+        target_shape = tuple(stage.params["target_shape"])
+        if len(target_shape) != len(self.shape) or any(t < s for t, s in zip(target_shape, self.shape)):
+            raise ValueError(f"Cannot pad image data of shape {self.shape} to {target_shape}")
+
+        # The pending stages write straight into the center of the padded buffer
+        padding = np.subtract(target_shape, self.shape) // 2
+        padded = np.zeros(target_shape, dtype=self.pending_dtype)
+        center = padded[tuple(slice(before, before + size) for before, size in zip(padding, self.shape))]
+        if not self.pending:
+            self._queue(index, _copy, self.pending_dtype)
+        self.pass_of[index] = self.passes + 1
+        self._flush(destination=center)
+        self.current, self.shape = padded, target_shape
+        if self.crop_offset is not None:
+            self.crop_offset = tuple(int(o - before) for o, before in zip(self.crop_offset, padding))
+
+    def _filter(self, index: int, stage: _Stage) -> None:
+        # Imported here so that scipy is only loaded by processes that filter images
+        from scipy.ndimage import gaussian_filter
+
+        self._flush()
+        data = self._whole()
+        dtype = narrowest_float_dtype(data.dtype)
+        # The filter runs one axis at a time through a line buffer, so it can overwrite its input
+        output = data if self.owned and data.dtype == dtype else dtype
+        params = stage.params
+        if params["workers"] == 1 and not params["per_axis"]:
+            self.current = gaussian_filter(data, sigma=params["sigma"], output=output)
+        else:
+            output = np.empty(data.shape, dtype=dtype) if output is dtype else output
+            self.current = parallel_gaussian_filter(data, params["sigma"], output, workers=params["workers"],
+                                                    per_axis=params["per_axis"])
+        self.owned, self.dtype, self.pending_dtype = True, dtype, dtype
+        self.passes += 1
+        self.pass_of[index] = self.passes
+
+    def _call(self, index: int, stage: _Stage) -> None:
+        self._flush()
+        image = self.rad_image.copy()
+        if not isinstance(self.current, RadImage):
+            image.image_data = self.current
+        image.crop_offset, image.original_shape = self.crop_offset, self.original_shape
+        result = stage.function(image, *stage.args, **stage.kwargs)
+        self.current = result.image_data
+        self.crop_offset, self.original_shape = result.crop_offset, result.original_shape
+        self.owned = True
+        self.shape, self.dtype = tuple(self.current.shape), self.current.dtype
+        self.pending_dtype = self.dtype
+        self.passes += 1
+        self.pass_of[index] = self.passes
+
+
+def _copy(source: np.ndarray, target: np.ndarray, key) -> None:
+    """ Copy a slab, for padding without any fused stage before it """
+    if source is not target:
+        np.copyto(target, source, casting="unsafe")
@@ -0,0 +1,126 @@
+"""
+Resampling of images to a new voxel spacing or shape.
+
+The resampled grid starts at the same edge as the original one, its first voxel centre being
+half a new voxel from it. With a new shape both grids cover the same extent; with a new spacing
+the number of voxels is rounded, so the extent may change by a fraction of a voxel. The image's
+affine is updated to match, so resampled images stay aligned with the original in world coordinates.
+
+Nearest neighbour resampling (order=0), for label maps, gathers the nearest voxels directly and
+keeps the dtype of the image. Higher orders interpolate with scipy.ndimage.affine_transform,
+split along axis 0 of the output between threads, as scipy releases the GIL.
+
+Example:
+    image = load_image("ct.nii.gz")
+    image = resample(image, spacing=(1.0, 1.0, 1.0))
+    labels = resample(load_image("labels.nii.gz"), shape=image.shape, order=0)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Optional, Sequence
+import numpy as np
+from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented
+from radvis.image.dtype_policy import narrowest_float_dtype
+from radvis.image.geometry import scaled_affine
+
+
+@instrumented("processing")
+def resample(rad_image: RadImage, spacing: Optional[float | Sequence[float]] = None,
+             shape: Optional[Sequence[int]] = None, order: int = 1, inplace: bool = False,
+             out: Optional[np.ndarray] = None, workers: Optional[int] = 1, mode: str = "nearest") -> RadImage:
+    """
+    Resample a RadImage to a new voxel spacing or shape.
+
+    :param rad_image: The RadImage object to be resampled.
+    :param spacing: The new voxel spacing, for all axes or per axis, in the units of the image's
+        spacing (millimetres for NIfTI and DICOM images, voxels for images without an affine).
+    :param shape: The new shape. Exactly one of spacing and shape must be given.
+    :param order: The order of the spline interpolation, from 0 (nearest neighbour) to 5, defaults to 1.
+    :param inplace: Whether to modify and return rad_image instead of a copy.
+    :param out: An array to write the result into, with the new shape.
+    :param workers: The number of threads, defaults to 1. None uses one thread per CPU.
+    :param mode: How the image is extended past its edges, see scipy.ndimage.affine_transform.
+        Defaults to "nearest".
+
+    :return: The resampled RadImage object, with its affine updated. Nearest neighbour resampling
+        keeps the dtype of the image data, while interpolation promotes integer data to the
+        narrowest floating point dtype that holds it exactly. The crop_offset and original_shape of
+        a cropped image are cleared, as the new voxels do not line up with the original ones.
+
+    :raises ValueError: If image data is not loaded, or the spacing, shape or order is invalid.
+    """
+    if (spacing is None) == (shape is None):
+        raise ValueError("Exactly one of spacing and shape must be given")
+    if not 0 <= order <= 5:
+        raise ValueError(f"order must be between 0 and 5, got {order}")
+
+    image_data = rad_image.get_image_data(readonly=True)
+    if image_data is None:
+        raise ValueError("Image data not loaded")
+    old_shape = np.array(image_data.shape)
+    old_spacing = np.array(rad_image.spacing)
+
+    if spacing is not None:
+        spacing = np.broadcast_to(np.asarray(spacing, dtype=np.float64), old_shape.shape)
+        if np.any(spacing <= 0):
+            raise ValueError(f"spacing must be positive, got {tuple(spacing)}")
+        new_shape = np.maximum(1, np.round(old_shape * old_spacing / spacing)).astype(int)
+    else:
+        new_shape = np.array(shape, dtype=int)
+        if new_shape.shape != old_shape.shape or np.any(new_shape < 1):
+            raise ValueError(f"shape must have {len(old_shape)} positive sizes, got {tuple(shape)}")
+    new_shape = tuple(int(size) for size in new_shape)
+    # The size of a new voxel in original voxels
+    step = spacing / old_spacing if spacing is not None else old_shape / np.array(new_shape)
+
+    dtype = image_data.dtype if order == 0 else narrowest_float_dtype(image_data.dtype)
+    if out is None:
+        out = np.empty(new_shape, dtype=dtype)
+    elif out.shape != new_shape:
+        raise ValueError(f"Output array has shape {out.shape}, expected {new_shape}")
+
+    if order == 0:
+        # The nearest voxel of the output voxel centre (j + 0.5) * step - 0.5, rounding half up
+        indices = [np.minimum(np.floor((np.arange(size) + 0.5) * s).astype(np.intp), length - 1)
+                   for size, s, length in zip(new_shape, step, old_shape)]
+
+        def resample_rows(rows: slice) -> None:
+            out[rows] = image_data[np.ix_(indices[0][rows], *indices[1:])]
+    else:
+        from scipy.ndimage import affine_transform, spline_filter
+        source, pad = image_data, 0
+        if order > 1:
+            # The spline coefficients are computed once for the whole volume, so that each block
+            # interpolates from the same coefficients. As in affine_transform, modes without exact
+            # boundary conditions are emulated by padding the volume before filtering.
+            if mode in ("nearest", "grid-constant"):
+                pad = 12
+                source = np.pad(image_data, pad, mode="edge") if mode == "nearest" else np.pad(image_data, pad)
+            source = spline_filter(source, order=order, output=np.float64, mode=mode)
+
+        def resample_rows(rows: slice) -> None:
+            offset = (step - 1) / 2 + pad
+            offset[0] += rows.start * step[0]
+            affine_transform(source, step, offset=offset, output_shape=out[rows].shape, output=out[rows],
+                             order=order, mode=mode, prefilter=False)
+
+    workers = workers or os.cpu_count() or 1
+    length = new_shape[0]
+    # A few blocks per thread balance the load
+    rows = max(1, -(-length // (workers * 4))) if workers > 1 else length
+    blocks = [slice(start, min(length, start + rows)) for start in range(0, length, rows)]
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(resample_rows, blocks))
+    else:
+        for block in blocks:
+            resample_rows(block)
+
+    new_rad_image = rad_image if inplace else rad_image.copy()
+    new_rad_image.image_data = out
+    new_rad_image.crop_offset = None
+    new_rad_image.original_shape = None
+    if image_data.ndim <= 3:
+        new_rad_image.affine = scaled_affine(rad_image.affine, step)
+    return new_rad_image
@@ -1,4 +1,13 @@
-from .rad_slicer import RadSlicer
-from .rad_slicer_group import RadSlicerGroup
+from typing import TYPE_CHECKING
+from .._lazy import attach
 
-__all__ = ['RadSlicer', 'RadSlicerGroup']
\ No newline at end of file
+__all__ = ['RadSlicer', 'RadSlicerGroup']
+
+__getattr__, __dir__ = attach(__name__, {
+    'RadSlicer': '.rad_slicer',
+    'RadSlicerGroup': '.rad_slicer_group',
+})
+
+if TYPE_CHECKING:
+    from .rad_slicer import RadSlicer
+    from .rad_slicer_group import RadSlicerGroup
@@ -5,8 +5,10 @@ from matplotlib.colors import Colormap, ListedColormap
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider
 from radvis.image.rad_image import RadImage
+from radvis.instrumentation import instrumented, file_bytes
 import numpy as np
 import numpy.ma as ma
+from typing import Optional
 try:
     import IPython
     from ipywidgets import interact, IntSlider
@@ -17,7 +19,7 @@ except ImportError:
 class RadSlicer:
     def __init__(self, radimage: RadImage, axis: int = 0, title=None, cmap: str = "gray",
                  width:int=4, height:int=4, show_slider:bool = True, slider_height:float=0.05,
-                 slider_color:str='green', show_axis=True) -> None:
+                 slider_color:str='green', show_axis=True, vmin: float = None, vmax: float = None) -> None:
         """
         Initialize the RadSlicer class.
 
@@ -30,6 +32,8 @@ class RadSlicer:
         :param slider_height: The height of the slider, defaults to 0.03
         :param slider_color: The color of the slider, defaults to 'blue'
         :param show_axis: Whether or not to show the axis, defaults to True
+        :param vmin: The intensity displayed as the lowest color, defaults to the image minimum
+        :param vmax: The intensity displayed as the highest color, defaults to the image maximum
         """
         self.radimage = radimage
         self.axis = axis
@@ -47,6 +51,8 @@ class RadSlicer:
         self._slider_height = slider_height
         self._slider_color = slider_color
         self._show_axis = show_axis
+        self._vmin = vmin
+        self._vmax = vmax
         
     @property
     def title(self):
@@ -115,6 +121,7 @@ class RadSlicer:
         """
         self._slider_coords = [x, y, width, height]
     
+    @instrumented("render", name="RadSlicer.render_slice", bytes_read=lambda *args, **kwargs: 0)
     def _update_image(self, val:int) -> None:
         """
         Update the image plot with the selected slice.
@@ -123,11 +130,23 @@ class RadSlicer:
         """
         image_slice = int(val)
         self._image_plot.set_data(self.radimage.get_slice(image_slice, self.axis))
-        for plot, (mask, _, _) in zip(self._mask_plots, self._masks):
-            plot.set_data(mask[image_slice, :, :] if self.axis == 0 else
-                          mask[:, image_slice, :] if self.axis == 1 else
-                          mask[:, :, image_slice])
+        for plot, (mask, _, _, _) in zip(self._mask_plots, self._masks):
+            plot.set_data(self._get_mask_slice(mask, image_slice))
         self.fig.canvas.draw_idle()
+
+    def _get_mask_slice(self, mask: np.ndarray | RadImage, index: int) -> ma.MaskedArray:
+        """
+        Return a slice of a mask along the slicer's axis, with zero values masked out.
+        Masks given as RadImages are sliced through the RadImage, so only that slice is read.
+
+        :param mask: The mask to slice
+        :param index: The index of the slice
+        """
+        if isinstance(mask, RadImage):
+            mask_slice = mask.get_slice(index, self.axis)
+        else:
+            mask_slice = np.take(mask, index, axis=self.axis)
+        return ma.masked_where(mask_slice == 0, mask_slice)
     
     def _calculate_slider_position(self, ax: plt.Axes) -> tuple[float, float, float, float]:
         # Get the bounding box of the original axis
@@ -184,11 +203,17 @@ class RadSlicer:
         :param ax: The plt.Axes object to plot the image on
         :param initial_index: The initial slice index, defaults to 0
         """
+        vmin, vmax = self._vmin, self._vmax
+        if vmin is None or vmax is None:
+            image_min, image_max = _intensity_range(self.radimage)
+            vmin = image_min if vmin is None else vmin
+            vmax = image_max if vmax is None else vmax
+
         self._image_plot = ax.imshow(
             self.radimage.get_slice(initial_index, self.axis), 
             cmap=self._cmap,
-            vmin=self.radimage.image_data.min(),
-            vmax=self.radimage.image_data.max(),
+            vmin=vmin,
+            vmax=vmax,
             interpolation='none'
         )
 
@@ -197,12 +222,10 @@ class RadSlicer:
         else:
             ax.axis('off')
 
-        for mask, cmap, alpha in self._masks:
-            mask_plot = ax.imshow(mask[initial_index, :, :] if self.axis == 0 else
-                      mask[:, initial_index, :] if self.axis == 1 else
-                      mask[:, :, initial_index],
+        for mask, cmap, alpha, mask_max in self._masks:
+            mask_plot = ax.imshow(self._get_mask_slice(mask, initial_index),
                       cmap=cmap, interpolation='none', alpha=alpha,
-                      vmin=0, vmax=mask.max())
+                      vmin=0, vmax=mask_max)
             self._mask_plots.append(mask_plot)
 
 
@@ -229,20 +252,21 @@ class RadSlicer:
         if show_plot:
             plt.show()
 
-    def add_mask(self, mask: np.ndarray | RadImage, color: str | Colormap = 'red', alpha: float = 0.5):
+    def add_mask(self, mask: np.ndarray | RadImage, color: str | Colormap = 'red', alpha: float = 0.5,
+                 vmax: Optional[float] = None):
         """
         Adds a mask to the RadSlicer.
 
         :param mask: A 3D array that matches the shape of the radimage
         :param color: The color of the mask
         :param alpha: The opacity of the mask
+        :param vmax: The mask value shown with the last color of the colormap, defaults to None, using
+            the maximum of the mask. Lazily loaded masks are read a block at a time to find it, unless
+            it is given or their statistics are cached.
         """
         if not isinstance(mask, np.ndarray) and not isinstance(mask, RadImage):
             raise ValueError("Mask must be a numpy array or RadImage object")
         
-        if isinstance(mask, RadImage):
-            mask = mask.image_data
-        
         if mask.shape != self.radimage.shape:
             raise ValueError("Mask shape must match image shape")
         
@@ -256,10 +280,14 @@ class RadSlicer:
         else:
             raise ValueError("Color must be a string or a Colormap object")
         
-        mask = ma.masked_where(mask == 0, mask)
-        
-        self._masks.append((mask, cmap, alpha))
+        if vmax is None:
+            # The exact maximum, not an estimate from a few slices, so that no label saturates the colormap
+            vmax = float(mask.statistics.max) if isinstance(mask, RadImage) else float(mask.max())
+        # Zero values are masked out slice by slice when displayed
+        self._masks.append((mask, cmap, alpha, vmax))
     
+    @instrumented("render", name="RadSlicer.save_animation", bytes_read=lambda *args, **kwargs: 0,
+                  output=lambda result, self, filepath, *args, **kwargs: file_bytes(filepath))
     def save_animation(self, filepath: str, fps: int = 10) -> None:
         """
         Save an animation of all slices to a GIF file.
@@ -279,6 +307,8 @@ class RadSlicer:
         except Exception as e:
             print(f"Could not save the animation due to the following error: {e}")
 
+    @instrumented("render", name="RadSlicer.save_frame", bytes_read=lambda *args, **kwargs: 0,
+                  output=lambda result, self, filepath, *args, **kwargs: file_bytes(filepath))
     def save_frame(self, filepath: str, index: int = 0, dpi: int = 72) -> None:
         """
         Save a single frame of the RadSlicer plot to a PNG file.
@@ -300,4 +330,25 @@ class RadSlicer:
         Create a copy of the RadSlicer object.
         """
         return copy.deepcopy(self)
-    
\ No newline at end of file
+
+
+def _intensity_range(image: np.ndarray | RadImage, samples: int = 8) -> tuple[float, float]:
+    """
+    Return the minimum and maximum intensity of an image for scaling the display.
+    RadImages use their cached statistics, computed in full for images held in memory.
+    Images backed by a slice provider whose range is not known yet are estimated from evenly
+    spaced slices, so that display starts without reading the volume.
+
+    :param image: The image or mask
+    :param samples: The number of slices sampled from images that are not loaded, defaults to 8
+    """
+    if isinstance(image, RadImage) and (image.is_loaded or image.statistics.is_cached("min")
+                                        and image.statistics.is_cached("max")):
+        return float(image.statistics.min), float(image.statistics.max)
+
+    if isinstance(image, RadImage):
+        count = image.shape[0]
+        indices = np.unique(np.linspace(0, count - 1, min(samples, count)).astype(int))
+        sampled = [image.get_slice(int(index), 0) for index in indices]
+        return min(float(s.min()) for s in sampled), max(float(s.max()) for s in sampled)
+    return float(image.min()), float(image.max())
@@ -0,0 +1,82 @@
+import os
+from radvis.image.chunked_store import ChunkedVolumeReader, ChunkedVolumeWriter, write_chunked
+from radvis.image.instantiate import load_image, from_numpy
+from radvis.image.rad_chunked_image import RadChunkedImage
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def volume():
+    return np.random.default_rng(0).integers(-1000, 3000, size=(13, 10, 7)).astype(np.int16)
+
+
+@pytest.fixture
+def chunked_path(tmp_path, volume):
+    file_path = str(tmp_path / "volume.rvc")
+    write_chunked(file_path, volume, chunks=(4, 3, 5), metadata={"subject": "a"})
+    return file_path
+
+
+def test_round_trip(chunked_path, volume):
+    reader = ChunkedVolumeReader(chunked_path)
+    assert reader.shape == volume.shape
+    assert reader.dtype == volume.dtype
+    assert reader.metadata == {"subject": "a"}
+    assert np.array_equal(np.asarray(reader), volume)
+
+
+@pytest.mark.parametrize("key", [
+    (5,), (slice(None), 4), (Ellipsis, 6), (slice(2, 11, 3), slice(1, 9), -1),
+    (slice(None, None, -1),), (np.array([0, 3]),), (slice(20, 30),),
+])
+def test_region_reads(chunked_path, volume, key):
+    assert np.array_equal(ChunkedVolumeReader(chunked_path)[key], volume[key])
+
+
+def test_slice_reads_only_crossed_chunks(chunked_path, volume):
+    reader = ChunkedVolumeReader(chunked_path)
+    assert np.array_equal(reader[:, :, 2], volume[:, :, 2])
+    # 4 x 4 chunks cross the slice along axis 2, out of 4 x 4 x 2 chunks in total
+    assert len(reader._cache) == 16
+
+
+def test_slab_writer_with_uneven_slabs(tmp_path, volume):
+    file_path = str(tmp_path / "volume.rvc")
+    with ChunkedVolumeWriter(file_path, volume.shape, volume.dtype, chunks=(4, 4, 4), compression_level=0) as writer:
+        for start, stop in [(0, 1), (1, 6), (6, 13)]:
+            writer.write_slab(volume[start:stop])
+    assert np.array_equal(ChunkedVolumeReader(file_path)[...], volume)
+
+
+def test_rad_chunked_image(chunked_path, volume, tmp_path):
+    image = load_image(chunked_path, lazy=True)
+    assert isinstance(image, RadChunkedImage)
+    assert not image.is_loaded
+    assert np.array_equal(image.get_slice(3, axis=1), volume[:, 3, :])
+
+    output_path = str(tmp_path / "copy.rvc")
+    image.save(output_path)
+    assert not image.is_loaded
+    assert np.array_equal(load_image(output_path).image_data, volume)
+
+
+def test_write_rad_image(tmp_path, volume):
+    file_path = str(tmp_path / "image.rvc")
+    write_chunked(file_path, from_numpy(volume))
+    assert np.array_equal(RadChunkedImage(file_path).image_data, volume)
+
+
+def test_incomplete_volume_is_not_written(tmp_path, volume):
+    file_path = str(tmp_path / "volume.rvc")
+    with pytest.raises(RuntimeError):
+        with ChunkedVolumeWriter(file_path, volume.shape, volume.dtype, chunks=(4, 4, 4)) as writer:
+            writer.write_slab(volume[:6])
+            raise RuntimeError("Processing failed")
+    assert not os.path.exists(file_path)
+
+    writer = ChunkedVolumeWriter(file_path, volume.shape, volume.dtype, chunks=(4, 4, 4))
+    writer.write_slab(volume[:6])
+    with pytest.raises(ValueError):
+        writer.close()
+    assert not os.path.exists(file_path)
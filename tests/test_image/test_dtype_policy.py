@@ -0,0 +1,31 @@
+from radvis.image.dtype_policy import apply_dtype_policy, narrowest_float_dtype, narrowest_integer_dtype
+import numpy as np
+import pytest
+
+
+def test_native_policy_keeps_dtype():
+    image_data = np.zeros((2, 2), dtype=np.int16)
+    assert apply_dtype_policy(image_data, "native") is image_data
+
+
+def test_downcast_policy():
+    assert apply_dtype_policy(np.array([0, 1, 4], dtype=np.int64), "downcast").dtype == np.uint8
+    assert apply_dtype_policy(np.array([-1000, 3000], dtype=np.int32), "downcast").dtype == np.int16
+    assert apply_dtype_policy(np.array([0.5]), "downcast").dtype == np.float32
+
+
+def test_explicit_dtype_policy():
+    assert apply_dtype_policy(np.array([1, 2], dtype=np.uint8), np.float32).dtype == np.float32
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        apply_dtype_policy(np.zeros(2), "smallest")
+
+
+def test_narrowest_dtypes():
+    assert narrowest_integer_dtype(0, 255) == np.uint8
+    assert narrowest_integer_dtype(-1, 255) == np.int16
+    assert narrowest_float_dtype(np.uint8) == np.float32
+    assert narrowest_float_dtype(np.int32) == np.float64
+    assert narrowest_float_dtype(np.float16) == np.float16
@@ -0,0 +1,77 @@
+from radvis.image.instantiate import load_image, enable_cache, disable_cache, clear_cache, cache_info
+import numpy as np
+import os
+import pytest
+
+
+@pytest.fixture
+def cache():
+    enable_cache(max_bytes=1000)
+    clear_cache(reset_counters=True)
+    yield
+    disable_cache()
+
+
+def save_image(tmp_path, name: str, size: int) -> str:
+    file_path = str(tmp_path / name)
+    np.save(file_path, np.zeros(size, dtype=np.uint8))
+    return file_path
+
+
+def test_cache_hits_return_copies(cache, tmp_path):
+    file_path = save_image(tmp_path, "image.npy", 100)
+    first = load_image(file_path)
+    second = load_image(file_path)
+
+    assert cache_info().hits == 1
+    assert cache_info().misses == 1
+    assert first is not second
+
+    first.image_data[0] = 1
+    assert load_image(file_path).image_data[0] == 0
+
+
+def test_cache_eviction(cache, tmp_path):
+    file_paths = [save_image(tmp_path, f"image_{index}.npy", 400) for index in range(3)]
+    for file_path in file_paths:
+        load_image(file_path)
+
+    info = cache_info()
+    assert info.evictions == 1
+    assert info.entries == 2
+    assert info.current_bytes == 800
+
+    load_image(file_paths[0])
+    assert cache_info().misses == 4
+
+
+def test_modified_file_is_reloaded(cache, tmp_path):
+    file_path = save_image(tmp_path, "image.npy", 100)
+    load_image(file_path)
+    np.save(file_path, np.ones(100, dtype=np.uint8))
+    os.utime(file_path, ns=(0, 10 ** 9))
+
+    assert load_image(file_path).image_data[0] == 1
+    assert cache_info().hits == 0
+
+
+def test_cache_disabled_by_default(tmp_path):
+    file_path = save_image(tmp_path, "image.npy", 100)
+    load_image(file_path)
+    assert cache_info().entries == 0
+
+
+def test_memory_mapped_writes_reach_file(cache, tmp_path):
+    file_path = save_image(tmp_path, "image.npy", 100)
+    image = load_image(file_path, mmap_mode="r+")
+    image.image_data[0] = 7
+    image.image_data.flush()
+    assert np.load(file_path)[0] == 7
+    assert cache_info().misses == 0
+
+    # Copies of a memory-mapped image map the same file
+    image_copy = image.copy()
+    assert image_copy.image_data is image.image_data
+    image_copy.image_data[1] = 8
+    image_copy.image_data.flush()
+    assert np.load(file_path)[1] == 8
@@ -1,9 +1,10 @@
-from radvis.image.instantiate import load_image, from_numpy
+from radvis.image.instantiate import load_image, load_images, from_numpy
 from radvis.image.rad_image import RadImage
 from radvis.image.rad_dicom_image import RadDicomImage
 from radvis.image.rad_nifti_image import RadNiftiImage
 from radvis.image.rad_numpy_image import RadNumpyImage
 import numpy as np
+import pickle
 import pytest
 
 
@@ -19,4 +20,67 @@ def test_from_numpy():
     image_data = np.zeros((10, 10))
     image = from_numpy(image_data)
     assert isinstance(image, RadNumpyImage)
-    assert np.array_equal(image.get_image_data(), image_data)
\ No newline at end of file
+    assert np.array_equal(image.get_image_data(), image_data)
+
+def test_copy_does_not_reload(tmp_path):
+    file_path = str(tmp_path / "image.npy")
+    np.save(file_path, np.arange(8).reshape(2, 2, 2))
+    image = load_image(file_path)
+    (tmp_path / "image.npy").unlink()
+
+    image_copy = image.copy()
+    assert image_copy.shares_image_data
+    assert np.array_equal(image_copy.get_image_data(readonly=True), image.get_image_data(readonly=True))
+
+
+def test_copy_on_write():
+    image = from_numpy(np.zeros((2, 2)))
+    image_copy = image.copy()
+
+    image_copy.image_data[0, 0] = 1
+    assert image.image_data[0, 0] == 0
+    assert not image_copy.shares_image_data
+    assert not image.shares_image_data
+
+    image.image_data[1, 1] = 2
+    assert image_copy.image_data[1, 1] == 0
+
+
+def test_dropped_copy_stops_sharing():
+    image_data = np.zeros((2, 2))
+    image = from_numpy(image_data)
+    image_copy = image.copy()
+    assert image.shares_image_data
+    del image_copy
+    assert not image.shares_image_data
+    assert image.image_data is image_data
+
+    copies = [image.copy() for _ in range(4)]
+    assert image._shared.owners == 5
+    copies.clear()
+    assert image._shared.owners == 1
+
+    # Images pickled together keep sharing their buffer, an image pickled alone owns it
+    image_copy = image.copy()
+    restored, restored_copy = pickle.loads(pickle.dumps((image, image_copy)))
+    assert restored.shares_image_data and restored_copy.shares_image_data
+    restored_copy.image_data[0, 0] = 1
+    assert restored.image_data[0, 0] == 0
+    assert not pickle.loads(pickle.dumps(image_copy)).shares_image_data
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_load_images_in_order(tmp_path, use_processes):
+    file_paths = []
+    for index in range(5):
+        file_path = str(tmp_path / f"image_{index}.npy")
+        np.save(file_path, np.full((2, 2, 2), index))
+        file_paths.append(file_path)
+
+    images = list(load_images(file_paths, workers=2, prefetch=1, use_processes=use_processes))
+    assert [int(image.image_data[0, 0, 0]) for image in images] == list(range(5))
+
+
+def test_load_images_propagates_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(load_images([str(tmp_path / "missing.npy")]))
@@ -0,0 +1,116 @@
+from radvis.image.instantiate import load_image
+from radvis.image.rad_dicom_image import RadDicomImage
+from radvis.image.rad_dicom_series_image import RadDicomSeriesImage
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+import numpy as np
+import pytest
+
+
+def write_dicom_slice(file_path, pixels: np.ndarray, z: float, instance_number: int, pixel_spacing=None,
+                      pixel_range=None):
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = Dataset()
+    dataset.file_meta = file_meta
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+    dataset.SOPClassUID = CTImageStorage
+    dataset.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    dataset.Rows, dataset.Columns = pixels.shape
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 1
+    dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    dataset.ImagePositionPatient = [0, 0, z]
+    dataset.InstanceNumber = instance_number
+    if pixel_spacing is not None:
+        dataset.PixelSpacing = pixel_spacing
+    if pixel_range is not None:
+        dataset.SmallestImagePixelValue, dataset.LargestImagePixelValue = pixel_range
+    dataset.PixelData = pixels.astype(np.int16).tobytes()
+    dataset.save_as(str(file_path), write_like_original=False)
+
+
+@pytest.fixture
+def series(tmp_path):
+    volume = np.arange(5 * 4 * 3, dtype=np.int16).reshape(5, 4, 3)
+    # Write the slices in shuffled order with file names that do not sort by position
+    for file_index, slice_index in enumerate([3, 0, 4, 1, 2]):
+        write_dicom_slice(tmp_path / f"slice_{file_index}.dcm", volume[slice_index],
+                          z=2.5 * slice_index, instance_number=slice_index + 1)
+    return tmp_path, volume
+
+
+def test_load_series_directory(series):
+    directory, volume = series
+    image = load_image(str(directory), workers=2)
+    assert isinstance(image, RadDicomSeriesImage)
+    assert image.shape == volume.shape
+    assert np.array_equal(image.image_data, volume)
+
+
+def test_load_series_file_list(series):
+    directory, volume = series
+    file_paths = sorted(str(path) for path in directory.glob("*.dcm"))
+    image = load_image(file_paths)
+    assert np.array_equal(image.image_data, volume)
+
+
+def test_save_series_round_trip(series, tmp_path_factory):
+    directory, volume = series
+    output_directory = tmp_path_factory.mktemp("output")
+    image = RadDicomSeriesImage(str(directory))
+    image.save(str(output_directory))
+    assert np.array_equal(RadDicomSeriesImage(str(output_directory)).image_data, volume)
+
+
+def test_empty_series_directory(tmp_path):
+    with pytest.raises(ValueError):
+        RadDicomSeriesImage(str(tmp_path))
+
+
+def test_lazy_series_decodes_only_accessed_slices(series):
+    directory, volume = series
+    image = load_image(str(directory), lazy=True)
+    assert not image.is_loaded
+    assert image.shape == volume.shape
+    assert np.array_equal(image.get_slice(3), volume[3])
+    assert list(image.slice_provider._cache) == [3]
+    assert np.array_equal(image.get_slice(2, axis=2), volume[:, :, 2])
+    assert np.array_equal(image.image_data, volume)
+
+
+def test_statistics_ignore_stale_headers(tmp_path):
+    volume = np.arange(3 * 4 * 3, dtype=np.int16).reshape(3, 4, 3) - 10
+    for index in range(3):
+        write_dicom_slice(tmp_path / f"slice_{index}.dcm", volume[index], z=float(index), instance_number=index + 1,
+                          pixel_range=(0, 100))
+
+    # Decoded pixels give their own range
+    image = RadDicomSeriesImage(str(tmp_path))
+    assert (image.statistics.min, image.statistics.max) == (-10, 25)
+    single = RadDicomImage(str(tmp_path / "slice_0.dcm"))
+    assert (single.statistics.min, single.statistics.max) == (-10, 1)
+
+    # A lazy series has only the headers to go by
+    lazy = RadDicomSeriesImage(str(tmp_path), lazy=True)
+    assert lazy.statistics.is_cached("min") and (lazy.statistics.min, lazy.statistics.max) == (0, 100)
+
+
+def test_series_affine(tmp_path):
+    volume = np.zeros((3, 4, 5), dtype=np.int16)
+    for index in range(3):
+        write_dicom_slice(tmp_path / f"slice_{index}.dcm", volume[index], z=10 + 2.5 * index,
+                          instance_number=index + 1, pixel_spacing=[0.8, 0.6])
+    image = RadDicomSeriesImage(str(tmp_path))
+    assert np.allclose(image.spacing, (2.5, 0.8, 0.6))
+    # Voxel (slice, row, column) to LPS: rows step along y, columns along x
+    assert np.allclose(image.affine @ [2, 3, 4, 1], [4 * 0.6, 3 * 0.8, 15, 1])
+    assert RadDicomSeriesImage(str(tmp_path), lazy=True).spacing == image.spacing
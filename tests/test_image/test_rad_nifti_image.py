@@ -0,0 +1,82 @@
+from radvis.image.rad_nifti_image import RadNiftiImage
+import nibabel as nib
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def nifti_path(tmp_path):
+    image_data = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    file_path = tmp_path / "image.nii.gz"
+    nib.save(nib.Nifti1Image(image_data, affine=np.eye(4)), str(file_path))
+    return str(file_path)
+
+
+def test_lazy_load_does_not_read_data(nifti_path):
+    image = RadNiftiImage(nifti_path, lazy=True)
+    assert not image.is_loaded
+    assert image.shape == (4, 5, 6)
+    assert not image.is_loaded
+
+
+def test_lazy_slicing_matches_eager(nifti_path):
+    eager = RadNiftiImage(nifti_path)
+    lazy = RadNiftiImage(nifti_path, lazy=True)
+
+    for axis in range(3):
+        assert np.array_equal(lazy.get_slice(2, axis), eager.get_slice(2, axis))
+    assert np.array_equal(lazy[1:3, :, 4], eager[1:3, :, 4])
+    assert lazy.get_slice(0).dtype == eager.get_slice(0).dtype
+    assert not lazy.is_loaded
+
+
+def test_lazy_image_data_loads_full_volume(nifti_path):
+    image = RadNiftiImage(nifti_path, lazy=True)
+    image_data = image.image_data
+    assert image.is_loaded
+    assert image_data.dtype == np.int16
+    assert np.array_equal(image_data, RadNiftiImage(nifti_path).image_data)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_dtype_policy(nifti_path, lazy):
+    assert RadNiftiImage(nifti_path, lazy=lazy).dtype == np.int16
+    assert RadNiftiImage(nifti_path, lazy=lazy, dtype=np.float32).dtype == np.float32
+    assert RadNiftiImage(nifti_path, lazy=lazy, dtype=np.float32).get_slice(0).dtype == np.float32
+
+
+def test_scaled_data_is_promoted(tmp_path):
+    file_path = str(tmp_path / "scaled.nii")
+    nifti_image = nib.Nifti1Image(np.ones((2, 2, 2), dtype=np.int16), affine=np.eye(4))
+    nifti_image.header.set_slope_inter(0.5, 10)
+    nib.save(nifti_image, file_path)
+
+    image = RadNiftiImage(file_path)
+    assert np.issubdtype(image.dtype, np.floating)
+    assert np.allclose(image.image_data, 10.5)
+    assert RadNiftiImage(file_path, lazy=True).dtype == image.dtype
+
+
+def test_affine_round_trip(tmp_path):
+    file_path = str(tmp_path / "affine.nii")
+    affine = np.diag([0.5, 0.75, 2.0, 1.0])
+    affine[:3, 3] = [-10, 5, 3]
+    nib.save(nib.Nifti1Image(np.zeros((2, 3, 4), dtype=np.int16), affine=affine), file_path)
+
+    image = RadNiftiImage(file_path)
+    assert np.allclose(image.affine, affine)
+    assert np.allclose(image.spacing, (0.5, 0.75, 2.0))
+
+    image.save(str(tmp_path / "saved.nii"))
+    assert np.allclose(nib.load(str(tmp_path / "saved.nii")).affine, affine)
+
+
+def test_eager_load_reads_uncompressed_file(tmp_path):
+    image_data = np.arange(4 * 5 * 6, dtype=np.int16).reshape(4, 5, 6)
+    file_path = str(tmp_path / "image.nii")
+    nib.save(nib.Nifti1Image(image_data, affine=np.eye(4)), file_path)
+
+    image = RadNiftiImage(file_path)
+    assert not isinstance(image.image_data, np.memmap)
+    assert np.array_equal(image.image_data, image_data)
+    assert np.array_equal(RadNiftiImage(file_path, lazy=True).get_slice(2, axis=0), image_data[2])
@@ -0,0 +1,64 @@
+from radvis.image.instantiate import load_image
+from radvis.image.rad_numpy_image import RadNumpyImage
+import numpy as np
+import os
+import pytest
+
+
+@pytest.fixture
+def npy_path(tmp_path):
+    file_path = str(tmp_path / "image.npy")
+    np.save(file_path, np.arange(24, dtype=np.int16).reshape(2, 3, 4))
+    return file_path
+
+
+def test_mmap_load(npy_path):
+    image = load_image(npy_path, mmap_mode="r")
+    assert isinstance(image.image_data, np.memmap)
+    assert np.array_equal(image.get_slice(1, axis=2), np.load(npy_path)[:, :, 1])
+
+
+def test_mmap_requires_native_dtype(npy_path):
+    with pytest.raises(ValueError):
+        RadNumpyImage(npy_path, dtype=np.float32, mmap_mode="r")
+    assert RadNumpyImage(npy_path, dtype=np.int16, mmap_mode="r").dtype == np.int16
+
+
+@pytest.mark.parametrize("mmap_mode", ["w+", "x"])
+def test_mmap_invalid_mode_keeps_file(npy_path, mmap_mode):
+    size = os.path.getsize(npy_path)
+    with pytest.raises(ValueError):
+        load_image(npy_path, mmap_mode=mmap_mode)
+    with pytest.raises(ValueError):
+        RadNumpyImage(npy_path, mmap_mode=mmap_mode)
+    assert os.path.getsize(npy_path) == size
+    assert np.array_equal(np.load(npy_path), np.arange(24, dtype=np.int16).reshape(2, 3, 4))
+
+
+def test_mmap_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        load_image(str(tmp_path / "image.nii"), mmap_mode="r")
+
+
+def test_create_memmap_incrementally(tmp_path):
+    file_path = str(tmp_path / "output.npy")
+    image = RadNumpyImage.create_memmap(file_path, (3, 2, 2), dtype=np.uint8)
+    for index in range(3):
+        image.image_data[index] = index
+    image.flush()
+    assert np.array_equal(np.load(file_path)[:, 0, 0], [0, 1, 2])
+
+
+def test_save_streams_memmap(npy_path, tmp_path):
+    image = load_image(npy_path, mmap_mode="r")
+    output_path = str(tmp_path / "copy")
+    image.save(output_path, chunk_rows=1)
+    assert np.array_equal(np.load(output_path + ".npy"), np.load(npy_path))
+
+
+def test_lazy_load(npy_path):
+    image = load_image(npy_path, lazy=True)
+    assert not image.is_loaded
+    assert np.array_equal(image.get_slice(0, axis=1), np.load(npy_path)[:, 0, :])
+    assert not image.is_loaded
+    assert np.array_equal(image.image_data, np.load(npy_path))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from radvis.image.instantiate import from_numpy
+from radvis.image.chunked_store import write_chunked
+from radvis.image.rad_chunked_image import RadChunkedImage
+from radvis.processing.image import percentile_clipping
+
+
+@pytest.fixture
+def image_data():
+    return np.random.default_rng(0).integers(-500, 1500, size=(20, 16, 12)).astype(np.int16)
+
+
+def test_statistics_match_numpy(image_data):
+    statistics = from_numpy(image_data).statistics
+    assert statistics.min == image_data.min() and statistics.max == image_data.max()
+    assert statistics.mean == pytest.approx(image_data.mean())
+    counts, edges = statistics.histogram(bins=32)
+    expected_counts, expected_edges = np.histogram(image_data, bins=32)
+    assert np.array_equal(counts, expected_counts) and np.allclose(edges, expected_edges)
+    assert np.array_equal(statistics.percentiles([1, 50, 99]), np.percentile(image_data, [1, 50, 99]))
+    assert statistics.percentiles(50) == np.percentile(image_data, 50)
+
+
+def test_statistics_are_invalidated(image_data):
+    rad_image = from_numpy(image_data.copy())
+    statistics = rad_image.statistics
+    assert rad_image.statistics is statistics
+    assert rad_image.get_image_data(readonly=True) is not None and rad_image.statistics is statistics
+
+    # Accessing image_data hands out a writable array
+    rad_image.image_data[0, 0, 0] = 5000
+    assert rad_image.statistics.max == 5000
+
+    rad_image.set_image_data(image_data)
+    assert rad_image.statistics.max == image_data.max()
+
+
+def test_percentile_clipping_reuses_cached_percentiles(image_data):
+    rad_image = from_numpy(image_data)
+    first = percentile_clipping(rad_image, 2, 98)
+    assert rad_image.statistics.is_cached("min") is False
+    assert set(rad_image.statistics._percentiles) == {2.0, 98.0}
+    assert np.array_equal(percentile_clipping(rad_image, 2, 98).image_data, first.image_data)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_chunked_volume_records_range(tmp_path, image_data, lazy):
+    file_path = str(tmp_path / "volume.rvc")
+    write_chunked(file_path, image_data, chunks=(8, 8, 8))
+    rad_image = RadChunkedImage(file_path, lazy=lazy)
+    assert rad_image.statistics.is_cached("min") and rad_image.statistics.is_cached("max")
+    assert rad_image.statistics.min == image_data.min() and rad_image.statistics.max == image_data.max()
+    assert rad_image.is_loaded != lazy
+    # Lazily loaded images are read in blocks
+    assert rad_image.statistics.mean == pytest.approx(image_data.mean())
+    assert rad_image.is_loaded != lazy
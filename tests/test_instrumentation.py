@@ -0,0 +1,93 @@
+import json
+import numpy as np
+import pytest
+from radvis import instrumentation
+from radvis.instrumentation import add_callback, instrumented, profile, remove_callback
+from radvis.image.instantiate import from_numpy, load_image
+from radvis.processing.image import normalization, noise_reduction
+from radvis.mesh import compute_marching_cubes, RadMesh
+
+
+@pytest.fixture
+def rad_image():
+    image_data = np.zeros((16, 16, 16), dtype=np.float32)
+    image_data[4:12, 4:12, 4:12] = 1
+    return from_numpy(image_data)
+
+
+def test_off_by_default(rad_image):
+    events = []
+    assert not instrumentation._enabled
+    normalization(rad_image, 0, 1)
+    with profile() as session:
+        normalization(rad_image, 0, 1)
+    normalization(rad_image, 0, 1)
+    assert not instrumentation._enabled
+    assert [event.name for event in session.events] == ["normalization"]
+
+    add_callback(events.append)
+    try:
+        noise_reduction(rad_image, 1.0)
+    finally:
+        remove_callback(events.append)
+    noise_reduction(rad_image, 1.0)
+    assert [event.name for event in events] == ["noise_reduction"]
+
+
+def test_event_sizes(rad_image, tmp_path):
+    file_path = str(tmp_path / "image.npy")
+    np.save(file_path, rad_image.image_data)
+    mesh_path = str(tmp_path / "mesh.vtk")
+    with profile(memory=True) as session:
+        image = load_image(file_path)
+        normalized = normalization(image, 0, 1)
+        mesh = compute_marching_cubes(normalized, 0.5)
+        mesh.save(mesh_path, "vtk")
+        RadMesh.load(mesh_path)
+
+    events = {event.name: event for event in session.events}
+    assert set(events) >= {"load_image", "RadNumpyImage.load", "normalization", "compute_marching_cubes",
+                           "RadMesh.save", "RadMesh.load"}
+    assert events["load_image"].bytes_read == events["RadNumpyImage.load"].bytes_read > rad_image.image_data.nbytes
+    assert events["RadNumpyImage.load"].depth == events["load_image"].depth + 1
+    assert events["normalization"].bytes_read == image.image_data.nbytes
+    assert events["normalization"].output_bytes == normalized.image_data.nbytes
+    # The float64 result of normalization is allocated during the call
+    assert events["normalization"].bytes_allocated >= normalized.image_data.nbytes
+    assert events["RadMesh.save"].output_bytes == events["RadMesh.load"].bytes_read > 0
+
+
+def test_nested_allocation():
+    @instrumented("test")
+    def inner():
+        return np.ones(1 << 20, dtype=np.uint8)
+
+    @instrumented("test")
+    def outer():
+        inner()
+        return None
+
+    with profile(memory=True) as session:
+        outer()
+    inner_event, outer_event = session.events
+    assert inner_event.name == "inner" and inner_event.depth == 1 and outer_event.depth == 0
+    # The peak of the inner call counts towards the outer one, though its array was freed
+    assert outer_event.bytes_allocated >= inner_event.bytes_allocated >= 1 << 20
+    assert outer_event.output_bytes == 0
+
+
+def test_export(rad_image, tmp_path):
+    with profile() as session:
+        normalization(rad_image, 0, 1)
+        normalization(rad_image, 0, 1)
+
+    exported = json.loads(session.to_json(str(tmp_path / "profile.json")))
+    assert len(exported["events"]) == 2 and exported["events"][0]["bytes_allocated"] is None
+    assert exported["summary"][0]["calls"] == 2
+    assert "normalization" in str(session)
+
+    session.to_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as file:
+        trace = json.load(file)["traceEvents"]
+    assert [event["ph"] for event in trace] == ["X", "X"]
+    assert trace[1]["ts"] >= trace[0]["ts"] + trace[0]["dur"]
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import textwrap
+
+HEAVY_MODULES = ("pydicom", "nibabel", "scipy", "skimage", "matplotlib", "IPython", "ipywidgets")
+
+
+def _loaded_heavy_modules(code: str) -> list[str]:
+    """ Run code in a fresh interpreter and return the heavy modules it imported """
+    script = textwrap.dedent(code) + textwrap.dedent(f"""
+        import sys
+        print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+    """)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    output = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ""
+    return [name for name in output.split(",") if name]
+
+
+def test_import_radvis_is_light():
+    assert _loaded_heavy_modules("import radvis") == []
+
+
+def test_numpy_workflow_does_not_import_backends(tmp_path):
+    path = tmp_path / "image.npy"
+    loaded = _loaded_heavy_modules(f"""
+        import numpy as np
+        import radvis
+        np.save({str(path)!r}, np.arange(27, dtype=np.int16).reshape(3, 3, 3))
+        image = radvis.load_image({str(path)!r})
+        radvis.normalization(image, 0, 26)
+    """)
+    assert loaded == []
+
+
+def test_backend_imported_on_first_use():
+    assert "scipy" in _loaded_heavy_modules("""
+        import numpy as np
+        import radvis
+        radvis.noise_reduction(radvis.from_numpy(np.zeros((4, 4, 4))), sigma=1)
+    """)
+
+
+def test_lazy_attributes():
+    import radvis
+    import radvis.image
+    assert radvis.load_image is radvis.image.load_image
+    assert "RadSlicer" in dir(radvis)
+    assert radvis.visualize.RadSlicer is radvis.RadSlicer
@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pytest
+from radvis.mesh import RadMesh
+from radvis.mesh.binary_format import read_binary_mesh, write_binary_mesh
+
+
+@pytest.fixture
+def mesh():
+    rng = np.random.default_rng(0)
+    vertices = rng.random((50, 3), dtype=np.float32)
+    faces = rng.integers(0, 50, size=(80, 3)).astype(np.int32)
+    normals = rng.random((50, 3), dtype=np.float32)
+    values = rng.random(50, dtype=np.float32)
+    return RadMesh(vertices, faces, normals, values)
+
+
+@pytest.mark.parametrize("compression_level", [0, 6])
+def test_round_trip(mesh, tmp_path, compression_level):
+    file_path = str(tmp_path / "mesh.rvm")
+    mesh.save(file_path, "rvm", compression_level=compression_level)
+    loaded = RadMesh.load(file_path)
+
+    assert np.array_equal(loaded.vertices, mesh.vertices) and loaded.vertices.dtype == np.float32
+    assert np.array_equal(loaded.faces, mesh.faces) and loaded.faces.dtype == np.uint32
+    assert np.array_equal(loaded.normals, mesh.normals)
+    assert np.array_equal(loaded.values, mesh.values)
+
+
+def test_memory_map(mesh, tmp_path):
+    file_path = str(tmp_path / "mesh.rvm")
+    mesh.save(file_path, "rvm")
+    loaded = RadMesh.load(file_path, mmap_mode="r")
+    assert isinstance(loaded.vertices, np.memmap)
+    assert np.array_equal(loaded.faces, mesh.faces) and np.array_equal(loaded.values, mesh.values)
+
+    size = os.path.getsize(file_path)
+    with pytest.raises(ValueError):
+        RadMesh.load(file_path, mmap_mode="w+")
+    assert os.path.getsize(file_path) == size
+
+    mesh.save(file_path, "rvm", compression_level=1)
+    with pytest.raises(ValueError):
+        RadMesh.load(file_path, mmap_mode="r")
+
+
+def test_optional_arrays(tmp_path):
+    file_path = str(tmp_path / "mesh.rvm")
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float64)
+    write_binary_mesh(file_path, vertices, [[0, 1, 2]], float_dtype=None)
+    loaded_vertices, faces, normals, values = read_binary_mesh(file_path)
+    assert loaded_vertices.dtype == np.float64 and np.array_equal(loaded_vertices, vertices)
+    assert faces.tolist() == [[0, 1, 2]]
+    assert normals is None and values is None
+
+
+def test_invalid(mesh, tmp_path):
+    file_path = tmp_path / "mesh.rvm"
+    file_path.write_bytes(b"not a mesh file at all")
+    with pytest.raises(ValueError):
+        read_binary_mesh(str(file_path))
+    with pytest.raises(ValueError):
+        write_binary_mesh(str(file_path), mesh.vertices, mesh.faces, normals=mesh.normals[:10])
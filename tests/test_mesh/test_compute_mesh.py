@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
-from radvis.mesh import RadMesh, compute_marching_cubes
+from radvis.mesh import RadMesh, compute_marching_cubes, compute_label_meshes
+from radvis.image.instantiate import from_numpy
 from tests.mocks.mock_rad_image import MockRadImage
 
 def test_init():
@@ -33,6 +34,16 @@ def test_compute_rad_mesh_valid_input():
     assert rad_mesh.values.ndim == 1
 
 
+def test_compute_rad_mesh_keeps_shared_data():
+    volume = np.zeros((10, 10, 10), dtype=np.float32)
+    volume[3:7, 3:7, 3:7] = 1.0
+    rad_image = from_numpy(volume)
+    image_copy = rad_image.copy()
+
+    assert len(compute_marching_cubes(image_copy, 0.5).faces)
+    assert image_copy.shares_image_data and rad_image.shares_image_data
+
+
 def test_compute_rad_mesh_invalid_volume():
     volume = np.zeros((10, 10))  # 2D array instead of 3D
     threshold = 0.5
@@ -69,3 +80,86 @@ def test_compute_rad_mesh_error_handling():
 
     with pytest.raises(RuntimeError):
         compute_marching_cubes(radimage, threshold, method="invalid_method")
+
+
+def _sorted_faces(vertices, faces, reference):
+    # Map the vertices to the nearest reference vertices, to compare meshes listed in another order
+    index = np.argmin(np.linalg.norm(vertices[:, None] - reference[None], axis=2), axis=1)
+    return sorted(map(tuple, np.sort(index[faces], axis=1)))
+
+
+@pytest.mark.parametrize("workers, block_size", [(1, 1), (1, 3), (2, None)])
+def test_compute_marching_cubes_blocks(workers, block_size):
+    grid = np.mgrid[:14, :12, :12]
+    volume = np.sqrt(((grid - [[[[6.5]]], [[[5.5]]], [[[5.2]]]]) ** 2).sum(axis=0))
+    radimage = MockRadImage()
+    radimage.image_data = volume
+    whole = compute_marching_cubes(radimage, 4.3, spacing=(2.0, 1.0, 1.0))
+
+    blocks = compute_marching_cubes(radimage, 4.3, workers=workers, block_size=block_size, spacing=(2.0, 1.0, 1.0))
+    assert blocks.vertices.shape == whole.vertices.shape and blocks.faces.shape == whole.faces.shape
+    assert _sorted_faces(blocks.vertices, blocks.faces, whole.vertices) == _sorted_faces(whole.vertices, whole.faces, whole.vertices)
+    # The seams are welded, so every edge of the closed surface is shared by two faces
+    edges = np.sort(np.concatenate([blocks.faces[:, [0, 1]], blocks.faces[:, [1, 2]], blocks.faces[:, [2, 0]]]), axis=1)
+    assert np.all(np.unique(edges, axis=0, return_counts=True)[1] == 2)
+
+
+@pytest.mark.parametrize("block_size", [1, 3])
+def test_compute_marching_cubes_blocks_integer(block_size):
+    # Voxels equal to the threshold give several vertices at the same position, on different edges
+    radimage = MockRadImage()
+    radimage.image_data = np.random.default_rng(0).integers(0, 5, (15, 9, 10)).astype(np.int16)
+    whole = compute_marching_cubes(radimage, 2)
+
+    blocks = compute_marching_cubes(radimage, 2, workers=1, block_size=block_size)
+    assert blocks.vertices.shape == whole.vertices.shape and blocks.faces.shape == whole.faces.shape
+
+    def edge_faces(mesh):
+        edges = np.sort(np.concatenate([mesh.faces[:, [0, 1]], mesh.faces[:, [1, 2]], mesh.faces[:, [2, 0]]]), axis=1)
+        return np.bincount(np.unique(edges, axis=0, return_counts=True)[1])
+
+    def face_positions(mesh):
+        # The vertices of each face, up to float32 rounding, from its first vertex in sorted order
+        positions = [tuple(map(tuple, face)) for face in mesh.vertices[mesh.faces].round(4)]
+        return sorted(min(face[i:] + face[:i] for i in range(3)) for face in positions)
+
+    assert np.array_equal(edge_faces(blocks), edge_faces(whole))
+    assert face_positions(blocks) == face_positions(whole)
+
+
+def test_compute_marching_cubes_blocks_invalid():
+    radimage = MockRadImage()
+    radimage.image_data = np.zeros((10, 10, 10))
+    radimage.image_data[3:7, 3:7, 3:7] = 1.0
+    with pytest.raises(ValueError):
+        compute_marching_cubes(radimage, 0.5, block_size=2, step_size=2)
+    with pytest.raises(RuntimeError):
+        compute_marching_cubes(radimage, 2.0, workers=1)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_compute_label_meshes(workers):
+    labels = np.zeros((20, 16, 18), dtype=np.uint8)
+    labels[2:6, 3:9, 4:10] = 1
+    labels[10:20, 8:14, 1:7] = 3  # Touches the edge of the volume
+    radimage = MockRadImage()
+    radimage.image_data = labels
+
+    meshes = compute_label_meshes(radimage, workers=workers, spacing=(2.0, 1.0, 1.0))
+    assert sorted(meshes) == [1, 3]
+    for label, mesh in meshes.items():
+        binary = MockRadImage()
+        binary.image_data = (labels == label).astype(np.float32)
+        expected = compute_marching_cubes(binary, 0.5, spacing=(2.0, 1.0, 1.0))
+        assert np.allclose(mesh.vertices, expected.vertices, atol=1e-5)
+        assert np.array_equal(mesh.faces, expected.faces)
+        assert np.allclose(mesh.normals, expected.normals) and np.allclose(mesh.values, expected.values)
+
+    assert sorted(compute_label_meshes(radimage, labels=[3, 7], workers=workers)) == [3]
+
+
+def test_compute_label_meshes_invalid():
+    radimage = MockRadImage()
+    radimage.image_data = np.zeros((10, 10, 10), dtype=np.float32)
+    with pytest.raises(ValueError):
+        compute_label_meshes(radimage)
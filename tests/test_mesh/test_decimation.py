@@ -0,0 +1,70 @@
+import time
+import numpy as np
+import pytest
+from radvis.image.instantiate import from_numpy
+from radvis.mesh import RadMesh, compute_marching_cubes
+
+
+@pytest.fixture
+def sphere():
+    grid = np.mgrid[:40, :40, :40]
+    volume = np.sqrt(((grid - 19.5) ** 2).sum(axis=0))
+    return compute_marching_cubes(from_numpy(volume), 14.2)
+
+
+def _edge_face_counts(faces):
+    edges = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+    return np.unique(edges, axis=0, return_counts=True)
+
+
+def test_decimate(sphere):
+    decimated = sphere.decimate(ratio=0.1, manifold=True)
+    assert len(decimated.faces) <= round(len(sphere.faces) * 0.1) + 1
+    assert decimated.faces.max() == len(decimated.vertices) - 1
+    # Still a closed surface of genus 0
+    edges, counts = _edge_face_counts(decimated.faces)
+    assert np.all(counts == 2)
+    assert len(decimated.vertices) - len(edges) + len(decimated.faces) == 2
+    # Close to the original surface, with unit normals and values from the original range
+    radius = np.linalg.norm(decimated.vertices - 19.5, axis=1)
+    assert np.all(np.abs(radius - 14.2) < 0.5)
+    assert np.allclose(np.linalg.norm(decimated.normals, axis=1), 1, atol=1e-5)
+    assert sphere.values.min() <= decimated.values.min() and decimated.values.max() <= sphere.values.max()
+    assert decimated.vertices.dtype == sphere.vertices.dtype and decimated.faces.dtype == sphere.faces.dtype
+
+    assert len(sphere.decimate(target_faces=500).faces) <= 500
+
+
+def test_decimate_preserves_boundary(sphere):
+    # The half of the sphere below its equator is an open surface
+    below = sphere.vertices[:, 0] < 19.5
+    faces = sphere.faces[below[sphere.faces].all(axis=1)]
+    edges, counts = _edge_face_counts(faces)
+    boundary = sphere.vertices[np.unique(edges[counts == 1])]
+
+    decimated = RadMesh(sphere.vertices, faces, sphere.normals, sphere.values).decimate(ratio=0.2)
+    assert len(decimated.faces) < len(faces) / 2
+    kept = {tuple(vertex) for vertex in decimated.vertices}
+    assert all(tuple(vertex) in kept for vertex in boundary)
+
+
+def test_decimate_large_binary_mesh():
+    # A mask surface of about 240k faces, with the ties in cost that made earlier rounds slow
+    grid = np.mgrid[:200, :200, :200]
+    mask = (((grid - 99.5) ** 2).sum(axis=0) < 90 ** 2).astype(np.float32)
+    mesh = compute_marching_cubes(from_numpy(mask), 0.5)
+    assert len(mesh.faces) > 200000
+
+    start = time.perf_counter()
+    decimated = mesh.decimate(ratio=0.05)
+    assert time.perf_counter() - start < 12
+    assert len(decimated.faces) <= round(len(mesh.faces) * 0.05) + 1
+
+
+def test_decimate_invalid(sphere):
+    with pytest.raises(ValueError):
+        sphere.decimate()
+    with pytest.raises(ValueError):
+        sphere.decimate(target_faces=10, ratio=0.5)
+    with pytest.raises(ValueError):
+        sphere.decimate(ratio=1.5)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from radvis.image.instantiate import from_numpy
+from radvis.processing import image as processing
+from radvis.processing.batch import (batch_normalization, batch_noise_reduction, batch_percentile_clipping,
+                                     batch_add_padding, batch_apply_mask)
+
+
+@pytest.fixture
+def images():
+    rng = np.random.default_rng(0)
+    return [from_numpy(rng.integers(-1000, 1000, size=(6, 9, 7)).astype(np.int16)) for _ in range(4)]
+
+
+def assert_matches(batch, expected):
+    assert len(batch) == len(expected)
+    for result, image in zip(batch, expected):
+        assert result.image_data.dtype == image.image_data.dtype
+        assert np.array_equal(result.image_data, image.image_data)
+
+
+def test_normalization_per_image(images):
+    min_vals = [-1000, -500, 0, 10]
+    expected = [processing.normalization(image, lo, 1000) for image, lo in zip(images, min_vals)]
+    assert_matches(batch_normalization(images, min_vals, 1000), expected)
+
+
+def test_noise_reduction(images):
+    assert_matches(batch_noise_reduction(images, 1.5), [processing.noise_reduction(image, 1.5) for image in images])
+    sigmas = [0.5, 1, 1.5, 2]
+    expected = [processing.noise_reduction(image, sigma) for image, sigma in zip(images, sigmas)]
+    assert_matches(batch_noise_reduction(images, sigmas), expected)
+
+
+def test_percentile_clipping_per_image(images):
+    lowers, uppers = [1, 5, 5, 0.5], 99
+    expected = [processing.percentile_clipping(image, lo, uppers) for image, lo in zip(images, lowers)]
+    result = batch_percentile_clipping(images, lowers, uppers)
+    for batch_image, image in zip(result, expected):
+        assert np.array_equal(batch_image.image_data, image.image_data)
+
+
+def test_percentile_clipping_with_mask(images):
+    mask = np.zeros(images[0].shape, dtype=bool)
+    mask[1:5, 2:7] = True
+    expected = [processing.percentile_clipping(image, 2, 98, mask=mask) for image in images]
+    for batch_image, image in zip(batch_percentile_clipping(images, 2, 98, mask=mask), expected):
+        assert np.array_equal(batch_image.image_data, image.image_data)
+
+
+def test_add_padding_and_mask_on_stack(images):
+    stack = np.stack([image.image_data for image in images])
+    padded = batch_add_padding(stack, (8, 10, 8))
+    assert isinstance(padded, np.ndarray) and padded.shape == (4, 8, 10, 8)
+    assert np.array_equal(padded[2], processing.add_padding(images[2], (8, 10, 8)).image_data)
+
+    mask = np.random.default_rng(1).integers(0, 3, size=stack.shape)
+    masked = batch_apply_mask(stack, mask, invert=[False, True, False, True])
+    for index, image in enumerate(images):
+        expected = processing.apply_mask(image, mask[index], invert=index % 2 == 1)
+        assert np.array_equal(masked[index], expected.image_data)
+
+
+def test_inputs_are_unchanged(images):
+    before = [image.image_data.copy() for image in images]
+    batch_normalization(images, 0, 1)
+    for image, data in zip(images, before):
+        assert np.array_equal(image.image_data, data)
+
+
+def test_invalid_batches(images):
+    with pytest.raises(ValueError):
+        batch_normalization([], 0, 1)
+    with pytest.raises(ValueError):
+        batch_normalization(images + [from_numpy(np.zeros((2, 2, 2)))], 0, 1)
+    with pytest.raises(ValueError):
+        batch_normalization(images, [0, 1], 1)
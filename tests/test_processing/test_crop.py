@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from radvis.image.instantiate import from_numpy
+from radvis.processing.crop import crop_to_foreground, uncrop
+from radvis.processing.image import noise_reduction, apply_mask, add_padding
+from radvis.processing.resample import resample
+from radvis.processing.pipeline import Pipeline
+from radvis.processing.batch import batch_add_padding
+from radvis.mesh import compute_marching_cubes
+
+
+@pytest.fixture
+def rad_image():
+    image_data = np.full((30, 24, 20), -1000, dtype=np.int16)
+    image_data[8:15, 5:19, 11:17] = 40
+    image = from_numpy(image_data)
+    image.affine = np.diag([2.0, 1.0, 0.5, 1.0])
+    return image
+
+
+def test_crop_to_foreground(rad_image):
+    cropped = crop_to_foreground(rad_image)
+    assert cropped.shape == (7, 14, 6)
+    assert cropped.crop_offset == (8, 5, 11) and cropped.original_shape == (30, 24, 20)
+    assert np.all(cropped.image_data == 40)
+    # The first voxel keeps its world position
+    assert np.allclose(cropped.affine @ [0, 0, 0, 1], rad_image.affine @ [8, 5, 11, 1])
+
+    with_margin = crop_to_foreground(rad_image, threshold=0, margin=(2, 10, 0))
+    assert with_margin.shape == (11, 24, 6) and with_margin.crop_offset == (6, 0, 11)
+
+    mask = rad_image.image_data > 0
+    assert crop_to_foreground(rad_image, mask=mask).crop_offset == cropped.crop_offset
+
+
+def test_uncrop_round_trip(rad_image):
+    cropped = crop_to_foreground(rad_image, margin=1)
+    nested = crop_to_foreground(cropped, threshold=0)
+    assert nested.crop_offset == (8, 5, 11)
+
+    restored = uncrop(nested, fill_value=-1000)
+    assert np.array_equal(restored.image_data, rad_image.image_data)
+    assert restored.crop_offset is None and np.allclose(restored.affine, rad_image.affine)
+
+    filtered = uncrop(noise_reduction(cropped, 1), background=rad_image)
+    assert filtered.image_data.dtype == np.float32
+    assert np.array_equal(filtered.image_data[:5], rad_image.image_data[:5])
+
+    with pytest.raises(ValueError):
+        uncrop(rad_image)
+
+
+def test_uncrop_after_grid_changes(rad_image):
+    cropped = crop_to_foreground(rad_image, margin=1)
+    padded = add_padding(cropped, (13, 18, 10))
+    assert padded.crop_offset == (5, 3, 9)
+    restored = uncrop(padded, fill_value=-1000)
+    assert np.array_equal(restored.image_data > 0, rad_image.image_data > 0)
+    assert np.allclose(compute_marching_cubes(padded, 0.0).vertices.min(axis=0),
+                       compute_marching_cubes(rad_image, 0.0).vertices.min(axis=0))
+
+    # The padding reaches past the original frame
+    with pytest.raises(ValueError):
+        uncrop(add_padding(cropped, (25, 18, 10)))
+
+    resampled = resample(cropped, shape=(5, 5, 5))
+    assert resampled.crop_offset is None and resampled.original_shape is None
+    with pytest.raises(ValueError):
+        uncrop(resampled)
+
+
+def test_uncrop_after_pipeline_and_batch_padding(rad_image):
+    cropped = crop_to_foreground(rad_image, margin=1)
+    filtered = noise_reduction(cropped, 0.5)
+    results = [(Pipeline().add(add_padding, (13, 18, 10)).run(cropped), cropped),
+               (Pipeline().add(noise_reduction, 0.5).add(add_padding, (13, 18, 10)).run(cropped), filtered),
+               *((image, cropped) for image in batch_add_padding([cropped, cropped], (13, 18, 10)))]
+    for padded, unpadded in results:
+        assert padded.crop_offset == (5, 3, 9) and padded.original_shape == (30, 24, 20)
+        # The data lands back where it was cropped from
+        restored = uncrop(padded, fill_value=-1000)
+        assert np.allclose(restored.image_data[7:16, 4:20, 10:18], unpadded.image_data)
+    # The input keeps its own offset
+    assert cropped.crop_offset == (7, 4, 10)
+
+
+def test_crop_errors(rad_image):
+    with pytest.raises(ValueError):
+        crop_to_foreground(rad_image, threshold=100)
+    with pytest.raises(ValueError):
+        crop_to_foreground(rad_image, threshold=0, mask=rad_image.image_data > 0)
+
+
+def test_mesh_of_cropped_image_is_in_original_frame(rad_image):
+    full = compute_marching_cubes(rad_image, 0.0)
+    cropped = compute_marching_cubes(crop_to_foreground(rad_image, margin=1), 0.0)
+    assert np.allclose(full.vertices.min(axis=0), cropped.vertices.min(axis=0))
+    assert np.allclose(full.vertices.max(axis=0), cropped.vertices.max(axis=0))
+
+
+def test_apply_mask_crop_can_be_undone(rad_image):
+    mask = rad_image.image_data > 0
+    cropped, offset = apply_mask(rad_image, mask, invert=True, crop=True)
+    assert cropped.crop_offset == offset == (8, 5, 11)
+    assert np.array_equal(uncrop(cropped).image_data, np.where(mask, rad_image.image_data, 0))
@@ -1,5 +1,6 @@
 import numpy as np
 from radvis.processing.image import percentile_clipping, noise_reduction, normalization, add_padding, apply_mask
+from radvis.image.instantiate import from_numpy
 from tests.mocks.mock_rad_image import MockRadImage 
 
 def test_clipping():
@@ -65,3 +66,76 @@ def test_apply_mask_invert():
 
     # Check that the masked image only has values off the diagonal line
     assert np.array_equal(masked_image.image_data, np.ones((10, 10)) - np.eye(10))
+
+def test_processing_output_dtypes():
+    rad_image = from_numpy(np.arange(0, 64, dtype=np.int16).reshape(4, 4, 4))
+
+    assert normalization(rad_image, 0, 63).image_data.dtype == np.float32
+    assert noise_reduction(rad_image, 1).image_data.dtype == np.float32
+    assert add_padding(rad_image, (6, 6, 6)).image_data.dtype == np.int16
+    assert apply_mask(rad_image, np.ones((4, 4, 4), dtype=np.uint8)).image_data.dtype == np.int16
+    assert percentile_clipping(rad_image, 0, 100).image_data.dtype == np.int16
+    assert percentile_clipping(rad_image, 1, 99).image_data.dtype == np.float32
+
+def test_processing_does_not_modify_input():
+    image_data = np.arange(0, 64, dtype=np.float32).reshape(4, 4, 4)
+    rad_image = from_numpy(image_data.copy())
+    mask = np.zeros((4, 4, 4), dtype=bool)
+    mask[1:3] = True
+
+    normalization(rad_image, 0, 63)
+    noise_reduction(rad_image, 1)
+    percentile_clipping(rad_image, 10, 90)
+    apply_mask(rad_image, mask)
+    assert np.array_equal(rad_image.image_data, image_data)
+
+
+def test_inplace_processing():
+    image_data = np.arange(0, 64, dtype=np.float32).reshape(4, 4, 4)
+    mask = np.zeros((4, 4, 4), dtype=bool)
+    mask[1:3] = True
+
+    expected = [
+        (normalization, (0, 63)),
+        (noise_reduction, (1,)),
+        (percentile_clipping, (10, 90)),
+        (apply_mask, (mask,)),
+        (apply_mask, (mask, True)),
+    ]
+    for function, args in expected:
+        rad_image = from_numpy(image_data.copy())
+        buffer = rad_image.image_data
+        result = function(rad_image, *args, inplace=True)
+        assert result is rad_image
+        assert rad_image.image_data is buffer
+        assert np.array_equal(buffer, function(from_numpy(image_data), *args).image_data)
+
+
+def test_out_processing():
+    rad_image = from_numpy(np.arange(0, 64, dtype=np.int16).reshape(4, 4, 4))
+    out = np.empty((4, 4, 4), dtype=np.float64)
+    result = normalization(rad_image, 0, 63, out=out)
+    assert result.image_data is out
+    assert np.allclose(out, rad_image.image_data / 63)
+
+    padded_out = np.full((6, 6, 6), 7, dtype=np.int16)
+    padded = add_padding(rad_image, (6, 6, 6), out=padded_out)
+    assert padded.image_data is padded_out
+    assert np.array_equal(padded_out, add_padding(rad_image, (6, 6, 6)).image_data)
+
+
+def test_parallel_noise_reduction_matches_serial():
+    image_data = np.random.default_rng(0).normal(0, 100, size=(23, 18, 11)).astype(np.int16)
+    rad_image = from_numpy(image_data)
+    expected = noise_reduction(rad_image, 1.5).image_data
+
+    for workers, per_axis in [(4, False), (3, True), (1, True), (None, False)]:
+        result = noise_reduction(rad_image, 1.5, workers=workers, per_axis=per_axis).image_data
+        assert result.dtype == expected.dtype
+        assert np.array_equal(result, expected)
+
+    # Per-axis sigmas, and filtering in place, where blocks would read overwritten halos
+    float_image = from_numpy(image_data.astype(np.float32))
+    expected = noise_reduction(float_image, (2, 0, 1)).image_data
+    noise_reduction(float_image, (2, 0, 1), inplace=True, workers=4)
+    assert np.array_equal(float_image.image_data, expected)
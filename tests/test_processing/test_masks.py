@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from radvis.image.instantiate import from_numpy
+from radvis.processing.image import apply_mask
+from radvis.processing.masks import SparseMask, bounding_box
+
+
+@pytest.fixture
+def volume():
+    rng = np.random.default_rng(0)
+    image_data = rng.integers(-100, 100, size=(12, 10, 8)).astype(np.int16)
+    mask = np.zeros(image_data.shape, dtype=bool)
+    mask[3:7, 2:5, 4:8] = rng.random((4, 3, 4)) > 0.3
+    return image_data, mask
+
+
+def test_sparse_mask_constructors(volume):
+    _, mask = volume
+    sparse = SparseMask.from_dense(mask)
+    assert np.array_equal(sparse.to_dense(), mask)
+    assert np.array_equal(SparseMask.from_coordinates(np.nonzero(mask), mask.shape).indices, sparse.indices)
+    starts, lengths = sparse.runs()
+    assert np.array_equal(SparseMask.from_runs(starts, lengths, mask.shape).indices, sparse.indices)
+    assert np.array_equal(sparse[2:5], mask[2:5])
+    box = sparse.bounding_box()
+    assert box == bounding_box(mask)
+    assert np.array_equal(sparse.to_dense(box), mask[box])
+    assert bounding_box(np.zeros((3, 3), dtype=bool)) is None
+
+
+@pytest.mark.parametrize("invert", [False, True])
+@pytest.mark.parametrize("sparse", [False, True])
+def test_apply_mask_matches_where(volume, invert, sparse):
+    image_data, mask = volume
+    expected = np.where(mask, image_data, 0) if invert else np.where(mask, 0, image_data)
+    used_mask = SparseMask.from_dense(mask) if sparse else mask
+
+    assert np.array_equal(apply_mask(from_numpy(image_data.copy()), used_mask, invert=invert).image_data, expected)
+
+    rad_image = from_numpy(image_data.copy())
+    buffer = rad_image.image_data
+    assert apply_mask(rad_image, used_mask, invert=invert, inplace=True).image_data is buffer
+    assert np.array_equal(buffer, expected)
+
+    out = np.full(image_data.shape, 7, dtype=np.float32)
+    apply_mask(from_numpy(image_data), used_mask, invert=invert, out=out)
+    assert np.array_equal(out, expected)
+
+    streamed = apply_mask(from_numpy(image_data), used_mask, invert=invert, block_size=5)
+    assert np.array_equal(streamed.image_data, expected)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_apply_mask_crop(volume, sparse):
+    image_data, mask = volume
+    used_mask = SparseMask.from_dense(mask) if sparse else mask
+    cropped, offset = apply_mask(from_numpy(image_data), used_mask, invert=True, crop=True)
+    box = bounding_box(mask)
+    assert offset == tuple(s.start for s in box)
+    assert np.array_equal(cropped.image_data, np.where(mask, image_data, 0)[box])
+
+    # Without inverting, the crop is the bounding box of the voxels outside the mask
+    cropped, offset = apply_mask(from_numpy(image_data), np.logical_not(mask), crop=True)
+    assert offset == tuple(s.start for s in box)
+    assert cropped.shape == mask[box].shape
+
+
+def test_apply_mask_empty_mask(volume):
+    image_data, _ = volume
+    empty = np.zeros(image_data.shape, dtype=bool)
+    assert np.array_equal(apply_mask(from_numpy(image_data), empty).image_data, image_data)
+    assert not apply_mask(from_numpy(image_data), empty, invert=True).image_data.any()
+    cropped, offset = apply_mask(from_numpy(image_data), empty, invert=True, crop=True)
+    assert cropped.image_data.size == 0 and offset == (0, 0, 0)
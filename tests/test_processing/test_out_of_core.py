@@ -0,0 +1,78 @@
+import tracemalloc
+import numpy as np
+import pytest
+from radvis.processing.image import percentile_clipping, noise_reduction, normalization, apply_mask
+from radvis.image.instantiate import from_numpy, load_image
+from radvis.image.rad_numpy_image import RadNumpyImage
+from radvis.image.chunked_store import ChunkedVolumeWriter
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = str(tmp_path / "image.npy")
+    np.save(path, np.random.default_rng(0).normal(0, 100, size=(37, 20, 15)).astype(np.int16))
+    return path
+
+
+def _cases(shape):
+    mask = np.random.default_rng(1).random(shape) > 0.5
+    return [
+        (normalization, (-100, 100), {}),
+        (noise_reduction, (1.5,), {}),
+        (percentile_clipping, (1.5, 98.5), {"mask": mask}),
+        (apply_mask, (mask,), {"invert": True}),
+    ]
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 100])
+def test_blocks_match_in_memory(image_path, block_size):
+    image_data = np.load(image_path)
+    for function, args, kwargs in _cases(image_data.shape):
+        expected = function(from_numpy(image_data), *args, **kwargs).image_data
+        lazy_image = load_image(image_path, lazy=True)
+        result = function(lazy_image, *args, block_size=block_size, **kwargs)
+
+        assert not lazy_image.is_loaded
+        assert result.image_data.dtype == expected.dtype
+        assert np.array_equal(result.image_data, expected)
+
+
+def test_block_outputs(image_path, tmp_path):
+    image_data = np.load(image_path)
+    for function, args, kwargs in _cases(image_data.shape):
+        expected = function(from_numpy(image_data), *args, **kwargs).image_data
+
+        output = RadNumpyImage.create_memmap(str(tmp_path / "out.npy"), image_data.shape, expected.dtype)
+        function(load_image(image_path, lazy=True), *args, out=output.image_data, block_size=8, **kwargs)
+        assert np.array_equal(np.load(str(tmp_path / "out.npy")), expected)
+
+        writer = ChunkedVolumeWriter(str(tmp_path / "out.rvc"), image_data.shape, expected.dtype, chunks=(8, 8, 8))
+        result = function(load_image(image_path, lazy=True), *args, out=writer, block_size=8, **kwargs)
+        assert not result.is_loaded
+        assert np.array_equal(result.image_data, expected)
+
+
+def test_blocks_in_place():
+    image_data = np.random.default_rng(2).normal(0, 100, size=(30, 12, 12)).astype(np.float32)
+    for function, args, kwargs in _cases(image_data.shape):
+        expected = function(from_numpy(image_data), *args, **kwargs).image_data
+        rad_image = from_numpy(image_data.copy())
+        buffer = rad_image.image_data
+        function(rad_image, *args, inplace=True, block_size=4, **kwargs)
+        assert rad_image.image_data is buffer
+        assert np.array_equal(buffer, expected)
+
+
+def test_blocks_bound_memory(tmp_path):
+    path = str(tmp_path / "large.npy")
+    np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(64, 128, 128))[:] = 1
+    output = RadNumpyImage.create_memmap(str(tmp_path / "out.npy"), (64, 128, 128), np.float32)
+
+    tracemalloc.start()
+    try:
+        percentile_clipping(load_image(path, lazy=True), 1, 99, out=output.image_data, block_size=4)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # A handful of 256 KiB blocks, not the 4 MiB volume
+    assert peak < 64 * 128 * 128 * 4 / 2
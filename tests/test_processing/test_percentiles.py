@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from radvis.processing.percentiles import compute_percentiles
+from radvis.processing.image import percentile_clipping
+from radvis.image.instantiate import from_numpy
+
+PERCENTILES = [0, 0.5, 1, 25, 50, 99, 99.5, 100]
+
+
+@pytest.mark.parametrize("dtype", [np.int16, np.uint8, np.int64, np.float32])
+def test_exact_matches_numpy(dtype):
+    data = np.random.default_rng(0).normal(100, 40, size=(20, 17, 9)).clip(0, 255).astype(dtype)
+    estimate = compute_percentiles(data, PERCENTILES)
+    assert np.array_equal(estimate.values, np.percentile(data, PERCENTILES))
+    assert estimate.value_error == 0 and estimate.rank_error == 0
+
+
+def test_exact_with_mask():
+    data = np.random.default_rng(0).integers(-1000, 1000, size=(20, 17, 9)).astype(np.int16)
+    mask = np.zeros(data.shape, dtype=np.uint8)
+    mask[5:15, 3:12] = 1
+    assert np.array_equal(compute_percentiles(data, PERCENTILES, mask=mask).values,
+                          np.percentile(data[mask > 0], PERCENTILES))
+    assert np.array_equal(compute_percentiles(data.astype(np.float64), PERCENTILES, mask=mask).values,
+                          np.percentile(data[mask > 0], PERCENTILES))
+
+
+def test_histogram_error_bound():
+    data = np.random.default_rng(1).normal(0, 1, size=(40, 30, 20)).astype(np.float32)
+    estimate = compute_percentiles(data, PERCENTILES, method="histogram", bins=256)
+    assert estimate.value_error == pytest.approx((data.max() - data.min()) / 256)
+    assert np.all(np.abs(estimate.values - np.percentile(data, PERCENTILES)) <= estimate.value_error)
+
+
+def test_sample_rank_error_bound():
+    data = np.random.default_rng(2).normal(0, 1, size=(40, 30, 20))
+    mask = data > -1
+    estimate = compute_percentiles(data, [1, 50, 99], method="sample", sample_size=5000, mask=mask, seed=0)
+    assert estimate.value_error is None
+    assert estimate.rank_error == pytest.approx(100 * np.sqrt(np.log(2 / 0.01) / 10000))
+
+    # The ranks of the estimates among the foreground voxels are within the stated error
+    foreground = np.sort(data[mask])
+    ranks = 100 * np.searchsorted(foreground, estimate.values) / foreground.size
+    assert np.all(np.abs(ranks - [1, 50, 99]) <= estimate.rank_error)
+
+
+def test_invalid_arguments():
+    data = np.zeros((4, 4))
+    with pytest.raises(ValueError):
+        compute_percentiles(data, [1, 99], method="median")
+    with pytest.raises(ValueError):
+        compute_percentiles(data, [101])
+    with pytest.raises(ValueError):
+        compute_percentiles(data, [50], mask=np.zeros((4, 4), dtype=bool))
+
+
+def test_percentile_clipping_methods():
+    data = np.random.default_rng(3).normal(0, 100, size=(30, 20, 10)).astype(np.float32)
+    rad_image = from_numpy(data)
+    mask = np.abs(data) < 150
+
+    clipped = percentile_clipping(rad_image, 1, 99, mask=mask).image_data
+    lower, upper = np.percentile(data[mask], [1, 99])
+    assert clipped.min() == np.float32(lower) and clipped.max() == np.float32(upper)
+
+    approximate = percentile_clipping(rad_image, 1, 99, method="histogram").image_data
+    assert np.allclose(approximate, np.clip(data, *np.percentile(data, [1, 99])), atol=np.ptp(data) / 4096)
+
+
+def test_streamed_exact_matches_numpy(tmp_path, monkeypatch):
+    import radvis.processing.percentiles as percentiles
+    # Small blocks and gather limits, so that several narrowing passes are needed
+    monkeypatch.setattr(percentiles, "_BLOCK_VOXELS", 500)
+    monkeypatch.setattr(percentiles, "_GATHER_VALUES", 40)
+
+    data = np.random.default_rng(4).normal(0, 100, size=(20, 17, 9)).astype(np.float32)
+    data[data < -50] = -50
+    path = str(tmp_path / "data.npy")
+    np.save(path, data)
+    mask = data > -60
+
+    streamed = np.load(path, mmap_mode="r")
+    assert np.array_equal(compute_percentiles(streamed, PERCENTILES, bins=16).values, np.percentile(data, PERCENTILES))
+    assert np.array_equal(compute_percentiles(streamed, PERCENTILES, bins=16, mask=mask).values,
+                          np.percentile(data[mask], PERCENTILES))
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from radvis.processing.image import percentile_clipping, noise_reduction, normalization, add_padding, apply_mask
+from radvis.processing.pipeline import Pipeline
+from radvis.image.instantiate import from_numpy, load_image
+
+
+@pytest.fixture
+def image_data():
+    return np.random.default_rng(0).normal(100, 50, size=(24, 16, 12)).astype(np.int16)
+
+
+@pytest.fixture
+def mask(image_data):
+    return np.random.default_rng(1).random(image_data.shape) > 0.3
+
+
+def test_pipeline_matches_chained_functions(image_data, mask):
+    rad_image = from_numpy(image_data.copy())
+    # Small slabs, so that the fused stages run over several of them
+    pipeline = (Pipeline(slab_bytes=1024)
+                .add(percentile_clipping, 1, 99)
+                .add(normalization, 0, 1)
+                .add(apply_mask, mask)
+                .add(add_padding, (26, 20, 16)))
+    result = pipeline.run(rad_image)
+
+    expected = add_padding(apply_mask(normalization(percentile_clipping(rad_image, 1, 99), 0, 1), mask), (26, 20, 16))
+    assert result.image_data.dtype == expected.image_data.dtype
+    assert np.array_equal(result.image_data, expected.image_data)
+    assert np.array_equal(rad_image.image_data, image_data)
+    assert pipeline.passes == [("percentile_clipping", "normalization", "apply_mask", "add_padding")]
+
+
+def test_pipeline_with_barriers(image_data, mask):
+    rad_image = from_numpy(image_data)
+    pipeline = (Pipeline()
+                .add(normalization, 0, 200)
+                .add(percentile_clipping, 5, 95)
+                .add(noise_reduction, 1)
+                .add(apply_mask, mask, invert=True)
+                .add(lambda image: from_numpy(image.image_data * 2)))
+    result = pipeline.run(rad_image)
+
+    expected = apply_mask(noise_reduction(percentile_clipping(normalization(rad_image, 0, 200), 5, 95), 1),
+                          mask, invert=True)
+    assert np.array_equal(result.image_data, expected.image_data * 2)
+    assert len(pipeline.passes) == 5
+
+
+def test_pipeline_report():
+    image_data = np.ones((64, 64, 64), dtype=np.int16)
+    pipeline = Pipeline().add(normalization, 0, 1).add(apply_mask, image_data > 0)
+    pipeline.run(from_numpy(image_data))
+
+    report = pipeline.report
+    assert [stage.name for stage in report.stages] == ["normalization", "apply_mask"]
+    assert all(stage.seconds >= 0 and stage.pass_index == 1 for stage in report.stages)
+    assert report.passes == 1
+    # Only the float32 output buffer is allocated
+    assert image_data.size * 4 <= report.peak_bytes < image_data.size * 4 * 1.5
+    assert "peak memory" in str(report)
+
+
+def test_pipeline_inplace_reuses_buffer():
+    rad_image = from_numpy(np.arange(64, dtype=np.float32).reshape(4, 4, 4))
+    buffer = rad_image.image_data
+    result = Pipeline().add(normalization, 0, 63).add(percentile_clipping, 10, 90).run(rad_image, inplace=True)
+    assert result is rad_image
+    assert rad_image.image_data is buffer
+
+
+def test_pipeline_reads_lazy_images_by_slab(tmp_path, image_data):
+    path = str(tmp_path / "image.npy")
+    np.save(path, image_data)
+    rad_image = load_image(path, lazy=True)
+
+    result = Pipeline(slab_bytes=512).add(normalization, 0, 100).run(rad_image)
+    assert not rad_image.is_loaded
+    assert np.array_equal(result.image_data, normalization(from_numpy(image_data), 0, 100).image_data)
+
+
+def test_pipeline_rejects_stage_buffers():
+    with pytest.raises(ValueError):
+        Pipeline().add(normalization, 0, 1, inplace=True)
+    with pytest.raises(TypeError):
+        Pipeline().add(normalization, 0)
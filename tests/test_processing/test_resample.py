@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.ndimage import affine_transform
+from radvis.image.instantiate import from_numpy
+from radvis.processing.resample import resample
+
+
+@pytest.fixture
+def rad_image():
+    image = from_numpy(np.random.default_rng(0).normal(size=(20, 17, 13)).astype(np.float32))
+    image.affine = np.diag([2.0, 1.0, 0.5, 1.0])
+    return image
+
+
+@pytest.mark.parametrize("order", [1, 3])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_resample_matches_affine_transform(rad_image, order, workers):
+    resampled = resample(rad_image, shape=(31, 9, 13), order=order, workers=workers)
+    step = np.array(rad_image.shape) / np.array((31, 9, 13))
+    expected = affine_transform(rad_image.image_data, step, offset=(step - 1) / 2, output_shape=(31, 9, 13),
+                                order=order, mode="nearest")
+    assert resampled.image_data.dtype == np.float32
+    assert np.allclose(resampled.image_data, expected, atol=1e-6)
+
+
+def test_resample_to_spacing_updates_affine(rad_image):
+    resampled = resample(rad_image, spacing=1.0)
+    assert resampled.shape == (40, 17, 6)
+    assert np.allclose(resampled.spacing, (1.0, 1.0, 1.0))
+    # The first voxel centre is half a new voxel from the edge of the volume
+    assert np.allclose(resampled.affine[:3, 3], [-0.5, 0, 0.25])
+    assert np.allclose(rad_image.affine, np.diag([2.0, 1.0, 0.5, 1.0]))
+
+
+def test_nearest_keeps_labels(rad_image):
+    labels = from_numpy(np.random.default_rng(1).integers(0, 5, size=(20, 17, 13)).astype(np.uint8))
+    resampled = resample(labels, spacing=(0.7, 1.5, 2.0), order=0, workers=2)
+    step = np.array((0.7, 1.5, 2.0))
+    expected = affine_transform(labels.image_data, step, offset=(step - 1) / 2, output_shape=resampled.shape,
+                                order=0, mode="nearest")
+    assert resampled.image_data.dtype == np.uint8
+    assert np.array_equal(resampled.image_data, expected)
+
+
+def test_resample_invalid_arguments(rad_image):
+    with pytest.raises(ValueError):
+        resample(rad_image)
+    with pytest.raises(ValueError):
+        resample(rad_image, spacing=1, shape=(2, 2, 2))
+    with pytest.raises(ValueError):
+        resample(rad_image, shape=(2, 2))
+    with pytest.raises(ValueError):
+        resample(rad_image, spacing=1, order=6)
@@ -23,4 +23,40 @@ def test_title(rad_image):
     assert rad_slicer.title == "Axis: 0"
 
     rad_slicer_with_title = RadSlicer(rad_image, title="Test Title")
-    assert rad_slicer_with_title.title == "Test Title"
\ No newline at end of file
+    assert rad_slicer_with_title.title == "Test Title"
+
+def test_display_lazy_image_without_loading(tmp_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    from radvis.image.instantiate import load_image
+
+    file_path = str(tmp_path / "image.npy")
+    np.save(file_path, np.arange(6 * 5 * 4, dtype=np.int16).reshape(6, 5, 4))
+    mask_path = str(tmp_path / "mask.npy")
+    np.save(mask_path, np.ones((6, 5, 4), dtype=np.uint8))
+    image = load_image(file_path, lazy=True)
+    mask = load_image(mask_path, lazy=True)
+
+    rad_slicer = RadSlicer(image, axis=1)
+    rad_slicer.add_mask(mask)
+    rad_slicer.save_frame(str(tmp_path / "frame.png"), index=3)
+
+    assert (tmp_path / "frame.png").exists()
+    assert not image.is_loaded
+    assert not mask.is_loaded
+
+def test_add_mask_uses_exact_maximum(tmp_path):
+    from radvis.image.instantiate import load_image
+
+    labels = np.zeros((40, 5, 4), dtype=np.uint8)
+    labels[::2] = 1
+    labels[17, 2, 2] = 7  # Not in any of the slices a display range is sampled from
+    mask_path = str(tmp_path / "labels.npy")
+    np.save(mask_path, labels)
+    mask = load_image(mask_path, lazy=True)
+
+    rad_slicer = RadSlicer(load_image(mask_path, lazy=True), axis=1)
+    rad_slicer.add_mask(mask)
+    rad_slicer.add_mask(mask, vmax=10)
+    assert [mask_max for _, _, _, mask_max in rad_slicer._masks] == [7, 10]
+    assert not mask.is_loaded